@@ -1,20 +1,33 @@
 #!/usr/bin/env python3
 """
 Chainflip Real Transaction Listener - Uses correct RPC methods to capture
-actual swap transactions and affiliate activity through ShapeShift brokers
+actual swap transactions and affiliate activity through ShapeShift brokers.
+All swap views are fetched in one JSON-RPC batch per poll and diffed by swap
+id (see shared/chainflip_rpc.py), so repeated polls only record changes.
+With --stream, finalized blocks are followed instead and every ShapeShift
+broker swap/fee event is recorded as it lands (see shared/chainflip_stream.py).
 """
 
-import requests
+import os
+import sys
 import json
 import csv
 import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'shared'))
+
+from chainflip_rpc import ChainflipPoller, SwapChange
+from chainflip_stream import ChainflipEventStream
+
 class ChainflipRealTransactionListener:
     def __init__(self):
         self.node_url = "http://localhost:9944"
-        self.csv_file = "chainflip_real_transactions.csv"
+        self.ws_url = "ws://localhost:9944"
+        # Anchored at this module so the CSV and its snapshots stay paired whatever the cwd
+        self.data_dir = os.path.dirname(os.path.abspath(__file__))
+        self.csv_file = os.path.join(self.data_dir, "chainflip_real_transactions.csv")
         
         # ShapeShift broker addresses
         self.shapeshift_brokers = [
@@ -22,6 +35,10 @@ class ChainflipRealTransactionListener:
             "cFK6mYjpajcwPDZ7JUsac8XUoVSJnhjL43ZMZW7YoN8HE4dD8"
         ]
         
+        # One batched call per poll, diffed against the previous (persisted) snapshot
+        self.poller = ChainflipPoller(self.node_url, record_filter=self.involves_shapeshift_broker,
+                                      state_path=os.path.join(self.data_dir, "chainflip_snapshots.json"))
+        
         # Initialize CSV
         self.init_csv()
         
@@ -35,136 +52,25 @@ class ChainflipRealTransactionListener:
             'raw_data', 'detection_method'
         ]
         
+        # Kept across restarts: swaps already written are not re-emitted (persisted snapshots)
+        if os.path.exists(self.csv_file):
+            return
+        
         with open(self.csv_file, 'w', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
             writer.writerow(headers)
             
         print(f"📁 Created real transaction CSV file: {self.csv_file}")
     
-    def make_rpc_call(self, method: str, params=None):
-        """Make a JSON-RPC call to the Chainflip node"""
-        payload = {
-            "id": 1,
-            "jsonrpc": "2.0",
-            "method": method
-        }
-        if params:
-            payload["params"] = params
-            
-        try:
-            response = requests.post(self.node_url, json=payload, timeout=10)
-            if response.status_code == 200:
-                result = response.json()
-                if 'result' in result:
-                    return result['result']
-                elif 'error' in result:
-                    print(f"❌ API Error: {method} - {result['error']}")
-                    return None
-            else:
-                print(f"❌ HTTP Error: {response.status_code}")
-                return None
-        except Exception as e:
-            print(f"❌ Request failed: {e}")
-            return None
-    
-    def get_scheduled_swaps(self):
-        """Get scheduled swaps using correct method"""
-        try:
-            swaps = self.make_rpc_call("cf_scheduled_swaps", [])
-            if swaps:
-                print(f"✅ Found {len(swaps)} scheduled swaps")
-                return swaps
-            return []
-        except Exception as e:
-            print(f"❌ Error getting scheduled swaps: {e}")
-            return []
-    
-    def get_prewitness_swaps(self):
-        """Get prewitness swaps using correct method"""
-        try:
-            swaps = self.make_rpc_call("cf_prewitness_swaps", [])
-            if swaps:
-                print(f"✅ Found {len(swaps)} prewitness swaps")
-                return swaps
-            return []
-        except Exception as e:
-            print(f"❌ Error getting prewitness swaps: {e}")
-            return []
-    
-    def get_pending_swaps(self):
-        """Get pending swaps from monitoring"""
-        try:
-            pending = self.make_rpc_call("cf_monitoring_pending_swaps", [])
-            if pending:
-                print(f"✅ Found {len(pending)} pending swaps")
-                return pending
-            return []
-        except Exception as e:
-            print(f"❌ Error getting pending swaps: {e}")
-            return []
-    
-    def get_pool_orders(self):
-        """Get pool orders that might involve brokers"""
-        try:
-            orders = self.make_rpc_call("cf_pool_orders", [])
-            if orders:
-                print(f"✅ Found {len(orders)} pool orders")
-                return orders
-            return []
-        except Exception as e:
-            print(f"❌ Error getting pool orders: {e}")
-            return []
-    
-    def get_lp_order_fills(self):
-        """Get LP order fills that might involve brokers"""
-        try:
-            fills = self.make_rpc_call("cf_lp_get_order_fills", [])
-            if fills:
-                print(f"✅ Found {len(fills)} LP order fills")
-                return fills
-            return []
-        except Exception as e:
-            print(f"❌ Error getting LP order fills: {e}")
-            return []
-    
-    def get_transaction_screening_events(self):
-        """Get transaction screening events"""
-        try:
-            events = self.make_rpc_call("cf_get_transaction_screening_events", [])
-            if events:
-                print(f"✅ Found {len(events)} screening events")
-                return events
-            return []
-        except Exception as e:
-            print(f"❌ Error getting screening events: {e}")
-            return []
-    
-    def analyze_swap_data(self, swap_data, data_type):
-        """Analyze swap data to find ShapeShift broker involvement"""
-        transactions = []
-        
-        try:
-            if isinstance(swap_data, list):
-                for swap in swap_data:
-                    if isinstance(swap, list) and len(swap) >= 3:
-                        broker_address = swap[0]
-                        swap_type = swap[1]
-                        swap_details = swap[2]
-                        
-                        # Check if this involves a ShapeShift broker
-                        if broker_address in self.shapeshift_brokers:
-                            transaction = self.create_transaction_record(
-                                swap_details, broker_address, swap_type, data_type
-                            )
-                            if transaction:
-                                transactions.append(transaction)
-                                
-        except Exception as e:
-            print(f"❌ Error analyzing {data_type}: {e}")
-            
-        return transactions
+    def involves_shapeshift_broker(self, record) -> bool:
+        """Whether a swap/order record names a ShapeShift broker"""
+        if isinstance(record, list) and len(record) >= 3:
+            return record[0] in self.shapeshift_brokers
+        raw = json.dumps(record, default=str)
+        return any(broker in raw for broker in self.shapeshift_brokers)
     
-    def create_transaction_record(self, swap_details, broker_address, swap_type, data_type):
+    def create_transaction_record(self, swap_details, broker_address, swap_type, data_type, swap_id,
+                                  swap_state='active'):
         """Create a transaction record from swap data"""
         try:
             # Extract chain account information
@@ -212,7 +118,7 @@ class ChainflipRealTransactionListener:
             transaction = {
                 'timestamp': datetime.now().isoformat(),
                 'block_number': 'Unknown',  # Will be filled if we can get block info
-                'transaction_hash': f"swap_{int(time.time())}_{broker_address[:8]}",
+                'transaction_hash': f"swap_{swap_id}_{broker_address[:8]}",
                 'broker_address': broker_address,
                 'transaction_type': swap_type,
                 'source_asset': source_asset,
@@ -223,8 +129,8 @@ class ChainflipRealTransactionListener:
                 'fee_asset': 'Unknown',
                 'source_chain': source_chain,
                 'destination_chain': destination_chain,
-                'swap_id': f"swap_{int(time.time())}",
-                'swap_state': 'active',
+                'swap_id': swap_id,
+                'swap_state': swap_state,
                 'user_address': 'Unknown',  # Would need user identification
                 'raw_data': json.dumps(swap_details),
                 'detection_method': data_type
@@ -259,165 +165,101 @@ class ChainflipRealTransactionListener:
         except Exception as e:
             print(f"❌ Error saving transactions: {e}")
     
-    def run_real_transaction_scan(self):
-        """Run comprehensive transaction scan using correct RPC methods"""
-        print("🚀 Starting Chainflip REAL transaction scan for ShapeShift brokers...")
-        print("   Using correct RPC methods to capture actual swap activity")
-        
-        all_transactions = []
-        
-        # Method 1: Get scheduled swaps (correct method)
-        print("\n🔍 Method 1: Scanning scheduled swaps...")
-        scheduled_swaps = self.get_scheduled_swaps()
-        if scheduled_swaps:
-            transactions = self.analyze_swap_data(scheduled_swaps, "scheduled_swaps")
-            all_transactions.extend(transactions)
-            print(f"   Found {len(transactions)} ShapeShift broker transactions")
-        
-        # Method 2: Get prewitness swaps (correct method)
-        print("\n🔍 Method 2: Scanning prewitness swaps...")
-        prewitness_swaps = self.get_prewitness_swaps()
-        if prewitness_swaps:
-            transactions = self.analyze_swap_data(prewitness_swaps, "prewitness_swaps")
-            all_transactions.extend(transactions)
-            print(f"   Found {len(transactions)} ShapeShift broker transactions")
-        
-        # Method 3: Get pending swaps from monitoring
-        print("\n🔍 Method 3: Scanning pending swaps...")
-        pending_swaps = self.get_pending_swaps()
-        if pending_swaps:
-            transactions = self.analyze_swap_data(pending_swaps, "pending_swaps")
-            all_transactions.extend(transactions)
-            print(f"   Found {len(transactions)} ShapeShift broker transactions")
-        
-        # Method 4: Get pool orders
-        print("\n🔍 Method 4: Scanning pool orders...")
-        pool_orders = self.get_pool_orders()
-        if pool_orders:
-            # Look for broker involvement in pool orders
-            broker_orders = []
-            for order in pool_orders:
-                if isinstance(order, dict) and any(broker in str(order) for broker in self.shapeshift_brokers):
-                    broker_orders.append(order)
-            
-            if broker_orders:
-                print(f"   Found {len(broker_orders)} pool orders involving ShapeShift brokers")
-                # Convert to transaction format
-                for order in broker_orders:
-                    transaction = {
-                        'timestamp': datetime.now().isoformat(),
-                        'block_number': 'Unknown',
-                        'transaction_hash': f"pool_order_{int(time.time())}",
-                        'broker_address': 'Found in pool order',
-                        'transaction_type': 'pool_order',
-                        'source_asset': 'Unknown',
-                        'destination_asset': 'Unknown',
-                        'amount_in': 'Unknown',
-                        'amount_out': 'Unknown',
-                        'affiliate_fee': 'Unknown',
-                        'fee_asset': 'Unknown',
-                        'source_chain': 'Unknown',
-                        'destination_chain': 'Unknown',
-                        'swap_id': f"pool_{int(time.time())}",
-                        'swap_state': 'pending',
-                        'user_address': 'Unknown',
-                        'raw_data': json.dumps(order),
-                        'detection_method': 'pool_orders'
-                    }
-                    all_transactions.append(transaction)
+    def change_to_transaction(self, change: SwapChange) -> Optional[Dict]:
+        """Transaction record for a new/changed swap emitted by the poller"""
+        record = change.record
+        if isinstance(record, list) and len(record) >= 3:
+            return self.create_transaction_record(record[2], record[0], record[1], change.source,
+                                                  change.swap_id, change.status)
         
-        # Method 5: Get LP order fills
-        print("\n🔍 Method 5: Scanning LP order fills...")
-        lp_fills = self.get_lp_order_fills()
-        if lp_fills:
-            # Look for broker involvement in LP fills
-            broker_fills = []
-            for fill in lp_fills:
-                if isinstance(fill, dict) and any(broker in str(fill) for broker in self.shapeshift_brokers):
-                    broker_fills.append(fill)
-            
-            if broker_fills:
-                print(f"   Found {len(broker_fills)} LP fills involving ShapeShift brokers")
-                # Convert to transaction format
-                for fill in broker_fills:
-                    transaction = {
-                        'timestamp': datetime.now().isoformat(),
-                        'block_number': 'Unknown',
-                        'transaction_hash': f"lp_fill_{int(time.time())}",
-                        'broker_address': 'Found in LP fill',
-                        'transaction_type': 'lp_fill',
-                        'source_asset': 'Unknown',
-                        'destination_asset': 'Unknown',
-                        'amount_in': 'Unknown',
-                        'amount_out': 'Unknown',
-                        'affiliate_fee': 'Unknown',
-                        'fee_asset': 'Unknown',
-                        'source_chain': 'Unknown',
-                        'destination_chain': 'Unknown',
-                        'swap_id': f"lp_{int(time.time())}",
-                        'swap_state': 'filled',
-                        'user_address': 'Unknown',
-                        'raw_data': json.dumps(fill),
-                        'detection_method': 'lp_fills'
-                    }
-                    all_transactions.append(transaction)
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'block_number': 'Unknown',
+            'transaction_hash': f"{change.source}_{change.swap_id}",
+            'broker_address': f"Found in {change.source}",
+            'transaction_type': change.source,
+            'source_asset': 'Unknown',
+            'destination_asset': 'Unknown',
+            'amount_in': 'Unknown',
+            'amount_out': 'Unknown',
+            'affiliate_fee': 'Unknown',
+            'fee_asset': 'Unknown',
+            'source_chain': 'Unknown',
+            'destination_chain': 'Unknown',
+            'swap_id': change.swap_id,
+            'swap_state': change.status,
+            'user_address': 'Unknown',
+            'raw_data': json.dumps(record, default=str),
+            'detection_method': change.source
+        }
+    
+    def run_real_transaction_scan(self):
+        """Poll every swap view in one batched RPC call and save new/changed broker swaps"""
+        print("🔍 Polling Chainflip swap views (one batched RPC call)...")
         
-        # Method 6: Get transaction screening events
-        print("\n🔍 Method 6: Scanning transaction screening events...")
-        screening_events = self.get_transaction_screening_events()
-        if screening_events:
-            # Look for broker involvement in screening events
-            broker_events = []
-            for event in screening_events:
-                if isinstance(event, dict) and any(broker in str(event) for broker in self.shapeshift_brokers):
-                    broker_events.append(event)
-            
-            if broker_events:
-                print(f"   Found {len(broker_events)} screening events involving ShapeShift brokers")
-                # Convert to transaction format
-                for event in broker_events:
-                    transaction = {
-                        'timestamp': datetime.now().isoformat(),
-                        'block_number': 'Unknown',
-                        'transaction_hash': f"screening_{int(time.time())}",
-                        'broker_address': 'Found in screening event',
-                        'transaction_type': 'screening_event',
-                        'source_asset': 'Unknown',
-                        'destination_asset': 'Unknown',
-                        'amount_in': 'Unknown',
-                        'amount_out': 'Unknown',
-                        'affiliate_fee': 'Unknown',
-                        'fee_asset': 'Unknown',
-                        'source_chain': 'Unknown',
-                        'destination_chain': 'Unknown',
-                        'swap_id': f"screening_{int(time.time())}",
-                        'swap_state': 'screened',
-                        'user_address': 'Unknown',
-                        'raw_data': json.dumps(event),
-                        'detection_method': 'screening_events'
-                    }
-                    all_transactions.append(transaction)
+        try:
+            changes = self.poller.poll()
+        except Exception as e:
+            print(f"❌ Chainflip poll failed: {e}")
+            return 0
         
-        # Save all found transactions
-        if all_transactions:
-            self.save_transactions(all_transactions)
-            print(f"\n🎯 REAL Transaction scan completed!")
-            print(f"   Total transactions found: {len(all_transactions)}")
-            print(f"   CSV file: {self.csv_file}")
-        else:
-            print("\n⚠️  No transactions found involving ShapeShift brokers")
-            print("   This could mean:")
-            print("   1. No recent broker activity")
-            print("   2. Brokers are not actively processing swaps")
-            print("   3. Different detection method needed")
-            print("   4. Brokers might be using different addresses")
+        transactions = [tx for tx in (self.change_to_transaction(change) for change in changes) if tx]
+        if transactions:
+            self.save_transactions(transactions)
+            print(f"🎯 {len(transactions)} new or changed ShapeShift broker swaps")
         
-        return len(all_transactions)
+        return len(transactions)
+    
+    def run_polling(self, interval: float = 6.0, max_polls: Optional[int] = None):
+        """Poll continuously; each poll is one round trip and only emits changes"""
+        print(f"🚀 Polling Chainflip every {interval}s for ShapeShift broker swaps...")
+        polls = 0
+        total = 0
+        while max_polls is None or polls < max_polls:
+            total += self.run_real_transaction_scan()
+            polls += 1
+            if max_polls is None or polls < max_polls:
+                time.sleep(interval)
+        return total
+
+    def event_to_transaction(self, record: Dict) -> Dict:
+        """Transaction record for a decoded broker swap/fee event"""
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'block_number': record['block_number'],
+            'transaction_hash': record['event_index'],
+            'broker_address': record['broker'],
+            'transaction_type': record['kind'],
+            'source_asset': 'Unknown',
+            'destination_asset': 'Unknown',
+            'amount_in': 'Unknown',
+            'amount_out': 'Unknown',
+            'affiliate_fee': 'Unknown',
+            'fee_asset': 'Unknown',
+            'source_chain': 'Unknown',
+            'destination_chain': 'Unknown',
+            'swap_id': record['swap_request_id'] or '',
+            'swap_state': record['event'],
+            'user_address': 'Unknown',
+            'raw_data': json.dumps(record['attributes'], default=str),
+            'detection_method': f"{record['pallet']}.{record['event']}"
+        }
+    
+    def run_streaming(self, max_blocks: Optional[int] = None):
+        """Follow finalized blocks and record broker events as they land, checkpointed by height"""
+        stream = ChainflipEventStream(
+            self.ws_url, self.shapeshift_brokers,
+            on_event=lambda record: self.save_transactions([self.event_to_transaction(record)])
+        )
+        stream.run(max_blocks=max_blocks)
 
 def main():
     """Main function"""
     try:
         listener = ChainflipRealTransactionListener()
+        if '--stream' in sys.argv:
+            listener.run_streaming()
+            return
         total_transactions = listener.run_real_transaction_scan()
         
         print(f"\n📊 REAL Transaction Scan Results:")
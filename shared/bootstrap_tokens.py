@@ -1,56 +1,139 @@
 import csv
 import json
-import os
-import sqlite3
-from typing import Dict
-
-_DB_PATH = os.path.expanduser('~/.token_cache.sqlite')
-
-# --- DB Schema ---
-_SCHEMA = '''
-CREATE TABLE IF NOT EXISTS tokens (
-    address TEXT PRIMARY KEY,
-    symbol TEXT,
-    name TEXT,
-    decimals INTEGER,
-    price REAL,
-    updated_at INTEGER
-);
-'''
-
-def bootstrap_from_csv(csv_path: str) -> None:
-    """Populate the token cache from a CSV file."""
-    with sqlite3.connect(_DB_PATH) as conn, open(csv_path, newline='') as f:
-        conn.execute(_SCHEMA)
-        reader = csv.DictReader(f)
-        for row in reader:
-            conn.execute('INSERT OR REPLACE INTO tokens (address, symbol, name, decimals, price, updated_at) VALUES (?, ?, ?, ?, ?, strftime("%s","now"))',
-                         (row['address'], row['symbol'], row['name'], int(row['decimals']), None))
+import re
+import time
+from typing import Dict, Iterable, Iterator, List
+
+from token_cache import _get_conn, invalidate, UPSERT_TOKEN_SQL, DEFAULT_CHAIN_ID
+
+# Rows per executemany; the whole import still commits as one transaction
+_BATCH_SIZE = 5000
+_READ_SIZE = 1 << 20
+
+# --- Streaming readers ---
+def _iter_csv(csv_path: str) -> Iterator[Dict]:
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+_TOKENS_ARRAY = re.compile(r'"tokens"\s*:\s*\[')
+
+def _iter_json(json_path: str) -> Iterator[Dict]:
+    """Stream the objects of a token list's "tokens" array (or a top-level array)
+    without loading the whole document."""
+    decoder = json.JSONDecoder()
+    with open(json_path, encoding='utf-8') as f:
+        buf = f.read(_READ_SIZE)
+        # Find the start of the array holding the tokens
+        while True:
+            match = _TOKENS_ARRAY.search(buf)
+            if match:
+                pos = match.end()
+                break
+            stripped = buf.lstrip()
+            if stripped.startswith('['):
+                pos = len(buf) - len(stripped) + 1
+                break
+            more = f.read(_READ_SIZE)
+            if not more:
+                return
+            buf += more
+
+        while True:
+            # Skip separators; refill when the buffer runs dry
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos < len(buf):
+                    break
+                buf, pos = f.read(_READ_SIZE), 0
+                if not buf:
+                    return
+            if buf[pos] == ']':
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                more = f.read(_READ_SIZE)
+                if not more:
+                    raise
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield obj
+            pos = end
+            if pos > _READ_SIZE:
+                buf, pos = buf[pos:], 0
+
+def _iter_file(path: str) -> Iterator[Dict]:
+    if path.endswith('.csv'):
+        return _iter_csv(path)
+    if path.endswith('.json'):
+        return _iter_json(path)
+    raise ValueError(f'{path}: file must be .csv or .json')
+
+def _row_values(row: dict, chain_id: int) -> tuple:
+    """Token store row; per-row chainId/chain_id (token lists) overrides the file default."""
+    row_chain_id = row.get('chainId', row.get('chain_id')) or chain_id
+    return (int(row_chain_id), row['address'].lower(), row['symbol'], row['name'], int(row['decimals']), None)
+
+# --- Bulk loader ---
+def bulk_load(paths: Iterable[str], chain_id: int = DEFAULT_CHAIN_ID, batch_size: int = _BATCH_SIZE) -> int:
+    """Stream token lists (.csv/.json) into the token store in one transaction.
+
+    Rows are inserted in executemany batches with fast-load pragmas; a failure
+    rolls back the whole import. Returns the number of rows loaded.
+    """
+    conn = _get_conn()
+    loaded = skipped = 0
+    started = time.time()
+    try:
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-262144')  # 256 MiB
+        conn.execute('BEGIN')
+        for path in paths:
+            batch: List[tuple] = []
+            for row in _iter_file(path):
+                try:
+                    batch.append(_row_values(row, chain_id))
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    skipped += 1
+                    continue
+                if len(batch) >= batch_size:
+                    conn.executemany(UPSERT_TOKEN_SQL, batch)
+                    loaded += len(batch)
+                    batch = []
+            if batch:
+                conn.executemany(UPSERT_TOKEN_SQL, batch)
+                loaded += len(batch)
         conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.close()
+    invalidate()
+    print(f'Loaded {loaded} tokens ({skipped} invalid rows skipped) in {time.time() - started:.1f}s')
+    return loaded
 
-def bootstrap_from_json(json_path: str) -> None:
+def bootstrap_from_csv(csv_path: str, chain_id: int = DEFAULT_CHAIN_ID) -> None:
+    """Populate the token cache from a CSV file."""
+    bulk_load([csv_path], chain_id)
+
+def bootstrap_from_json(json_path: str, chain_id: int = DEFAULT_CHAIN_ID) -> None:
     """Populate the token cache from a JSON file (supports Uniswap token list format)."""
-    with sqlite3.connect(_DB_PATH) as conn, open(json_path) as f:
-        conn.execute(_SCHEMA)
-        data = json.load(f)
-        # Support Uniswap-style lists with a 'tokens' array
-        tokens = data['tokens'] if 'tokens' in data else data
-        for row in tokens:
-            conn.execute('INSERT OR REPLACE INTO tokens (address, symbol, name, decimals, price, updated_at) VALUES (?, ?, ?, ?, ?, strftime("%s","now"))',
-                         (row['address'], row['symbol'], row['name'], int(row['decimals']), None))
-        conn.commit()
+    bulk_load([json_path], chain_id)
 
 if __name__ == '__main__':
-    # Example usage: python bootstrap_tokens.py tokens.csv
-    import sys
-    if len(sys.argv) != 2:
-        print('Usage: python bootstrap_tokens.py <tokens.csv|tokens.json>')
+    # Example usage: python bootstrap_tokens.py [--chain-id 8453] tokens.csv tokenlist.json ...
+    import argparse
+    parser = argparse.ArgumentParser(description='Bulk-load token lists into the token cache')
+    parser.add_argument('paths', nargs='+', help='.csv or .json token lists')
+    parser.add_argument('--chain-id', type=int, default=DEFAULT_CHAIN_ID,
+                        help='chain id for rows without chainId/chain_id (default: 1)')
+    args = parser.parse_args()
+    try:
+        bulk_load(args.paths, args.chain_id)
+    except ValueError as e:
+        print(e)
         exit(1)
-    path = sys.argv[1]
-    if path.endswith('.csv'):
-        bootstrap_from_csv(path)
-    elif path.endswith('.json'):
-        bootstrap_from_json(path)
-    else:
-        print('File must be .csv or .json')
-        exit(1) 
\ No newline at end of file
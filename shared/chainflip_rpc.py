@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Chainflip RPC Poller
+Queries a Chainflip node's swap views (cf_scheduled_swaps, cf_prewitness_swaps,
+cf_monitoring_pending_swaps, ...) as a single JSON-RPC batch per poll, then
+diffs each view against the previous snapshot by swap id, so a poll emits only
+swaps that are new or whose content changed. Polling faster therefore adds
+requests but never duplicate records. Snapshots are saved to a JSON state file
+after each poll, so a restart does not re-emit every open swap.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# View name -> (RPC method, params) polled by default
+DEFAULT_METHODS = {
+    'scheduled_swaps': ('cf_scheduled_swaps', []),
+    'prewitness_swaps': ('cf_prewitness_swaps', []),
+    'pending_swaps': ('cf_monitoring_pending_swaps', []),
+    'pool_orders': ('cf_pool_orders', []),
+    'lp_fills': ('cf_lp_get_order_fills', []),
+    'screening_events': ('cf_get_transaction_screening_events', []),
+}
+
+ID_FIELDS = ('swap_id', 'swap_request_id', 'id', 'order_id', 'tx_hash')
+
+
+class SwapChange(NamedTuple):
+    source: str        # view name, e.g. 'scheduled_swaps'
+    swap_id: str
+    status: str        # 'new' or 'changed'
+    record: Any
+
+
+def _fingerprint(record: Any) -> str:
+    return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def swap_identity(record: Any) -> str:
+    """Stable id of a swap record: its swap/request id, else a content hash.
+
+    Accepts dict records and the [broker, type, details] lists some node
+    versions return.
+    """
+    details = record[2] if isinstance(record, list) and len(record) >= 3 else record
+    if isinstance(details, dict):
+        for field in ID_FIELDS:
+            if details.get(field) is not None:
+                return str(details[field])
+    return _fingerprint(record)
+
+
+def iter_records(result: Any) -> Iterable[Any]:
+    """Records of a view result (a list, or a dict wrapping one)"""
+    if isinstance(result, list):
+        return result
+    if isinstance(result, dict):
+        for value in result.values():
+            if isinstance(value, list):
+                return value
+    return []
+
+
+class ChainflipPoller:
+    """Batched JSON-RPC poller with snapshot diffing.
+
+    Args:
+        node_url: Chainflip node RPC endpoint.
+        methods: View name -> (method, params); defaults to DEFAULT_METHODS.
+        record_filter: Keeps only matching records (e.g. ShapeShift brokers).
+        state_path: Where the snapshots are kept across restarts ('' keeps
+            them in memory only).
+    """
+
+    def __init__(self, node_url: str, methods: Optional[Dict[str, Tuple[str, list]]] = None,
+                 record_filter: Optional[Callable[[Any], bool]] = None,
+                 session: Optional[requests.Session] = None, timeout: float = 10,
+                 state_path: str = 'databases/chainflip_snapshots.json'):
+        self.node_url = node_url
+        self.methods = dict(methods or DEFAULT_METHODS)
+        self.record_filter = record_filter
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.state_path = state_path
+        # view -> {swap id: fingerprint} from the last successful poll of that view
+        self.snapshots: Dict[str, Dict[str, str]] = self._load_snapshots()
+
+    # -------------------------------------------------------------------------
+    # State
+    # -------------------------------------------------------------------------
+
+    def _load_snapshots(self) -> Dict[str, Dict[str, str]]:
+        if not self.state_path:
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_snapshots(self):
+        if not self.state_path:
+            return
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshots, f, separators=(',', ':'))
+        os.replace(tmp_path, self.state_path)
+
+    # -------------------------------------------------------------------------
+    # Polling
+    # -------------------------------------------------------------------------
+
+    def batch_call(self, calls: Dict[str, Tuple[str, list]]) -> Dict[str, Any]:
+        """Send every call in one JSON-RPC batch; returns {name: result} for calls that succeeded"""
+        names = list(calls)
+        payload = [{'jsonrpc': '2.0', 'id': index, 'method': method, 'params': params}
+                   for index, (method, params) in enumerate(calls[name] for name in names)]
+        response = self.session.post(self.node_url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        replies = response.json()
+        if isinstance(replies, dict):
+            replies = [replies]
+
+        results = {}
+        for reply in replies:
+            index = reply.get('id')
+            if not isinstance(index, int) or not 0 <= index < len(names):
+                continue
+            if 'error' in reply:
+                logger.warning(f"⚠️ {calls[names[index]][0]} failed: {reply['error']}")
+                continue
+            results[names[index]] = reply.get('result')
+        return results
+
+    def diff(self, source: str, records: Iterable[Any]) -> List[SwapChange]:
+        """Changes in one view against its previous snapshot; replaces the snapshot"""
+        previous = self.snapshots.get(source, {})
+        current: Dict[str, str] = {}
+        changes = []
+        for record in records:
+            if self.record_filter is not None and not self.record_filter(record):
+                continue
+            swap_id = swap_identity(record)
+            fingerprint = _fingerprint(record)
+            current[swap_id] = fingerprint
+            if swap_id not in previous:
+                changes.append(SwapChange(source, swap_id, 'new', record))
+            elif previous[swap_id] != fingerprint:
+                changes.append(SwapChange(source, swap_id, 'changed', record))
+        self.snapshots[source] = current
+        return changes
+
+    def poll(self) -> List[SwapChange]:
+        """One batched round trip over every view; returns new/changed swaps.
+
+        A view whose call failed keeps its previous snapshot, so its swaps are
+        not re-emitted once it recovers.
+        """
+        results = self.batch_call(self.methods)
+        changes = []
+        for source in self.methods:
+            if source in results:
+                changes.extend(self.diff(source, iter_records(results[source])))
+        if results:
+            try:
+                self._save_snapshots()
+            except OSError as e:
+                logger.warning(f"⚠️ Could not persist Chainflip snapshots to {self.state_path}: {e}")
+        if changes:
+            logger.info(f"📦 Chainflip poll: {len(changes)} new/changed swaps")
+        return changes
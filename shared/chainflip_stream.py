@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Chainflip Block Event Stream
+Subscribes to finalized State Chain headers and decodes each block's events,
+emitting the swap and broker-fee events of the ShapeShift broker accounts as
+blocks finalize. Unlike snapshot polling (chainflip_rpc.py), no swap can start
+and finish unseen between polls: every finalized block from the checkpoint
+onward is read, gaps in the subscription are backfilled, and the height is
+checkpointed after each block. Node errors and dropped websockets reconnect
+with exponential backoff and resume from the checkpoint.
+
+Requires substrate-interface (pip install 'shapeshift-listener[chainflip]').
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from block_tracker import BlockTracker
+
+logger = logging.getLogger(__name__)
+
+# Swapping pallet events that belong to a swap request
+SWAP_EVENTS = frozenset({
+    'SwapDepositAddressReady', 'SwapRequested', 'SwapScheduled', 'SwapExecuted',
+    'SwapEgressScheduled', 'SwapRequestCompleted', 'RefundEgressScheduled',
+})
+# Events crediting broker commission
+BROKER_FEE_EVENTS = frozenset({'BrokerFeeCredited', 'AccountCredited'})
+
+
+def _connect(url: str):
+    try:
+        from substrateinterface import SubstrateInterface
+    except ImportError as e:
+        raise ImportError(
+            "Chainflip streaming requires substrate-interface. "
+            "Install it with: pip install 'shapeshift-listener[chainflip]'"
+        ) from e
+    return SubstrateInterface(url=url)
+
+
+class ChainflipEventStream:
+    """Finalized-block event stream filtered to ShapeShift broker activity.
+
+    Args:
+        ws_url: Chainflip node websocket RPC, e.g. wss://mainnet-rpc.chainflip.io
+        brokers: ShapeShift broker accounts (SS58).
+        on_event: Called with each decoded record, in block order.
+        tracker: Height checkpoint store (protocol 'chainflip').
+        start_block: First block when no checkpoint exists (0 = current head).
+        state_path: Open swap requests still awaiting events, kept across restarts.
+        retry_delay: First reconnect delay (seconds) after a node error; doubles
+            per consecutive failure up to max_retry_delay.
+    """
+
+    def __init__(self, ws_url: str, brokers: Iterable[str], on_event: Callable[[Dict[str, Any]], None],
+                 tracker: Optional[BlockTracker] = None, start_block: int = 0,
+                 state_path: str = 'databases/chainflip_open_requests.json', max_open_requests: int = 100000,
+                 retry_delay: float = 5, max_retry_delay: float = 300):
+        self.ws_url = ws_url
+        self.brokers = [broker for broker in brokers if broker]
+        self.on_event = on_event
+        self.tracker = tracker or BlockTracker()
+        self.start_block = start_block
+        self.state_path = state_path
+        self.max_open_requests = max_open_requests
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        # swap_request_id -> broker for ShapeShift requests that have not completed
+        self.open_requests: 'OrderedDict[str, str]' = OrderedDict(self._load_open_requests())
+        self.next_block: Optional[int] = None
+        self._first_block: Optional[int] = None
+        self._substrate = None
+
+    # -------------------------------------------------------------------------
+    # State
+    # -------------------------------------------------------------------------
+
+    def _load_open_requests(self) -> Dict[str, str]:
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_open_requests(self):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.open_requests, f, separators=(',', ':'))
+        os.replace(tmp_path, self.state_path)
+
+    def checkpoint(self, block_number: int):
+        """Record a fully processed block (open requests first, then the height)"""
+        self._save_open_requests()
+        self.tracker.update_last_scanned_block('chainflip', 'chainflip', block_number)
+        self.next_block = block_number + 1
+
+    # -------------------------------------------------------------------------
+    # Decoding
+    # -------------------------------------------------------------------------
+
+    def _broker_in(self, attributes: Any) -> Optional[str]:
+        raw = json.dumps(attributes, default=str)
+        return next((broker for broker in self.brokers if broker in raw), None)
+
+    def decode_events(self, block_number: int, block_hash: str, events: List[Any]) -> List[Dict[str, Any]]:
+        """ShapeShift swap/broker-fee records among a block's event records"""
+        records = []
+        for index, event in enumerate(events):
+            value = getattr(event, 'value', event)
+            pallet = value.get('module_id') or ''
+            name = value.get('event_id') or ''
+            if name not in SWAP_EVENTS and name not in BROKER_FEE_EVENTS:
+                continue
+
+            attributes = value.get('attributes')
+            request_id = attributes.get('swap_request_id') if isinstance(attributes, dict) else None
+            request_id = str(request_id) if request_id is not None else None
+            broker = self._broker_in(attributes)
+
+            if broker is None and request_id in self.open_requests:
+                broker = self.open_requests[request_id]
+            if broker is None:
+                continue
+
+            kind = 'broker_fee' if name in BROKER_FEE_EVENTS else 'swap'
+            if kind == 'swap' and request_id is not None:
+                if name == 'SwapRequestCompleted':
+                    self.open_requests.pop(request_id, None)
+                else:
+                    self.open_requests[request_id] = broker
+                    self.open_requests.move_to_end(request_id)
+                    while len(self.open_requests) > self.max_open_requests:
+                        self.open_requests.popitem(last=False)
+
+            records.append({
+                'block_number': block_number,
+                'block_hash': block_hash,
+                'event_index': f"{block_number}-{index}",
+                'pallet': pallet,
+                'event': name,
+                'kind': kind,
+                'broker': broker,
+                'swap_request_id': request_id,
+                'attributes': attributes,
+            })
+        return records
+
+    # -------------------------------------------------------------------------
+    # Streaming
+    # -------------------------------------------------------------------------
+
+    def process_block(self, block_number: int) -> int:
+        """Decode, emit and checkpoint one finalized block; returns records emitted"""
+        block_hash = self._substrate.get_block_hash(block_number)
+        records = self.decode_events(block_number, block_hash, self._substrate.get_events(block_hash))
+        for record in records:
+            self.on_event(record)
+        self.checkpoint(block_number)
+        return len(records)
+
+    def catch_up(self, finalized: int) -> int:
+        """Process every block from the checkpoint through the finalized head"""
+        emitted = 0
+        while self.next_block <= finalized:
+            emitted += self.process_block(self.next_block)
+        return emitted
+
+    def _resolve_start(self, finalized: int):
+        if self.next_block is None:
+            default = self.start_block if self.start_block > 0 else finalized
+            self.next_block = self.tracker.get_last_scanned_block('chainflip', 'chainflip', default)
+
+    def run(self, max_blocks: Optional[int] = None):
+        """Follow finalized heads until max_blocks have been processed (forever if None).
+
+        A failure while reading a block or a dropped subscription reconnects
+        after a backoff and resumes from the checkpointed next_block.
+        """
+        delay = self.retry_delay
+        while True:
+            resumed_from = self.next_block
+            try:
+                return self._follow(max_blocks)
+            except ImportError:
+                raise
+            except Exception as e:
+                if self.next_block != resumed_from:
+                    # Progress was made since the last reconnect: start the backoff over
+                    delay = self.retry_delay
+                logger.warning(f"⚠️ Chainflip stream failed ({e}), resuming from block {self.next_block} "
+                               f"in {delay:.0f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    def _follow(self, max_blocks: Optional[int]):
+        """Stream over one pair of connections; raises on node or socket errors"""
+        self._substrate = _connect(self.ws_url)
+        subscription = None
+        try:
+            # Queries go over their own connection; the subscription socket only carries headers
+            subscription = _connect(self.ws_url)
+            finalized = self._substrate.get_block_number(self._substrate.get_chain_finalised_head())
+            self._resolve_start(finalized)
+            if self._first_block is None:
+                self._first_block = self.next_block
+            first_block = self._first_block
+            logger.info(f"🚀 Streaming Chainflip finalized blocks from {self.next_block}")
+
+            def handler(header, update_nr, subscription_id):
+                head = int(header['header']['number'])
+                emitted = self.catch_up(head if max_blocks is None else min(head, first_block + max_blocks - 1))
+                if emitted:
+                    logger.info(f"🎯 Block {head}: {emitted} ShapeShift broker events")
+                if max_blocks is not None and self.next_block >= first_block + max_blocks:
+                    return self.next_block - 1
+
+            return subscription.subscribe_block_headers(handler, finalized_only=True)
+        finally:
+            if subscription is not None:
+                subscription.close()
+            self._substrate.close()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Coalescing CoinMarketCap Client
+Token lookups are buffered for a short window and sent as one multi-token
+quote request. CoinMarketCap quotes by id, not by contract address, so
+addresses are first resolved through a locally cached copy of
+/v1/cryptocurrency/map (refreshed daily, a few credits per refresh), keyed on
+the platform's chain and the contract address so a token deployed at the same
+address on two chains is not confused with another. The ids
+of a whole window are then priced with one /v2/cryptocurrency/quotes/latest
+call per 100 ids.
+
+Concurrent callers asking for the same address share one in-flight future.
+Results are persisted in the token store (with on-chain decimals, never an
+assumed 18), and misses and rate limits are recorded in its negative cache.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+import token_cache
+from token_cache import DEFAULT_CHAIN_ID, negative_reason, record_failures
+
+logger = logging.getLogger(__name__)
+
+CMC_API = "https://pro-api.coinmarketcap.com"
+MAP_PAGE_SIZE = 5000
+QUOTE_BATCH_SIZE = 100  # ids per quotes request (1 credit per 100)
+MAP_VERSION = 2
+
+# CoinMarketCap platform slug -> EVM chain id (see token_cache.CHAIN_IDS)
+CMC_PLATFORM_CHAINS = {
+    'ethereum': 1,
+    'optimism-ethereum': 10,
+    'bnb': 56,
+    'xdai': 100,
+    'gnosis': 100,
+    'polygon': 137,
+    'matic-network': 137,
+    'base': 8453,
+    'arbitrum': 42161,
+    'avalanche': 43114,
+}
+
+Key = Tuple[int, str]  # (chain_id, lowercase address)
+
+
+class CMCClient:
+    """Batched, coalescing CoinMarketCap token lookups.
+
+    Args:
+        api_key: CoinMarketCap API key.
+        window: Seconds a lookup waits for others to join its batch.
+        max_batch: Pending lookups that trigger an immediate send.
+        map_path: Where the address -> CoinMarketCap id map is persisted.
+        map_ttl: Seconds before the id map is refetched.
+    """
+
+    def __init__(self, api_key: str, window: float = 0.05, max_batch: int = 100,
+                 map_path: str = "databases/cmc_map.json", map_ttl: int = 86400):
+        self.api_key = api_key
+        self.window = window
+        self.max_batch = max_batch
+        self.map_path = map_path
+        self.map_ttl = map_ttl
+
+        self.session = requests.Session()
+        self.session.headers.update({'X-CMC_PRO_API_KEY': api_key, 'Accept': 'application/json'})
+
+        self._lock = threading.Lock()
+        self._pending: Dict[Key, Future] = {}
+        self._inflight: Dict[Key, Future] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._sender = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cmc')
+
+        self._map_lock = threading.Lock()
+        # "chain_id:address" -> CoinMarketCap id
+        self._ids: Dict[str, int] = {}
+        self._map_fetched_at = 0.0
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    def lookup(self, address: str, chain_id: int = DEFAULT_CHAIN_ID) -> Future:
+        """Future resolving to the token's CoinMarketCap info (or None)"""
+        key = (chain_id, address.lower())
+        with self._lock:
+            future = self._pending.get(key) or self._inflight.get(key)
+            if future is not None:
+                return future
+        # Tokens CoinMarketCap recently did not know (or rate limited) are not re-asked.
+        # Checked outside the lock: it is a SQLite read.
+        if negative_reason(key[1], 'cmc', chain_id):
+            future = Future()
+            future.set_result(None)
+            return future
+        with self._lock:
+            future = self._pending.get(key) or self._inflight.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return future
+
+    def get_token_info(self, address: str, chain_id: int = DEFAULT_CHAIN_ID,
+                       timeout: Optional[float] = 30) -> Optional[Dict]:
+        """Blocking single lookup; batches with any concurrent callers"""
+        return self.lookup(address, chain_id).result(timeout)
+
+    def get_token_infos(self, addresses: Iterable[str], chain_id: int = DEFAULT_CHAIN_ID,
+                        timeout: Optional[float] = 30) -> Dict[str, Optional[Dict]]:
+        """Blocking lookup of many addresses, keyed by the addresses as given"""
+        futures = {address: self.lookup(address, chain_id) for address in addresses}
+        return {address: future.result(timeout) for address, future in futures.items()}
+
+    # -------------------------------------------------------------------------
+    # Coalescing
+    # -------------------------------------------------------------------------
+
+    def _flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            self._inflight.update(batch)
+            self._sender.submit(self._send, batch)
+
+    def _send(self, batch: Dict[Key, Future]):
+        results: Dict[Key, Optional[Dict]] = {}
+        try:
+            results = self._fetch(list(batch))
+        except Exception as e:
+            logger.warning(f"⚠️ CoinMarketCap batch of {len(batch)} failed: {e}")
+        finally:
+            with self._lock:
+                for key in batch:
+                    self._inflight.pop(key, None)
+            for key, future in batch.items():
+                future.set_result(results.get(key))
+
+    # -------------------------------------------------------------------------
+    # CoinMarketCap requests
+    # -------------------------------------------------------------------------
+
+    def _get(self, path: str, params: Dict) -> Optional[Dict]:
+        """GET an endpoint; None when rate limited"""
+        response = self.session.get(f"{CMC_API}{path}", params=params, timeout=30)
+        if response.status_code == 429:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _map_key(chain_id: int, address: str) -> str:
+        return f"{chain_id}:{address.lower()}"
+
+    def _load_map(self):
+        """(chain, address) -> CoinMarketCap id, from disk or a fresh paginated fetch"""
+        with self._map_lock:
+            if self._ids and time.time() - self._map_fetched_at < self.map_ttl:
+                return
+            if not self._ids and os.path.exists(self.map_path):
+                try:
+                    with open(self.map_path, 'r') as f:
+                        saved = json.load(f)
+                    # Older maps were keyed on the address alone; refetch those
+                    if saved.get('v') == MAP_VERSION:
+                        self._ids, self._map_fetched_at = saved['ids'], saved['fetched_at']
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"⚠️ Ignoring unreadable CoinMarketCap map {self.map_path}: {e}")
+                if self._ids and time.time() - self._map_fetched_at < self.map_ttl:
+                    return
+
+            ids: Dict[str, int] = {}
+            start = 1
+            while True:
+                payload = self._get('/v1/cryptocurrency/map', {'start': start, 'limit': MAP_PAGE_SIZE})
+                if payload is None:
+                    logger.warning("⚠️ CoinMarketCap map refresh rate limited, keeping the cached map")
+                    return
+                entries = payload.get('data', [])
+                for entry in entries:
+                    platform = entry.get('platform') or {}
+                    chain_id = CMC_PLATFORM_CHAINS.get(platform.get('slug') or '')
+                    if chain_id is not None and platform.get('token_address'):
+                        ids.setdefault(self._map_key(chain_id, platform['token_address']), entry['id'])
+                if len(entries) < MAP_PAGE_SIZE:
+                    break
+                start += MAP_PAGE_SIZE
+
+            self._ids, self._map_fetched_at = ids, time.time()
+            os.makedirs(os.path.dirname(self.map_path) or '.', exist_ok=True)
+            tmp_path = f"{self.map_path}.tmp.{os.getpid()}"
+            with open(tmp_path, 'w') as f:
+                json.dump({'v': MAP_VERSION, 'fetched_at': self._map_fetched_at, 'ids': ids}, f,
+                          separators=(',', ':'))
+            os.replace(tmp_path, self.map_path)
+            logger.info(f"✅ Loaded {len(ids)} CoinMarketCap token addresses")
+
+    def _fetch(self, keys: List[Key]) -> Dict[Key, Optional[Dict]]:
+        self._load_map()
+
+        by_id: Dict[int, List[Key]] = {}
+        failures: Dict[int, Dict[str, str]] = {}
+        for key in keys:
+            cmc_id = self._ids.get(self._map_key(*key))
+            if cmc_id is None:
+                failures.setdefault(key[0], {})[key[1]] = 'not_found'
+            else:
+                by_id.setdefault(cmc_id, []).append(key)
+
+        results: Dict[Key, Optional[Dict]] = {}
+        ids = sorted(by_id)
+        for start in range(0, len(ids), QUOTE_BATCH_SIZE):
+            batch_ids = ids[start:start + QUOTE_BATCH_SIZE]
+            payload = self._get('/v2/cryptocurrency/quotes/latest',
+                                {'id': ','.join(map(str, batch_ids)), 'convert': 'USD'})
+            if payload is None:
+                for cmc_id in batch_ids:
+                    for chain_id, address in by_id[cmc_id]:
+                        failures.setdefault(chain_id, {})[address] = 'rate_limited'
+                continue
+            data = payload.get('data', {})
+            for cmc_id in batch_ids:
+                token_data = data.get(str(cmc_id))
+                usd = (token_data or {}).get('quote', {}).get('USD', {})
+                for chain_id, address in by_id[cmc_id]:
+                    if token_data is None:
+                        failures.setdefault(chain_id, {})[address] = 'not_found'
+                        continue
+                    results[(chain_id, address)] = {
+                        'address': address,
+                        'symbol': token_data['symbol'],
+                        'name': token_data['name'],
+                        'decimals': None,
+                        'price': usd.get('price'),
+                        'market_cap': usd.get('market_cap'),
+                        'cmc_id': cmc_id,
+                        'source': 'coinmarketcap'
+                    }
+
+        for chain_id, chain_failures in failures.items():
+            record_failures(chain_failures, 'cmc', chain_id=chain_id)
+        self._persist(results)
+        return results
+
+    def _persist(self, results: Dict[Key, Dict]):
+        """Store found tokens (with on-chain decimals) in the token store"""
+        by_chain: Dict[int, Dict[str, Dict]] = {}
+        for (chain_id, address), info in results.items():
+            by_chain.setdefault(chain_id, {})[address] = info
+
+        for chain_id, infos in by_chain.items():
+            try:
+                known = token_cache.get_token_infos(infos, chain_id)
+            except Exception as e:
+                # No RPC registered for the chain: return the quotes without decimals
+                logger.warning(f"⚠️ Not storing {len(infos)} CoinMarketCap tokens, no on-chain decimals "
+                               f"for chain {chain_id}: {e}")
+                continue
+            rows = []
+            for address, info in infos.items():
+                on_chain = known.get(address)
+                if on_chain is None:
+                    continue
+                info['decimals'] = on_chain['decimals']
+                rows.append(info)
+            token_cache.store_token_infos(rows, chain_id)
+
+    def close(self):
+        self._flush()
+        self._sender.shutdown(wait=True)
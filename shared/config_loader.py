@@ -187,6 +187,41 @@ class ConfigLoader:
         
         return ""
     
+    def get_csv_sink_config(self) -> Dict[str, Any]:
+        """Get CSV sink settings (buffering, fsync policy and rotation)"""
+        if not self.config or 'storage' not in self.config:
+            return {}
+        
+        return dict(self.config['storage'].get('csv_sink', {}) or {})
+    
+    def get_dedup_config(self) -> Dict[str, Any]:
+        """Get dedup index sizing (expected keys and Bloom false-positive rate)"""
+        if not self.config or 'storage' not in self.config:
+            return {}
+        
+        return dict(self.config['storage'].get('dedup', {}) or {})
+    
+    def get_negative_cache_config(self) -> Dict[str, Any]:
+        """Get failed token lookup caching settings (TTL seconds per reason code)"""
+        if not self.config or 'storage' not in self.config:
+            return {}
+        
+        return dict(self.config['storage'].get('negative_cache', {}) or {})
+    
+    def get_price_history_config(self) -> Dict[str, Any]:
+        """Get historical price store settings (database path, max quote gap)"""
+        if not self.config or 'storage' not in self.config:
+            return {}
+        
+        return dict(self.config['storage'].get('price_history', {}) or {})
+    
+    def get_http_cache_config(self) -> Dict[str, Any]:
+        """Get HTTP response cache settings (disk directory, in-memory entries)"""
+        if not self.config or 'storage' not in self.config:
+            return {}
+        
+        return dict(self.config['storage'].get('http_cache', {}) or {})
+    
     def get_listener_config(self, protocol: str) -> Dict[str, Any]:
         """Get listener configuration for specific protocol"""
         if not self.config or 'listeners' not in self.config:
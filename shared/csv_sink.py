@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+CSV Sink
+Long-lived, buffered CSV writer used by the CSV listeners.
+
+The sink owns a single append handle for the lifetime of a listener run, writes
+rows in the column order declared by the listener (never the order of whatever
+dict happens to arrive first) and buffers rows until a size, time or checkpoint
+boundary is reached.
+"""
+
+import csv
+import glob
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ('never', 'checkpoint', 'always')
+
+
+def rotated_paths(path: str) -> List[str]:
+    """Rotated siblings of a sink file (oldest first) followed by the file itself.
+
+    Files set aside for a schema mismatch (<stem>.schema*.csv) are not part of
+    the sink's history and are skipped.
+    """
+    stem, ext = os.path.splitext(path)
+    paths = sorted((candidate for candidate in glob.glob(f"{glob.escape(stem)}.*{ext}")
+                    if not os.path.basename(candidate)[len(os.path.basename(stem)):].startswith('.schema')),
+                   key=os.path.getmtime)
+    if os.path.exists(path):
+        paths.append(path)
+    return paths
+
+
+class CSVSink:
+    """Append-only CSV writer with a fixed schema, buffering and rotation.
+
+    Args:
+        path: Active CSV file path.
+        fieldnames: Column order to enforce. Missing values are written empty,
+            unknown keys are dropped (and logged once).
+        flush_rows: Flush once this many rows are buffered.
+        flush_interval: Flush on the next write once this many seconds have
+            passed since the previous flush.
+        fsync: 'never', 'checkpoint' (fsync on checkpoint/close) or 'always'
+            (fsync on every flush).
+        rotate_max_bytes: Rotate the active file once it reaches this size.
+            0 disables size-based rotation.
+        rotate_daily: Rotate the active file when the UTC day changes.
+    """
+
+    def __init__(self, path: str, fieldnames: List[str], flush_rows: int = 500,
+                 flush_interval: float = 5.0, fsync: str = 'checkpoint',
+                 rotate_max_bytes: int = 0, rotate_daily: bool = False):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Invalid fsync policy '{fsync}', expected one of {FSYNC_POLICIES}")
+
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self._fieldset = set(self.fieldnames)
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = float(flush_interval)
+        self.fsync = fsync
+        self.rotate_max_bytes = int(rotate_max_bytes or 0)
+        self.rotate_daily = bool(rotate_daily)
+
+        self._lock = threading.RLock()
+        self._buffer: List[Dict[str, Any]] = []
+        self._file = None
+        self._writer: Optional[csv.DictWriter] = None
+        self._opened_day: Optional[date] = None
+        self._last_flush = time.monotonic()
+        self._warned_fields: set = set()
+
+        self._open()
+
+    # -------------------------------------------------------------------------
+    # File handling
+    # -------------------------------------------------------------------------
+
+    def _open(self):
+        """Open the active file, writing the header if it is new or empty"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            existing_header = self._read_header(self.path)
+            if existing_header != self.fieldnames:
+                # Never append rows under a header that does not describe them
+                self._migrate_header(existing_header)
+
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames,
+                                      restval='', extrasaction='ignore')
+        if is_new:
+            self._writer.writeheader()
+            self._file.flush()
+            self._opened_day = self._today()
+        else:
+            self._opened_day = datetime.fromtimestamp(os.path.getmtime(self.path), timezone.utc).date()
+
+    def _migrate_header(self, existing_header: List[str]):
+        """Rewrite the active file under the declared header, leaving new columns empty.
+
+        Raises ValueError if the file has columns the schema does not declare,
+        since rewriting would drop their data.
+        """
+        dropped = [name for name in existing_header if name not in self._fieldset]
+        if dropped:
+            raise ValueError(f"{self.path} has columns missing from the declared schema: {dropped}. "
+                             f"Move or convert the file before running the listener.")
+
+        added = [name for name in self.fieldnames if name not in existing_header]
+        tmp_path = f"{self.path}.migrate.{os.getpid()}"
+        with open(self.path, 'r', newline='', encoding='utf-8') as src, \
+                open(tmp_path, 'w', newline='', encoding='utf-8') as dst:
+            reader = csv.DictReader(src)
+            writer = csv.DictWriter(dst, fieldnames=self.fieldnames, restval='', extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(reader)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp_path, self.path)
+        logger.info(f"Migrated {self.path} to the current schema (added columns: {added or 'reordered only'})")
+
+    @staticmethod
+    def _read_header(path: str) -> List[str]:
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            return next(csv.reader(f), [])
+
+    @staticmethod
+    def _today() -> date:
+        return datetime.now(timezone.utc).date()
+
+    def _rotated_name(self, suffix: str) -> str:
+        stem, ext = os.path.splitext(self.path)
+        candidate = f"{stem}.{suffix}{ext}"
+        counter = 1
+        while os.path.exists(candidate):
+            candidate = f"{stem}.{suffix}-{counter}{ext}"
+            counter += 1
+        return candidate
+
+    def _rotate_file(self, suffix: str):
+        """Move the active file aside under a unique rotated name"""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+        if os.path.exists(self.path):
+            rotated = self._rotated_name(suffix)
+            os.replace(self.path, rotated)
+            logger.info(f"Rotated {self.path} -> {rotated}")
+
+    def rotate(self):
+        """Start a new active file (buffered rows go to the new file)"""
+        with self._lock:
+            day = (self._opened_day or self._today()).strftime('%Y%m%d')
+            self._rotate_file(suffix=f"{day}-{datetime.now(timezone.utc).strftime('%H%M%S')}")
+            self._open()
+
+    def _should_rotate(self) -> bool:
+        if self.rotate_daily and self._opened_day != self._today():
+            return True
+        if self.rotate_max_bytes and self._file is not None and self._file.tell() >= self.rotate_max_bytes:
+            return True
+        return False
+
+    def all_paths(self) -> List[str]:
+        """Rotated files (oldest first) followed by the active file"""
+        return rotated_paths(self.path)
+
+    # -------------------------------------------------------------------------
+    # Writing
+    # -------------------------------------------------------------------------
+
+    def write_rows(self, rows: Iterable[Dict[str, Any]]):
+        """Buffer rows, flushing when the size or time threshold is reached"""
+        with self._lock:
+            for row in rows:
+                unknown = row.keys() - self._fieldset - self._warned_fields
+                if unknown:
+                    logger.warning(f"Dropping fields not in the {os.path.basename(self.path)} schema: {sorted(unknown)}")
+                    self._warned_fields.update(unknown)
+                self._buffer.append(row)
+
+            if (len(self._buffer) >= self.flush_rows or
+                    time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+
+    def _write_buffer(self):
+        if self._buffer:
+            self._writer.writerows(self._buffer)
+            self._buffer.clear()
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Write buffered rows to the OS (fsync only under the 'always' policy)"""
+        with self._lock:
+            if self._should_rotate():
+                self.rotate()
+            self._write_buffer()
+            if self.fsync == 'always':
+                os.fsync(self._file.fileno())
+            if self.rotate_max_bytes and self._file.tell() >= self.rotate_max_bytes:
+                self.rotate()
+
+    def checkpoint(self):
+        """Flush and make rows durable before a block tracker advances"""
+        with self._lock:
+            self.flush()
+            if self.fsync != 'never':
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        """Checkpoint and release the file handle"""
+        with self._lock:
+            if self._file is None:
+                return
+            self.checkpoint()
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    @property
+    def pending_rows(self) -> int:
+        return len(self._buffer)
+
+    def __enter__(self) -> 'CSVSink':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+CSV Running Statistics
+Maintains aggregates (counts, volume and affiliate fees per chain, affiliate,
+day, ...) for a transactions CSV as rows are written, so listeners can report
+statistics without re-reading their whole history.
+
+The aggregates are persisted as JSON next to the CSV
+(``portals_transactions.csv`` -> ``portals_transactions.stats.json``) together
+with the byte size of the data they describe. If the data no longer matches
+(stats file missing, crash between a flush and a save, files edited by hand)
+the aggregates are rebuilt from the raw CSVs in a single streaming pass.
+
+Usage:
+    python csv_stats.py rebuild csv_data/transactions/portals_transactions.csv [...]
+"""
+
+import csv
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from csv_sink import rotated_paths
+
+logger = logging.getLogger(__name__)
+
+STATS_VERSION = 1
+
+# Aggregate name -> CSV column
+DEFAULT_DIMENSIONS = {
+    'chains': 'chain',
+    'affiliate_addresses': 'affiliate_address',
+}
+
+VOLUME_RANGES = (
+    ('under_13', 13),
+    ('13_to_100', 100),
+    ('100_to_1000', 1000),
+    ('over_1000', None),
+)
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _day_of(timestamp: Any) -> str:
+    """UTC day for a unix timestamp in seconds, milliseconds or nanoseconds"""
+    try:
+        ts = float(timestamp)
+    except (TypeError, ValueError):
+        return 'unknown'
+    if ts > 1e17:
+        ts /= 1e9  # Midgard dates are nanoseconds
+    elif ts > 1e11:
+        ts /= 1e3
+    try:
+        return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d')
+    except (OverflowError, OSError, ValueError):
+        return 'unknown'
+
+
+class RunningStats:
+    """Incrementally maintained aggregates for one transactions CSV"""
+
+    def __init__(self, csv_path: str, dimensions: Optional[Dict[str, str]] = None):
+        self.csv_path = csv_path
+        self.stats_path = os.path.splitext(csv_path)[0] + '.stats.json'
+        self.dimensions = dict(dimensions or DEFAULT_DIMENSIONS)
+        self.dimensions.setdefault('days', 'timestamp')
+        self._data = self._empty()
+
+    def _empty(self) -> Dict[str, Any]:
+        return {
+            'version': STATS_VERSION,
+            'dimensions': dict(self.dimensions),
+            'source_bytes': 0,
+            'total_transactions': 0,
+            'volume_usd': 0.0,
+            'affiliate_fee_usd': 0.0,
+            'volume_ranges': {name: 0 for name, _ in VOLUME_RANGES},
+            'by': {name: {} for name in self.dimensions},
+        }
+
+    @classmethod
+    def from_stats_file(cls, csv_path: str) -> 'RunningStats':
+        """Create stats for a CSV reusing the dimensions recorded in its stats file"""
+        stats = cls(csv_path)
+        try:
+            with open(stats.stats_path, 'r', encoding='utf-8') as f:
+                stats.dimensions = json.load(f).get('dimensions') or stats.dimensions
+        except (OSError, ValueError):
+            pass
+        stats._data = stats._empty()
+        return stats
+
+    # -------------------------------------------------------------------------
+    # Updates
+    # -------------------------------------------------------------------------
+
+    def update(self, rows: Iterable[Dict[str, Any]]):
+        """Fold newly written rows into the aggregates"""
+        data = self._data
+        for row in rows:
+            volume_usd = _to_float(row.get('volume_usd'))
+            fee_usd = _to_float(row.get('affiliate_fee_usd'))
+
+            data['total_transactions'] += 1
+            data['volume_usd'] += volume_usd
+            data['affiliate_fee_usd'] += fee_usd
+
+            for range_name, upper in VOLUME_RANGES:
+                if upper is None or volume_usd < upper:
+                    data['volume_ranges'][range_name] += 1
+                    break
+
+            for name, column in self.dimensions.items():
+                if name == 'days':
+                    key = _day_of(row.get(column))
+                else:
+                    key = str(row.get(column) or 'unknown')
+                bucket = data['by'][name].get(key)
+                if bucket is None:
+                    bucket = data['by'][name][key] = {'count': 0, 'volume_usd': 0.0, 'affiliate_fee_usd': 0.0}
+                bucket['count'] += 1
+                bucket['volume_usd'] += volume_usd
+                bucket['affiliate_fee_usd'] += fee_usd
+
+    def _source_bytes(self) -> int:
+        return sum(os.path.getsize(path) for path in rotated_paths(self.csv_path))
+
+    # -------------------------------------------------------------------------
+    # Persistence
+    # -------------------------------------------------------------------------
+
+    def save(self):
+        """Persist the aggregates atomically (call after the CSV is flushed)"""
+        self._data['source_bytes'] = self._source_bytes()
+        tmp_path = f"{self.stats_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, separators=(',', ':'))
+        os.replace(tmp_path, self.stats_path)
+
+    def load(self):
+        """Load persisted aggregates, rebuilding them if they are missing or stale"""
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if (data.get('version') == STATS_VERSION and
+                    data.get('dimensions') == self.dimensions and
+                    data.get('source_bytes') == self._source_bytes()):
+                self._data = data
+                return
+            logger.info(f"Stats for {self.csv_path} are stale, rebuilding")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read {self.stats_path} ({e}), rebuilding")
+
+        self.rebuild()
+
+    def rebuild(self):
+        """Regenerate the aggregates from the raw CSVs in one streaming pass"""
+        self._data = self._empty()
+        for path in rotated_paths(self.csv_path):
+            with open(path, 'r', newline='', encoding='utf-8') as f:
+                self.update(csv.DictReader(f))
+        self.save()
+        logger.info(f"Rebuilt stats for {self.csv_path}: {self._data['total_transactions']} transactions")
+
+    # -------------------------------------------------------------------------
+    # Reads
+    # -------------------------------------------------------------------------
+
+    @property
+    def total_transactions(self) -> int:
+        return self._data['total_transactions']
+
+    @property
+    def volume_usd(self) -> float:
+        return self._data['volume_usd']
+
+    @property
+    def affiliate_fee_usd(self) -> float:
+        return self._data['affiliate_fee_usd']
+
+    @property
+    def volume_ranges(self) -> Dict[str, int]:
+        return dict(self._data['volume_ranges'])
+
+    def counts(self, dimension: str) -> Dict[str, int]:
+        """Row counts per key of a dimension (e.g. 'chains')"""
+        return {key: bucket['count'] for key, bucket in self._data['by'].get(dimension, {}).items()}
+
+    def totals(self, dimension: str) -> Dict[str, Dict[str, Any]]:
+        """Count, volume and affiliate fees per key of a dimension"""
+        return {key: dict(bucket) for key, bucket in self._data['by'].get(dimension, {}).items()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of all aggregates"""
+        return json.loads(json.dumps(self._data))
+
+
+def main(argv: List[str]):
+    """Rebuild the stats files for the given transactions CSVs"""
+    if len(argv) < 2 or argv[0] != 'rebuild':
+        print('Usage: python csv_stats.py rebuild <transactions.csv> [...]')
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    for csv_path in argv[1:]:
+        stats = RunningStats.from_stats_file(csv_path)
+        stats.rebuild()
+        print(f"✅ {csv_path}: {stats.total_transactions} transactions")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
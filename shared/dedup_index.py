@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Dedup Index
+Persistent record of which (chain, tx_hash, log_index) rows have already been
+written, consulted before every write so replays and overlapping backfills do
+not append duplicates.
+
+Keys are stored as 16-byte BLAKE2b digests in a SQLite WITHOUT ROWID table (the
+exact store), fronted by an in-memory Bloom filter. Most keys in a scan are new,
+and the Bloom filter answers "definitely new" for those without touching disk;
+only possible hits are confirmed against SQLite. The filter is persisted next to
+the database at most every bloom_save_interval seconds and on close(); after a
+crash its generation no longer matches the exact store and it is rebuilt from
+SQLite, so it can never cause a duplicate to slip through.
+"""
+
+import csv
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import struct
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_BLOOM_MAGIC = b'SSBLOOM1'
+_BLOOM_HEADER = struct.Struct('<8sQQQ')  # magic, bit count, hash count, generation
+
+
+def make_key(chain: Any, tx_hash: Any, log_index: Any = '') -> Optional[bytes]:
+    """16-byte digest identifying one written row, None if the row has no tx id.
+
+    Rows without a real tx id (empty or an all-zero placeholder hash) cannot
+    be told apart, so they are never deduplicated.
+    """
+    if not str(tx_hash or '').lower().removeprefix('0x').strip('0'):
+        return None
+    raw = f"{str(chain).lower()}|{str(tx_hash).lower()}|{'' if log_index is None else log_index}"
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).digest()
+
+
+def row_key(row: Dict[str, Any]) -> Optional[bytes]:
+    """Dedup key for a transactions CSV row"""
+    return make_key(row.get('chain', ''), row.get('tx_hash', ''), row.get('log_index', ''))
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 16-byte digests (double hashing)"""
+
+    def __init__(self, expected_items: int, false_positive_rate: float):
+        expected_items = max(1, int(expected_items))
+        bits = -expected_items * math.log(false_positive_rate) / (math.log(2) ** 2)
+        self.num_bits = max(8, int(math.ceil(bits / 8)) * 8)
+        self.num_hashes = max(1, round(self.num_bits / expected_items * math.log(2)))
+        self.bits = bytearray(self.num_bits // 8)
+
+    def _positions(self, key: bytes):
+        h1 = int.from_bytes(key[:8], 'little')
+        h2 = int.from_bytes(key[8:16], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: bytes):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: bytes) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def save(self, path: str, generation: int):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_BLOOM_HEADER.pack(_BLOOM_MAGIC, self.num_bits, self.num_hashes, generation))
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> Optional[int]:
+        """Load bits saved with the same geometry, returning their generation"""
+        try:
+            with open(path, 'rb') as f:
+                magic, num_bits, num_hashes, generation = _BLOOM_HEADER.unpack(f.read(_BLOOM_HEADER.size))
+                if magic != _BLOOM_MAGIC or num_bits != self.num_bits or num_hashes != self.num_hashes:
+                    return None
+                bits = f.read()
+        except (OSError, struct.error):
+            return None
+        if len(bits) != len(self.bits):
+            return None
+        self.bits = bytearray(bits)
+        return generation
+
+
+class DedupIndex:
+    """Exact on-disk key set with a Bloom filter in front.
+
+    Args:
+        db_path: SQLite file holding the exact key set.
+        expected_keys: Sizing hint for the Bloom filter. Exceeding it only
+            raises the false-positive rate (more SQLite lookups), never
+            correctness.
+        false_positive_rate: Target Bloom false-positive rate.
+        key_func: Maps a row to its key (default: chain, tx_hash, log_index),
+            or None for rows that should always be written.
+        bloom_save_interval: Minimum seconds between Bloom filter saves on
+            commit (the filter is a full rewrite of its bit array).
+
+    Rows written before log_index existed were keyed with an empty log index;
+    a row with a log index also counts as seen if that legacy key was seeded.
+    """
+
+    def __init__(self, db_path: str, expected_keys: int = 10_000_000,
+                 false_positive_rate: float = 0.01,
+                 key_func: Callable[[Dict[str, Any]], Optional[bytes]] = row_key,
+                 bloom_save_interval: float = 300):
+        self.db_path = db_path
+        self.bloom_path = f"{db_path}.bloom"
+        self.key_func = key_func
+        self.bloom_save_interval = bloom_save_interval
+        self.is_new = not os.path.exists(db_path)
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS seen (key BLOB PRIMARY KEY) WITHOUT ROWID')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)')
+        self.conn.commit()
+
+        self.bloom = BloomFilter(expected_keys, false_positive_rate)
+        self._generation = self._read_generation()
+        self._bloom_generation = self.bloom.load(self.bloom_path)
+        self._bloom_saved_at = time.monotonic()
+        if self._bloom_generation != self._generation:
+            self._rebuild_bloom()
+
+    def _read_generation(self) -> int:
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def _rebuild_bloom(self):
+        """Repopulate the Bloom filter from the exact store"""
+        logger.info(f"Rebuilding dedup Bloom filter from {self.db_path}")
+        self.bloom.bits = bytearray(len(self.bloom.bits))
+        for (key,) in self.conn.execute('SELECT key FROM seen'):
+            self.bloom.add(key)
+        self._save_bloom()
+
+    def _save_bloom(self):
+        self.bloom.save(self.bloom_path, self._generation)
+        self._bloom_generation = self._generation
+        self._bloom_saved_at = time.monotonic()
+
+    def _exists(self, key: bytes) -> bool:
+        return self.conn.execute('SELECT 1 FROM seen WHERE key = ?', (key,)).fetchone() is not None
+
+    def _seen(self, key: bytes) -> bool:
+        return key in self.bloom and self._exists(key)
+
+    def filter_new(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return the rows not written before and record their keys.
+
+        Keys are recorded in the open SQLite transaction; call commit() once
+        the rows themselves are durable.
+        """
+        new_rows = []
+        new_keys = []
+        batch_keys = set()
+        for row in rows:
+            key = self.key_func(row)
+            if key is None:
+                new_rows.append(row)
+                continue
+            if key in batch_keys:
+                continue
+            if self._seen(key):
+                continue
+            if row.get('log_index') not in (None, ''):
+                legacy_key = self.key_func({**row, 'log_index': ''})
+                if legacy_key is not None and self._seen(legacy_key):
+                    continue
+            batch_keys.add(key)
+            new_keys.append((key,))
+            new_rows.append(row)
+
+        if new_keys:
+            self.conn.executemany('INSERT OR IGNORE INTO seen (key) VALUES (?)', new_keys)
+            for (key,) in new_keys:
+                self.bloom.add(key)
+        return new_rows
+
+    def commit(self):
+        """Commit recorded keys; the Bloom filter is saved once bloom_save_interval has passed"""
+        if self.conn.in_transaction:
+            self._generation += 1
+            self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('generation', ?)",
+                              (self._generation,))
+            self.conn.commit()
+        if (self._bloom_generation != self._generation
+                and time.monotonic() - self._bloom_saved_at >= self.bloom_save_interval):
+            self._save_bloom()
+
+    def rollback(self):
+        """Forget keys recorded since the last commit"""
+        self.conn.rollback()
+        self._rebuild_bloom()
+
+    def seed_from_csv(self, paths: Iterable[str]) -> int:
+        """Record the keys of rows already present in existing CSV files"""
+        seeded = 0
+        for path in paths:
+            with open(path, 'r', newline='', encoding='utf-8') as f:
+                batch = []
+                for row in csv.DictReader(f):
+                    batch.append(row)
+                    if len(batch) >= 10000:
+                        seeded += len(self.filter_new(batch))
+                        batch = []
+                seeded += len(self.filter_new(batch))
+        self.commit()
+        logger.info(f"Seeded dedup index {self.db_path} with {seeded} existing rows")
+        return seeded
+
+    def close(self):
+        self.commit()
+        if self._bloom_generation != self._generation:
+            self._save_bloom()
+        self.conn.close()
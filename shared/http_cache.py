@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+HTTP Response Cache
+JSON GETs for the Midgard and Thornode clients. Responses are remembered in a
+small in-memory LRU with their ETag/Last-Modified validators, and repeat
+requests are sent as conditional GETs, so polling an unchanged head costs a
+304 with no body to download or parse. Pages the caller marks immutable
+(historical height ranges) are also written to an on-disk cache and are
+served from it without touching the network.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse(NamedTuple):
+    data: Any
+    status: int           # 200, or 304 when the server confirmed the cached copy
+    from_disk: bool = False
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304 or self.from_disk
+
+
+def cache_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Stable key of a GET: URL plus sorted query parameters"""
+    query = '&'.join(f"{key}={params[key]}" for key in sorted(params or {}) if params[key] is not None)
+    return f"{url}?{query}" if query else url
+
+
+class HTTPCache:
+    """Conditional-GET client with an in-memory validator cache and a disk cache.
+
+    Args:
+        cache_dir: Directory for immutable responses ('' disables the disk cache).
+        memory_entries: Responses kept in memory for conditional requests.
+        session: requests.Session to send requests with.
+    """
+
+    def __init__(self, cache_dir: str = 'databases/http_cache', memory_entries: int = 512,
+                 session: Optional[requests.Session] = None):
+        self.cache_dir = cache_dir
+        self.memory_entries = max(1, int(memory_entries))
+        self.session = session or requests.Session()
+        self._memory: 'OrderedDict[str, Tuple[Dict[str, str], Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'not_modified': 0, 'disk_hits': 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # -------------------------------------------------------------------------
+    # Disk cache (immutable responses)
+    # -------------------------------------------------------------------------
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def has(self, url: str, params: Optional[Dict[str, Any]] = None) -> bool:
+        """Whether an immutable response is on disk (served without a request)"""
+        return bool(self.cache_dir) and os.path.exists(self._disk_path(cache_key(url, params)))
+
+    def _read_disk(self, key: str) -> Optional[Any]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key: str, data: Any):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write HTTP cache entry {path}: {e}")
+
+    # -------------------------------------------------------------------------
+    # Requests
+    # -------------------------------------------------------------------------
+
+    def _remember(self, key: str, validators: Dict[str, str], data: Any):
+        with self._lock:
+            self._memory[key] = (validators, data)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_json(self, url: str, params: Optional[Dict[str, Any]] = None, immutable: bool = False,
+                 timeout: float = 30) -> CachedResponse:
+        """GET a JSON document, revalidating or skipping the request when cached.
+
+        Raises requests.HTTPError for 4xx/5xx responses (with the response
+        attached) so callers keep their own retry policy.
+        """
+        key = cache_key(url, params)
+        if immutable:
+            data = self._read_disk(key)
+            if data is not None:
+                self.stats['disk_hits'] += 1
+                return CachedResponse(data, 200, from_disk=True)
+
+        with self._lock:
+            cached = self._memory.get(key)
+        headers = {}
+        if cached:
+            validators = cached[0]
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        self.stats['requests'] += 1
+        response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+        if response.status_code == 304 and cached:
+            self.stats['not_modified'] += 1
+            self._remember(key, cached[0], cached[1])
+            return CachedResponse(cached[1], 304)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise requests.HTTPError(f"{response.status_code} from {url}", response=response)
+        response.raise_for_status()
+
+        data = response.json()
+        validators = {'etag': response.headers.get('ETag', ''),
+                      'last_modified': response.headers.get('Last-Modified', '')}
+        if validators['etag'] or validators['last_modified']:
+            self._remember(key, validators, data)
+        if immutable:
+            self._write_disk(key, data)
+        return CachedResponse(data, response.status_code)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Multicall3 Resolver
+Batches read-only contract calls through Multicall3 ``aggregate3`` so the
+metadata of a whole set of tokens (symbol, name, decimals) or Uniswap V2 style
+pairs (token0, token1, getReserves) is fetched in one eth_call instead of one
+round trip per field per token.
+
+Every inner call is made with ``allowFailure=True``: a token that reverts on
+``name()`` still gets its symbol and decimals, and a non-token address simply
+comes back as None. Symbols and names are decoded from either ``string`` or
+legacy ``bytes32`` return data (MKR, SAI, ...).
+
+Only reverts count as failed calls. Transport and node errors (connection
+refused, timeouts, rate limits) propagate, so callers can tell "not a token"
+from "the RPC is down".
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from web3 import Web3
+from web3.exceptions import BadFunctionCallOutput, ContractLogicError
+
+logger = logging.getLogger(__name__)
+
+# Deployed at the same address on Ethereum, Base, Arbitrum, Optimism, Polygon, Avalanche, BSC, ...
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+
+MULTICALL3_ABI = [{
+    "inputs": [{"components": [
+        {"name": "target", "type": "address"},
+        {"name": "allowFailure", "type": "bool"},
+        {"name": "callData", "type": "bytes"}],
+        "name": "calls", "type": "tuple[]"}],
+    "name": "aggregate3",
+    "outputs": [{"components": [
+        {"name": "success", "type": "bool"},
+        {"name": "returnData", "type": "bytes"}],
+        "name": "returnData", "type": "tuple[]"}],
+    "stateMutability": "payable",
+    "type": "function"
+}]
+
+# 4-byte selectors of the zero-argument getters we batch
+SELECTORS = {
+    'symbol': bytes.fromhex('95d89b41'),
+    'name': bytes.fromhex('06fdde03'),
+    'decimals': bytes.fromhex('313ce567'),
+    'token0': bytes.fromhex('0dfe1681'),
+    'token1': bytes.fromhex('d21220a7'),
+    'getReserves': bytes.fromhex('0902f1ac'),
+}
+
+TOKEN_FIELDS = ('symbol', 'name', 'decimals')
+PAIR_FIELDS = ('token0', 'token1', 'getReserves')
+
+
+# --- Return data decoding ---
+
+def _word(data: bytes, index: int) -> int:
+    return int.from_bytes(data[index * 32:(index + 1) * 32], 'big')
+
+
+def is_revert(error: Exception) -> bool:
+    """Whether an eth_call error is a contract revert (as opposed to an RPC failure)"""
+    if isinstance(error, (ContractLogicError, BadFunctionCallOutput)):
+        return True
+    return isinstance(error, ValueError) and 'revert' in str(error).lower()
+
+
+def decode_text(data: bytes) -> Optional[str]:
+    """Decode an ABI ``string`` or a ``bytes32`` text return value"""
+    if len(data) >= 64:
+        offset = _word(data, 0)
+        if offset + 32 <= len(data):
+            length = int.from_bytes(data[offset:offset + 32], 'big')
+            if offset + 32 + length <= len(data):
+                return data[offset + 32:offset + 32 + length].decode('utf-8', 'replace').rstrip('\x00')
+    if len(data) == 32:
+        return data.rstrip(b'\x00').decode('utf-8', 'replace')
+    return None
+
+
+def decode_uint(data: bytes) -> Optional[int]:
+    return _word(data, 0) if len(data) >= 32 else None
+
+
+def decode_address(data: bytes) -> Optional[str]:
+    return Web3.to_checksum_address(data[12:32]) if len(data) >= 32 else None
+
+
+class MulticallResolver:
+    """Resolves token and pair metadata for many addresses per eth_call.
+
+    Args:
+        w3: Connected Web3 instance for the chain.
+        max_calls: Inner calls per aggregate3 request. Large token sets are
+            split into several requests of this size.
+        address: Multicall3 deployment on the chain.
+    """
+
+    def __init__(self, w3: Web3, max_calls: int = 1500, address: str = MULTICALL3_ADDRESS):
+        self.w3 = w3
+        self.max_calls = max(1, int(max_calls))
+        self.contract = w3.eth.contract(address=Web3.to_checksum_address(address), abi=MULTICALL3_ABI)
+
+    # -------------------------------------------------------------------------
+    # Raw batching
+    # -------------------------------------------------------------------------
+
+    def aggregate(self, calls: Sequence[Tuple[str, bytes]],
+                  block_identifier: Any = 'latest') -> List[Tuple[bool, bytes]]:
+        """Execute (target, calldata) pairs, returning (success, returnData) per call"""
+        results: List[Tuple[bool, bytes]] = []
+        for start in range(0, len(calls), self.max_calls):
+            batch = calls[start:start + self.max_calls]
+            try:
+                results.extend(
+                    (bool(success), bytes(data)) for success, data in
+                    self.contract.functions.aggregate3(
+                        [(target, True, calldata) for target, calldata in batch]
+                    ).call(block_identifier=block_identifier)
+                )
+            except Exception as e:
+                # No Multicall3 on this chain/block, or the batch ran out of gas
+                logger.warning(f"aggregate3 failed for {len(batch)} calls ({e}), falling back to eth_call")
+                results.extend(self._call_each(batch, block_identifier))
+        return results
+
+    def _call_each(self, calls: Sequence[Tuple[str, bytes]], block_identifier: Any) -> List[Tuple[bool, bytes]]:
+        """eth_call each pair; reverts become (False, b''), RPC errors are raised"""
+        results = []
+        for target, calldata in calls:
+            try:
+                results.append((True, bytes(self.w3.eth.call({'to': target, 'data': calldata}, block_identifier))))
+            except Exception as e:
+                if not is_revert(e):
+                    raise
+                results.append((False, b''))
+        return results
+
+    def _fetch(self, addresses: Iterable[str], fields: Sequence[str],
+               block_identifier: Any) -> Dict[str, Dict[str, Optional[bytes]]]:
+        """Return {checksum address: {field: returnData or None}}"""
+        targets = list(dict.fromkeys(Web3.to_checksum_address(a) for a in addresses))
+        calls = [(target, SELECTORS[field]) for target in targets for field in fields]
+        results = self.aggregate(calls, block_identifier) if calls else []
+
+        fetched: Dict[str, Dict[str, Optional[bytes]]] = {}
+        for i, target in enumerate(targets):
+            fetched[target] = {}
+            for j, field in enumerate(fields):
+                success, data = results[i * len(fields) + j]
+                fetched[target][field] = data if success and data else None
+        return fetched
+
+    # -------------------------------------------------------------------------
+    # Typed lookups
+    # -------------------------------------------------------------------------
+
+    def token_metadata(self, addresses: Iterable[str],
+                       block_identifier: Any = 'latest') -> Dict[str, Optional[Dict[str, Any]]]:
+        """ERC-20 metadata per checksum address (None if decimals() fails)"""
+        metadata: Dict[str, Optional[Dict[str, Any]]] = {}
+        for address, raw in self._fetch(addresses, TOKEN_FIELDS, block_identifier).items():
+            decimals = decode_uint(raw['decimals']) if raw['decimals'] else None
+            if decimals is None or decimals > 255:
+                metadata[address] = None
+                continue
+            metadata[address] = {
+                'address': address,
+                'symbol': decode_text(raw['symbol']) if raw['symbol'] else None,
+                'name': decode_text(raw['name']) if raw['name'] else None,
+                'decimals': decimals,
+            }
+        return metadata
+
+    def pair_info(self, addresses: Iterable[str],
+                  block_identifier: Any = 'latest') -> Dict[str, Optional[Dict[str, Any]]]:
+        """Uniswap V2 style pair data per checksum address (None if not a pair)"""
+        pairs: Dict[str, Optional[Dict[str, Any]]] = {}
+        for address, raw in self._fetch(addresses, PAIR_FIELDS, block_identifier).items():
+            reserves = raw['getReserves']
+            if not raw['token0'] or not raw['token1'] or not reserves or len(reserves) < 96:
+                pairs[address] = None
+                continue
+            pairs[address] = {
+                'address': address,
+                'token0': decode_address(raw['token0']),
+                'token1': decode_address(raw['token1']),
+                'reserve0': _word(reserves, 0),
+                'reserve1': _word(reserves, 1),
+                'block_timestamp_last': _word(reserves, 2),
+            }
+        return pairs
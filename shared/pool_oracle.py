@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+On-chain Pool Price Oracle
+Derives USD prices for long-tail tokens from Uniswap V2 pool reserves at a
+given block, for tokens CoinMarketCap does not price. Each token is quoted
+against the chain's wrapped native token and USDC; the wrapped token itself is
+priced from its USDC pool, and USDC is taken as $1.
+
+Pair addresses are immutable and cached forever. Reserves are read through
+Multicall3 (one aggregate3 per block bucket) and cached per (pool, block
+bucket), so every affiliate fee in a chunk is priced with a handful of
+eth_calls.
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from web3 import Web3
+
+from multicall import MulticallResolver
+import token_cache
+
+logger = logging.getLogger(__name__)
+
+GET_PAIR_SELECTOR = bytes.fromhex('e6a43905')
+GET_RESERVES_SELECTOR = bytes.fromhex('0902f1ac')
+ZERO_ADDRESS = '0x0000000000000000000000000000000000000000'
+
+# chain_id -> Uniswap V2 factory and the quote tokens pools are looked up against
+POOL_ORACLE_CHAINS = {
+    1: {
+        'factory': '0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f',
+        'wrapped': '0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2',  # WETH
+        'usdc': '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48',
+    },
+    8453: {
+        'factory': '0x8909Dc15e40173Ff4699343b6eB8132c65e18eC6',
+        'wrapped': '0x4200000000000000000000000000000000000006',  # WETH
+        'usdc': '0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913',
+    },
+    42161: {
+        'factory': '0xf1D7CC64Fb4452F05c498126312eBE29f30Fbcf9',
+        'wrapped': '0x82aF49447D8a07e3bd95BD0d56f35241523fBab1',  # WETH
+        'usdc': '0xaf88d065e77c8cC2239327C5EDb3A432268e5831',
+    },
+    10: {
+        'factory': '0x0c3c1c532F1e39EdF36BE9Fe0bE1410313E074Bf',
+        'wrapped': '0x4200000000000000000000000000000000000006',  # WETH
+        'usdc': '0x0b2C639c533813f4Aa9D7837cAf62653d097Ff85',
+    },
+    137: {
+        'factory': '0x9e5A52f57b3038F1B8EeE45F28b3C1967e22799C',
+        'wrapped': '0x7ceB23fD6bC0adD59E62ac25578270cFf1b9f619',  # WETH
+        'usdc': '0x3c499c542cEF5E3811e1192ce70d8cC03d5c3359',
+    },
+    43114: {
+        'factory': '0x9e5A52f57b3038F1B8EeE45F28b3C1967e22799C',
+        'wrapped': '0xB31f66AA3C1e785363F0875A1B74E27b85FD66c7',  # WAVAX
+        'usdc': '0xB97EF9Ef8734C71904D8002F8b6Bc66Dd9c48a6E',
+    },
+}
+
+
+def _address_arg(address: str) -> bytes:
+    return bytes(12) + bytes.fromhex(address[2:])
+
+
+class PoolPriceOracle:
+    """USD prices from Uniswap V2 reserves, cached per (pool, block bucket).
+
+    Args:
+        bucket_blocks: Blocks sharing one reserve read per pool.
+        min_liquidity_usd: Quote-side pool liquidity below which a pool is
+            ignored (dust pools are trivially manipulated).
+        max_entries: Reserve cache size; oldest buckets are evicted first.
+    """
+
+    def __init__(self, bucket_blocks: int = 25, min_liquidity_usd: float = 10000.0, max_entries: int = 100000):
+        self.bucket_blocks = max(1, int(bucket_blocks))
+        self.min_liquidity_usd = float(min_liquidity_usd)
+        self.max_entries = max_entries
+        self._resolvers: Dict[int, MulticallResolver] = {}
+        # (chain_id, token, quote) -> pair address or None
+        self._pairs: Dict[Tuple[int, str, str], Optional[str]] = {}
+        # (chain_id, pair, bucket) -> (reserve0, reserve1) or None
+        self._reserves: "OrderedDict[Tuple[int, str, int], Optional[Tuple[int, int]]]" = OrderedDict()
+
+    def _resolver(self, chain_id: int, w3: Web3) -> MulticallResolver:
+        if chain_id not in self._resolvers:
+            self._resolvers[chain_id] = MulticallResolver(w3)
+        return self._resolvers[chain_id]
+
+    # -------------------------------------------------------------------------
+    # Pools and reserves
+    # -------------------------------------------------------------------------
+
+    def _load_pairs(self, chain_id: int, resolver: MulticallResolver, legs: Iterable[Tuple[str, str]]):
+        """Look up getPair(token, quote) for legs not seen before"""
+        factory = POOL_ORACLE_CHAINS[chain_id]['factory']
+        missing = [leg for leg in dict.fromkeys(legs) if (chain_id,) + leg not in self._pairs]
+        if not missing:
+            return
+        calls = [(factory, GET_PAIR_SELECTOR + _address_arg(token) + _address_arg(quote)) for token, quote in missing]
+        for (token, quote), (success, data) in zip(missing, resolver.aggregate(calls), strict=True):
+            pair = Web3.to_checksum_address(data[12:32]) if success and len(data) >= 32 else None
+            self._pairs[(chain_id, token, quote)] = pair if pair and pair != ZERO_ADDRESS else None
+
+    def _load_reserves(self, chain_id: int, resolver: MulticallResolver, reads: Dict[int, Tuple[int, set]]):
+        """reads: bucket -> (block to read at, pairs); one aggregate3 per bucket"""
+        for bucket, (block, pairs) in reads.items():
+            pairs = sorted(pairs)
+            calls = [(pair, GET_RESERVES_SELECTOR) for pair in pairs]
+            for pair, (success, data) in zip(pairs, resolver.aggregate(calls, block_identifier=block), strict=True):
+                reserves = None
+                if success and len(data) >= 64:
+                    reserves = (int.from_bytes(data[:32], 'big'), int.from_bytes(data[32:64], 'big'))
+                self._reserves[(chain_id, pair, bucket)] = reserves
+        while len(self._reserves) > self.max_entries:
+            self._reserves.popitem(last=False)
+
+    def _reserves_of(self, chain_id: int, token: str, quote: str, bucket: int) -> Optional[Tuple[int, int]]:
+        """(token reserve, quote reserve) of the token/quote pool in a bucket"""
+        pair = self._pairs.get((chain_id, token, quote))
+        reserves = self._reserves.get((chain_id, pair, bucket)) if pair else None
+        if reserves is None:
+            return None
+        # Uniswap V2 orders token0/token1 by address
+        return reserves if token.lower() < quote.lower() else (reserves[1], reserves[0])
+
+    # -------------------------------------------------------------------------
+    # Prices
+    # -------------------------------------------------------------------------
+
+    def prices_at(self, chain_id: int, w3: Web3, requests: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], float]:
+        """USD price per (token address, block) for the pairs that can be priced"""
+        chain = POOL_ORACLE_CHAINS.get(chain_id)
+        requests = list(dict.fromkeys((Web3.to_checksum_address(token), int(block)) for token, block in requests))
+        if not chain or not requests:
+            return {}
+
+        wrapped, usdc = Web3.to_checksum_address(chain['wrapped']), Web3.to_checksum_address(chain['usdc'])
+        tokens = {token for token, _ in requests} - {wrapped, usdc}
+        resolver = self._resolver(chain_id, w3)
+
+        try:
+            legs = [(wrapped, usdc)] + [(token, quote) for token in tokens for quote in (wrapped, usdc)]
+            self._load_pairs(chain_id, resolver, legs)
+
+            reads: Dict[int, Tuple[int, set]] = {}
+            for token, block in requests:
+                bucket = block // self.bucket_blocks
+                for leg in ((wrapped, usdc), (token, wrapped), (token, usdc)):
+                    pair = self._pairs.get((chain_id,) + leg)
+                    if pair and (chain_id, pair, bucket) not in self._reserves:
+                        reads.setdefault(bucket, (block, set()))[1].add(pair)
+            self._load_reserves(chain_id, resolver, reads)
+
+            decimals = {address.lower(): info['decimals'] for address, info in
+                        token_cache.get_token_infos(tokens | {wrapped, usdc}, chain_id).items() if info}
+        except Exception as e:
+            logger.warning(f"⚠️ Pool oracle lookup failed on chain {chain_id}: {e}")
+            return {}
+
+        prices: Dict[Tuple[str, int], float] = {}
+        for token, block in requests:
+            price = self._price(chain_id, token, block // self.bucket_blocks, wrapped, usdc, decimals)
+            if price is not None:
+                prices[(token, block)] = price
+        return prices
+
+    def _pool_amounts(self, chain_id: int, token: str, quote: str, bucket: int,
+                      decimals: Dict[str, int]) -> Optional[Tuple[float, float]]:
+        """Decimal-adjusted (token, quote) reserves of a pool in a bucket"""
+        reserves = self._reserves_of(chain_id, token, quote, bucket)
+        if not reserves or not reserves[0] or token.lower() not in decimals or quote.lower() not in decimals:
+            return None
+        return reserves[0] / 10 ** decimals[token.lower()], reserves[1] / 10 ** decimals[quote.lower()]
+
+    def _price(self, chain_id: int, token: str, bucket: int, wrapped: str, usdc: str,
+               decimals: Dict[str, int]) -> Optional[float]:
+        if token == usdc:
+            return 1.0
+        wrapped_pool = self._pool_amounts(chain_id, wrapped, usdc, bucket, decimals)
+        wrapped_usd = wrapped_pool[1] / wrapped_pool[0] if wrapped_pool else None
+        if token == wrapped:
+            return wrapped_usd
+
+        # Use whichever quote pool is deeper
+        best: Optional[Tuple[float, float]] = None
+        for quote, quote_usd in ((usdc, 1.0), (wrapped, wrapped_usd)):
+            pool = self._pool_amounts(chain_id, token, quote, bucket, decimals) if quote_usd else None
+            if pool is None:
+                continue
+            liquidity_usd = pool[1] * quote_usd
+            if liquidity_usd >= self.min_liquidity_usd and (best is None or liquidity_usd > best[0]):
+                best = (liquidity_usd, liquidity_usd / pool[0])
+        return best[1] if best else None
@@ -1,67 +1,223 @@
 #!/usr/bin/env python3
 """
-Price Cache with Hourly Updates
-Caches token prices from CoinMarketCap and refreshes them at most once per hour.
+Price Cache with Background Refresh
+Caches latest token prices from CoinMarketCap. Readers always get the cached
+values immediately; symbols past their TTL are refreshed on a background
+thread (stale-while-revalidate) and the cache file is replaced atomically.
+
+Symbols whose refresh failed back off exponentially before they are requested
+again, and symbols CoinMarketCap rejects as invalid are dropped from the batch
+so they cannot fail the request for every other symbol.
 """
 
-import os
 import json
+import logging
+import os
+import re
+import threading
 import time
-from datetime import datetime
-from typing import Dict
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CMC_QUOTES_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
+
+DEFAULT_SYMBOLS = [
+    'USDC', 'ETH', 'USDT', 'WBTC', 'UNI', 'LINK', 'ARB',
+    'FRAX', 'DAI', 'FOX', 'YFI', 'AAVE', 'CRV', 'SHIB'
+]
+DEFAULT_TTL = 3600
+# Stablecoins barely move; refresh them less often
+DEFAULT_SYMBOL_TTLS = {'USDC': 86400, 'USDT': 86400, 'DAI': 86400, 'FRAX': 86400}
+CACHE_VERSION = 2
+# Retry delay after a failed refresh: doubles per consecutive failure up to the max
+RETRY_BASE = 60
+RETRY_MAX = 3600
+# 'Invalid value for "symbol": "FOO"' / 'Invalid values for "symbol": "FOO,BAR"'
+INVALID_SYMBOLS = re.compile(r'invalid values? for "symbol": "([^"]+)"', re.IGNORECASE)
 
-# Add project root to path for module imports
-import sys
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from scripts.utils.price_fetcher import PriceFetcher
 
 class PriceCache:
-    def __init__(self, api_key: str, cache_file: str = "databases/token_prices_cache.json"):
+    def __init__(self, api_key: str, cache_file: str = "databases/token_prices_cache.json",
+                 symbols: Optional[Iterable[str]] = None, ttl: int = DEFAULT_TTL,
+                 symbol_ttls: Optional[Dict[str, int]] = None):
         self.api_key = api_key
         self.cache_file = cache_file
-        self.price_fetcher = PriceFetcher(api_key)
+        self.ttl = ttl
+        self.symbol_ttls = dict(DEFAULT_SYMBOL_TTLS if symbol_ttls is None else symbol_ttls)
+        self.symbols = set(s.upper() for s in (symbols or DEFAULT_SYMBOLS))
+
+        # symbol -> (price_usd, fetched_at); replaced wholesale so readers never lock
+        self._prices: Dict[str, Tuple[float, float]] = {}
+        # symbol -> (last attempt, consecutive failures), for backoff
+        self._attempts: Dict[str, Tuple[float, int]] = {}
+        # Symbols CoinMarketCap rejected; never requested again
+        self.rejected: set = set()
+        self._refresh_lock = threading.Lock()
+        self._refreshing: Optional[threading.Thread] = None
         self._load_cache()
 
     def _load_cache(self):
-        """Load the price cache from a JSON file"""
-        if os.path.exists(self.cache_file):
+        """Load the price cache from a JSON file (current or legacy layout)"""
+        if not os.path.exists(self.cache_file):
+            return
+        try:
             with open(self.cache_file, 'r') as f:
-                self.cache = json.load(f)
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable price cache {self.cache_file}: {e}")
+            return
+
+        if data.get('v') == CACHE_VERSION:
+            self._prices = {symbol: (float(price), float(fetched_at))
+                            for symbol, (price, fetched_at) in data.get('prices', {}).items()}
         else:
-            self.cache = {'timestamp': 0, 'prices': {}}
+            # Legacy {timestamp, prices: {symbol: price}} file
+            fetched_at = float(data.get('timestamp', 0))
+            self._prices = {symbol: (float(price), fetched_at) for symbol, price in data.get('prices', {}).items()}
 
     def _save_cache(self):
-        """Save the price cache to a JSON file"""
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.cache, f, indent=4)
+        """Write the cache compactly to a temp file and swap it into place"""
+        directory = os.path.dirname(self.cache_file) or '.'
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.cache_file}.tmp.{os.getpid()}"
+        payload = {'v': CACHE_VERSION, 'prices': {symbol: [price, fetched_at]
+                                                   for symbol, (price, fetched_at) in self._prices.items()}}
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.cache_file)
 
-    def get_prices(self) -> Dict[str, float]:
-        """Get token prices, fetching from API if cache is stale"""
-        current_time = time.time()
-        
-        # Check if cache is older than 1 hour (3600 seconds)
-        if current_time - self.cache.get('timestamp', 0) > 3600:
-            print("🔄 Price cache is stale, fetching new prices...")
-            
-            # Fetch prices for a comprehensive list of tokens
-            token_symbols = [
-                'USDC', 'ETH', 'USDT', 'WBTC', 'UNI', 'LINK', 'ARB', 
-                'FRAX', 'DAI', 'FOX', 'YFI', 'AAVE', 'CRV', 'SHIB'
-            ]
-            
-            new_prices = self.price_fetcher.get_token_prices(token_symbols)
-            
+    # -------------------------------------------------------------------------
+    # Refresh
+    # -------------------------------------------------------------------------
+
+    def _ttl_for(self, symbol: str) -> int:
+        return self.symbol_ttls.get(symbol, self.ttl)
+
+    def _backing_off(self, symbol: str, now: float) -> bool:
+        last_attempt, failures = self._attempts.get(symbol, (0.0, 0))
+        return failures > 0 and now - last_attempt < min(RETRY_MAX, RETRY_BASE * 2 ** (failures - 1))
+
+    def _stale_symbols(self, now: float) -> set:
+        return {symbol for symbol in self.symbols
+                if now - self._prices.get(symbol, (0.0, 0.0))[1] > self._ttl_for(symbol)
+                and not self._backing_off(symbol, now)}
+
+    def _fetch(self, symbols: Iterable[str]) -> Dict[str, float]:
+        """Latest USD prices for symbols in one CoinMarketCap request.
+
+        Symbols rejected with a 400 are moved to self.rejected and the request
+        is retried once without them.
+        """
+        symbols = set(symbols)
+        response = self._request(symbols)
+        if response.status_code == 400:
+            invalid = self._invalid_symbols(response) & symbols
+            if invalid:
+                logger.warning(f"⚠️ CoinMarketCap rejected {', '.join(sorted(invalid))}, dropping them")
+                self.rejected |= invalid
+                self.symbols -= invalid
+                symbols -= invalid
+                if not symbols:
+                    return {}
+                response = self._request(symbols)
+        response.raise_for_status()
+        prices = {}
+        for symbol, entry in response.json().get('data', {}).items():
+            asset = entry[0] if isinstance(entry, list) and entry else entry
+            price = (asset or {}).get('quote', {}).get('USD', {}).get('price')
+            if price is not None:
+                prices[symbol.upper()] = float(price)
+        return prices
+
+    def _request(self, symbols: Iterable[str]) -> requests.Response:
+        return requests.get(CMC_QUOTES_URL, headers={'X-CMC_PRO_API_KEY': self.api_key},
+                            params={'symbol': ','.join(sorted(symbols)), 'convert': 'USD'}, timeout=30)
+
+    @staticmethod
+    def _invalid_symbols(response: requests.Response) -> set:
+        """Symbols named in a CoinMarketCap 400 error message"""
+        try:
+            message = response.json().get('status', {}).get('error_message') or ''
+        except ValueError:
+            return set()
+        match = INVALID_SYMBOLS.search(message)
+        return {s.strip().upper() for s in match.group(1).split(',') if s.strip()} if match else set()
+
+    def _record_attempts(self, symbols: set, succeeded: set, attempted_at: float):
+        attempts = dict(self._attempts)
+        for symbol in symbols:
+            failures = 0 if symbol in succeeded else attempts.get(symbol, (0.0, 0))[1] + 1
+            attempts[symbol] = (attempted_at, failures)
+        self._attempts = attempts
+
+    def _refresh(self, symbols: set):
+        attempted_at = time.time()
+        new_prices: Dict[str, float] = {}
+        try:
+            new_prices = self._fetch(symbols)
             if new_prices:
-                self.cache['timestamp'] = current_time
-                self.cache['prices'] = new_prices
+                fetched_at = time.time()
+                prices = dict(self._prices)
+                prices.update({symbol: (price, fetched_at) for symbol, price in new_prices.items()})
+                self._prices = prices
                 self._save_cache()
-                print("✅ New prices fetched and cached.")
+                logger.info(f"✅ Refreshed {len(new_prices)} prices")
             else:
-                print("⚠️  Failed to fetch new prices, using old cache.")
-        else:
-            print("✅ Using cached prices.")
-            
-        return self.cache.get('prices', {})
+                logger.warning("⚠️ Price refresh returned no prices, keeping cached values")
+        except Exception as e:
+            logger.warning(f"⚠️ Price refresh failed, keeping cached values: {e}")
+        finally:
+            self._record_attempts(symbols - self.rejected, set(new_prices), attempted_at)
+            with self._refresh_lock:
+                self._refreshing = None
+
+    def _maybe_refresh(self):
+        """Start a background refresh of stale symbols unless one is running"""
+        if not self.api_key:
+            return
+        stale = self._stale_symbols(time.time())
+        if not stale:
+            return
+        with self._refresh_lock:
+            if self._refreshing is not None:
+                return
+            self._refreshing = threading.Thread(target=self._refresh, args=(stale,),
+                                                name='price-cache-refresh', daemon=True)
+            self._refreshing.start()
+
+    def wait_for_refresh(self, timeout: Optional[float] = None):
+        """Block until a running background refresh finishes (for scripts/tests)"""
+        thread = self._refreshing
+        if thread is not None:
+            thread.join(timeout)
+
+    # -------------------------------------------------------------------------
+    # Reads
+    # -------------------------------------------------------------------------
+
+    def track(self, symbols: Iterable[str]):
+        """Add symbols to the refreshed set; they are fetched on the next read"""
+        self.symbols.update(s.upper() for s in symbols if s.upper() not in self.rejected)
+
+    def get_prices(self) -> Dict[str, float]:
+        """Get cached token prices; stale symbols are refreshed in the background"""
+        self._maybe_refresh()
+        return {symbol: price for symbol, (price, _) in self._prices.items()}
+
+    def get_price(self, symbol: str) -> Optional[float]:
+        """Cached price of one symbol (None until first fetched)"""
+        symbol = symbol.upper()
+        if symbol not in self.symbols and symbol not in self.rejected:
+            self.track([symbol])
+        self._maybe_refresh()
+        entry = self._prices.get(symbol)
+        return entry[0] if entry else None
+
 
 def main():
     """Main function for testing the price cache"""
@@ -69,13 +225,15 @@ def main():
     if not api_key:
         print("❌ COINMARKETCAP_API_KEY environment variable not set.")
         return
-        
+
     price_cache = PriceCache(api_key)
+    price_cache.get_prices()
+    price_cache.wait_for_refresh(timeout=60)
     prices = price_cache.get_prices()
-    
+
     print("\n📊 Current Token Prices:")
-    for symbol, price in prices.items():
+    for symbol, price in sorted(prices.items()):
         print(f"   {symbol}: ${price:,.2f}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
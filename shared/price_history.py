@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Historical Price Store
+USD prices keyed on (token, hour bucket), persisted in SQLite and prefetched
+from CoinMarketCap one range at a time, so backfills value every transaction
+at its own timestamp without an API call per row.
+
+Typical use is page-level: collect the tokens and the time span of a page of
+transactions, call prefetch() once, then price_at() for each row (memory and
+SQLite reads only). Ranges already fetched are recorded in a coverage table
+and never requested again; the current, still-open hour is never marked
+covered. Only the span between the first and last hour that returned a
+quote is marked covered; hours outside it (not yet published, before the
+token listed) and ranges whose fetch failed are not retried for failure_ttl
+seconds, so a missing symbol or an API outage costs one request, not one per
+row.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+CMC_HISTORICAL_URL = "https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/historical"
+CMC_MAX_POINTS = 10000  # points per historical request
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS prices (
+    token TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    price_usd REAL NOT NULL,
+    PRIMARY KEY (token, hour)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    token TEXT NOT NULL,
+    start_hour INTEGER NOT NULL,
+    end_hour INTEGER NOT NULL,
+    PRIMARY KEY (token, start_hour)
+);
+'''
+
+# (token, start_hour, end_hour) -> {hour: price_usd}
+Fetcher = Callable[[str, int, int], Dict[int, float]]
+
+
+def to_unix_seconds(timestamp: float) -> int:
+    """Unix seconds from seconds, milliseconds or (Midgard) nanoseconds"""
+    ts = float(timestamp)
+    if ts > 1e17:
+        ts /= 1e9
+    elif ts > 1e11:
+        ts /= 1e3
+    return int(ts)
+
+
+def hour_bucket(timestamp: float) -> int:
+    """Start of the UTC hour containing a timestamp"""
+    return to_unix_seconds(timestamp) // HOUR * HOUR
+
+
+class PriceHistory:
+    """Hourly USD price store with range prefetch.
+
+    Args:
+        db_path: SQLite file holding prices and fetched-range coverage.
+        api_key: CoinMarketCap API key for the default fetcher.
+        fetcher: Replaces the CoinMarketCap fetcher (token, start_hour, end_hour).
+        max_gap_hours: How far from the requested hour the nearest stored price
+            may be when the exact hour has no quote.
+        failure_ttl: Seconds a failed (token, range) fetch is not retried.
+    """
+
+    def __init__(self, db_path: str = "databases/price_history.sqlite", api_key: Optional[str] = None,
+                 fetcher: Optional[Fetcher] = None, max_gap_hours: int = 6, failure_ttl: float = 300):
+        self.db_path = db_path
+        self.api_key = api_key if api_key is not None else os.getenv('COINMARKETCAP_API_KEY', '')
+        self.fetcher = fetcher or self._fetch_cmc
+        self.max_gap = int(max_gap_hours) * HOUR
+        self.failure_ttl = float(failure_ttl)
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(_SCHEMA)
+
+        self._memory: Dict[Tuple[str, int], float] = {}
+        # token -> [(start_hour, end_hour, retry_at)] of recently failed fetches
+        self._failures: Dict[str, List[Tuple[int, int, float]]] = {}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=30)
+        return conn
+
+    # -------------------------------------------------------------------------
+    # Coverage
+    # -------------------------------------------------------------------------
+
+    def _coverage(self, token: str) -> List[Tuple[int, int]]:
+        return self._conn().execute(
+            'SELECT start_hour, end_hour FROM coverage WHERE token = ? ORDER BY start_hour', (token,)).fetchall()
+
+    def _missing_ranges(self, token: str, start_hour: int, end_hour: int) -> List[Tuple[int, int]]:
+        """Sub-ranges of [start_hour, end_hour] not fetched before"""
+        missing = []
+        cursor = start_hour
+        for covered_start, covered_end in self._coverage(token):
+            if covered_end < cursor:
+                continue
+            if covered_start > end_hour:
+                break
+            if covered_start > cursor:
+                missing.append((cursor, covered_start - HOUR))
+            cursor = max(cursor, covered_end + HOUR)
+        if cursor <= end_hour:
+            missing.append((cursor, end_hour))
+        return missing
+
+    def _mark_covered(self, token: str, start_hour: int, end_hour: int):
+        """Record a fetched range, merging it with overlapping/adjacent ranges"""
+        conn = self._conn()
+        rows = conn.execute(
+            'SELECT start_hour, end_hour FROM coverage WHERE token = ? AND end_hour >= ? AND start_hour <= ?',
+            (token, start_hour - HOUR, end_hour + HOUR)).fetchall()
+        for covered_start, covered_end in rows:
+            start_hour = min(start_hour, covered_start)
+            end_hour = max(end_hour, covered_end)
+        conn.executemany('DELETE FROM coverage WHERE token = ? AND start_hour = ?',
+                         [(token, covered_start) for covered_start, _ in rows])
+        conn.execute('INSERT INTO coverage (token, start_hour, end_hour) VALUES (?, ?, ?)',
+                     (token, start_hour, end_hour))
+
+    def _record_failure(self, token: str, start_hour: int, end_hour: int):
+        self._failures.setdefault(token, []).append((start_hour, end_hour, time.monotonic() + self.failure_ttl))
+
+    def _recently_failed(self, token: str, start_hour: int, end_hour: int) -> bool:
+        """Whether a range overlaps a failed fetch of the token still within failure_ttl"""
+        now = time.monotonic()
+        failures = [f for f in self._failures.get(token, []) if f[2] > now]
+        if failures:
+            self._failures[token] = failures
+        else:
+            self._failures.pop(token, None)
+        return any(failed_start <= end_hour and start_hour <= failed_end
+                   for failed_start, failed_end, _ in failures)
+
+    # -------------------------------------------------------------------------
+    # Fetching
+    # -------------------------------------------------------------------------
+
+    def _fetch_cmc(self, token: str, start_hour: int, end_hour: int) -> Dict[int, float]:
+        """Hourly USD quotes for a symbol from CoinMarketCap"""
+        if not self.api_key:
+            raise RuntimeError("COINMARKETCAP_API_KEY is required to fetch historical prices")
+
+        prices: Dict[int, float] = {}
+        window = CMC_MAX_POINTS * HOUR
+        for window_start in range(start_hour, end_hour + HOUR, window):
+            window_end = min(end_hour, window_start + window - HOUR)
+            response = requests.get(CMC_HISTORICAL_URL, headers={'X-CMC_PRO_API_KEY': self.api_key}, params={
+                'symbol': token,
+                'time_start': window_start,
+                'time_end': window_end + HOUR - 1,
+                'interval': 'hourly',
+                'count': CMC_MAX_POINTS,
+                'convert': 'USD',
+            }, timeout=30)
+            response.raise_for_status()
+            data = response.json().get('data', {})
+
+            # Symbol queries return {SYMBOL: [asset, ...]}, id queries a single asset
+            assets = data.get(token) or data.get(token.upper()) or data
+            asset = assets[0] if isinstance(assets, list) and assets else assets
+            for quote in (asset or {}).get('quotes', []):
+                usd = quote.get('quote', {}).get('USD', {})
+                if usd.get('price') is None:
+                    continue
+                ts = usd.get('timestamp') or quote.get('timestamp')
+                prices[hour_bucket(_parse_iso(ts))] = float(usd['price'])
+        return prices
+
+    def prefetch(self, tokens: Iterable[str], start_ts: float, end_ts: float) -> int:
+        """Fetch and store every unfetched hour of [start_ts, end_ts] for tokens.
+
+        Returns the number of price points stored. Failed fetches, and the parts
+        of a range outside the hours that returned quotes, stay uncovered and
+        are retried once failure_ttl has passed.
+        """
+        start_hour = hour_bucket(start_ts)
+        end_hour = hour_bucket(end_ts)
+        open_hour = hour_bucket(time.time())
+        stored = 0
+        conn = self._conn()
+
+        for token in sorted(set(tokens)):
+            for range_start, range_end in self._missing_ranges(token, start_hour, end_hour):
+                if self._recently_failed(token, range_start, range_end):
+                    continue
+                try:
+                    prices = self.fetcher(token, range_start, range_end)
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not fetch {token} prices for {range_start}-{range_end}: {e}")
+                    self._record_failure(token, range_start, range_end)
+                    continue
+                quoted = [hour for hour in prices if range_start <= hour <= range_end]
+                if not quoted:
+                    logger.info(f"🔍 No {token} prices for {range_start}-{range_end}")
+                    self._record_failure(token, range_start, range_end)
+                    continue
+                # Hours before the first or after the last quote (not listed yet, not
+                # published yet, the open hour) are retried later, not covered
+                covered_start, covered_end = min(quoted), min(max(quoted), open_hour - HOUR)
+                retry_from = max(covered_end, covered_start - HOUR) + HOUR
+                if covered_start > range_start:
+                    self._record_failure(token, range_start, covered_start - HOUR)
+                if retry_from <= range_end:
+                    self._record_failure(token, retry_from, range_end)
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO prices (token, hour, price_usd) VALUES (?, ?, ?)',
+                                     [(token, hour, price) for hour, price in prices.items()])
+                    if covered_end >= covered_start:
+                        self._mark_covered(token, covered_start, covered_end)
+                for hour, price in prices.items():
+                    self._memory[(token, hour)] = price
+                stored += len(prices)
+                logger.info(f"💾 Stored {len(prices)} hourly {token} prices")
+        return stored
+
+    # -------------------------------------------------------------------------
+    # Reads
+    # -------------------------------------------------------------------------
+
+    def price_at(self, token: str, timestamp: float, fetch: bool = True) -> Optional[float]:
+        """USD price of a token at a timestamp (nearest stored hour within max_gap)"""
+        hour = hour_bucket(timestamp)
+        key = (token, hour)
+        if key in self._memory:
+            return self._memory[key]
+
+        price = self._nearest(token, hour)
+        if price is None and fetch and self._missing_ranges(token, hour, hour):
+            # Fall back to fetching the surrounding day once
+            self.prefetch([token], hour - 12 * HOUR, hour + 12 * HOUR)
+            price = self._nearest(token, hour)
+        if price is not None:
+            self._memory[key] = price
+        return price
+
+    def _nearest(self, token: str, hour: int) -> Optional[float]:
+        row = self._conn().execute(
+            'SELECT price_usd FROM prices WHERE token = ? AND hour BETWEEN ? AND ? '
+            'ORDER BY abs(hour - ?) LIMIT 1',
+            (token, hour - self.max_gap, hour + self.max_gap, hour)).fetchone()
+        return row[0] if row else None
+
+    def value_usd(self, token: str, amount: float, timestamp: float, fetch: bool = True) -> Optional[float]:
+        """USD value of a decimal-adjusted amount at a timestamp"""
+        price = self.price_at(token, timestamp, fetch=fetch)
+        return None if price is None else amount * price
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _parse_iso(value) -> float:
+    """Unix seconds from a CoinMarketCap ISO-8601 timestamp (or a number)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+THORChain Memo Parser
+Splits swap memos (SWAP:ASSET:DEST:LIMIT:AFFILIATE:FEE) in a single pass with
+one precompiled pattern. The affiliate and fee fields may list several
+affiliates separated by '/', e.g. =:r:thor1...:0:t/ss:10/55; a single fee
+applies to every listed affiliate. Fees are in basis points of the inbound
+amount.
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+SWAP_ACTIONS = frozenset({'=', 's', 'swap'})
+
+MEMO_PATTERN = re.compile(
+    r'^(?P<action>[^:]*)'
+    r'(?::(?P<asset>[^:]*))?'
+    r'(?::(?P<destination>[^:]*))?'
+    r'(?::(?P<limit>[^:]*))?'
+    r'(?::(?P<affiliates>[^:]*))?'
+    r'(?::(?P<bps>[^:]*))?'
+)
+
+
+class Memo(NamedTuple):
+    action: str
+    asset: str
+    destination: str
+    limit: str
+    affiliates: Tuple[str, ...]
+    bps: Tuple[int, ...]
+
+    @property
+    def is_swap(self) -> bool:
+        return self.action in SWAP_ACTIONS
+
+    def affiliate_bps(self, affiliate_ids: Set[str]) -> Optional[int]:
+        """Fee (bps) of the first listed affiliate in affiliate_ids, None if absent"""
+        for index, affiliate in enumerate(self.affiliates):
+            if affiliate in affiliate_ids:
+                if not self.bps:
+                    return 0
+                return self.bps[index] if index < len(self.bps) else self.bps[-1]
+        return None
+
+
+def _split(field: Optional[str]) -> List[str]:
+    return [part.strip() for part in field.split('/')] if field else []
+
+
+def parse_memo(memo: str) -> Optional[Memo]:
+    """Structured record of a THORChain memo, None for an empty memo"""
+    if not memo:
+        return None
+    fields = MEMO_PATTERN.match(memo).groupdict('')
+    bps = []
+    for part in _split(fields['bps']):
+        try:
+            bps.append(int(part))
+        except ValueError:
+            bps.append(0)
+    return Memo(action=fields['action'].strip().lower(), asset=fields['asset'],
+                destination=fields['destination'], limit=fields['limit'],
+                affiliates=tuple(part.lower() for part in _split(fields['affiliates']) if part),
+                bps=tuple(bps))
+
+
+def action_memo(action: Dict[str, Any]) -> str:
+    """Memo of a Midgard action (metadata.swap.memo, or a top-level memo)"""
+    return ((action.get('metadata') or {}).get('swap') or {}).get('memo') or action.get('memo') or ''
+
+
+def parse_page(actions: Iterable[Dict[str, Any]]) -> List[Optional[Memo]]:
+    """Parsed memo of every action in a Midgard page, aligned with the page"""
+    return [parse_memo(action_memo(action)) for action in actions]
+
+
+def affiliate_fee(amount: int, bps: int) -> int:
+    """Affiliate fee in base units: amount * bps / 10000, rounded down"""
+    return int(amount) * int(bps) // 10000
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+THORChain Midgard Sync
+Cursor-based paging over Midgard's /v2/actions: pages start at an upper
+block height (``height``) and are followed with ``nextPageToken``, so actions
+arriving at the head never shift a page the way integer offsets do. The lower
+bound of a range is applied client-side: paging stops at the first action
+below it.
+
+Backfills split a height range into windows that are fetched concurrently,
+then yielded in ascending height order, deduplicated by txID, so the caller
+can checkpoint after every window. The rate limit applies per worker thread,
+so a full sync takes roughly
+
+    (windows + pages of matching actions) * rate_limit / workers
+
+e.g. ~500 windows of 50,000 heights plus ~2,000 pages of affiliate swaps is
+about 10 minutes at 1s per request with 4 workers; an unfiltered history of
+millions of swaps takes many hours.
+
+Requests go through an HTTPCache (see http_cache.py): head pages are
+revalidated with conditional GETs, and windows below the stable height are
+immutable and served from disk on re-runs.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from http_cache import HTTPCache
+from thorchain_memo import action_memo, parse_memo
+
+logger = logging.getLogger(__name__)
+
+MIDGARD_MAX_LIMIT = 50  # Midgard caps /actions pages at 50
+
+
+def action_tx_id(action: Dict[str, Any]) -> str:
+    """Inbound txID of a Midgard action (its identity across pages)"""
+    if action.get('txID'):
+        return action['txID']
+    entries = action.get('in', [])
+    if isinstance(entries, dict):
+        entries = [entries]
+    for entry in entries:
+        if isinstance(entry, dict) and entry.get('txID'):
+            return entry['txID']
+    return ''
+
+
+def action_height(action: Dict[str, Any]) -> int:
+    return int(action.get('height') or 0)
+
+
+class MidgardClient:
+    """Thin, rate-limited Midgard v2 client with cursor paging.
+
+    Args:
+        base_url: Midgard API root, e.g. https://midgard.ninerealms.com/v2
+        rate_limit: Minimum seconds between requests of one thread; each
+            sync worker is throttled on its own, so workers run in parallel.
+        page_limit: Actions per page (capped at Midgard's 50).
+        cache: Response cache; a memory-only one is created if not given.
+    """
+
+    def __init__(self, base_url: str, rate_limit: float = 0.0, page_limit: int = MIDGARD_MAX_LIMIT,
+                 session: Optional[requests.Session] = None, retries: int = 3,
+                 cache: Optional[HTTPCache] = None):
+        self.base_url = base_url.rstrip('/')
+        self.rate_limit = rate_limit
+        self.page_limit = max(1, min(int(page_limit), MIDGARD_MAX_LIMIT))
+        self.cache = cache or HTTPCache(cache_dir='', session=session)
+        self.session = self.cache.session
+        self.retries = retries
+        self._local = threading.local()
+
+    def _throttle(self):
+        if self.rate_limit <= 0:
+            return
+        next_request_at = getattr(self._local, 'next_request_at', 0.0)
+        wait = next_request_at - time.monotonic()
+        self._local.next_request_at = max(time.monotonic(), next_request_at) + self.rate_limit
+        if wait > 0:
+            time.sleep(wait)
+
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None, immutable: bool = False) -> Dict[str, Any]:
+        """GET a Midgard endpoint, retrying 429/5xx and connection errors with backoff.
+
+        Other 4xx responses are raised immediately.
+
+        immutable marks historical responses that may be served from (and are
+        written to) the disk cache.
+        """
+        url = f"{self.base_url}{path}"
+        if immutable and self.cache.has(url, params):
+            return self.cache.get_json(url, params, immutable=True).data
+        for attempt in range(self.retries + 1):
+            self._throttle()
+            try:
+                return self.cache.get_json(url, params, immutable=immutable).data
+            except requests.RequestException as e:
+                status = e.response.status_code if isinstance(e, requests.HTTPError) and e.response is not None else 0
+                # Other 4xx (bad parameter, unknown path) will not succeed on retry
+                if attempt == self.retries or (400 <= status < 500 and status != 429):
+                    raise
+                delay = 2 ** attempt
+                logger.warning(f"⚠️ Midgard {path} failed ({e}), retrying in {delay}s")
+                time.sleep(delay)
+        return {}
+
+    def latest_height(self) -> int:
+        """Height Midgard has aggregated up to"""
+        health = self.get('/health')
+        for key in ('lastAggregated', 'lastCommitted', 'lastThorNode'):
+            if isinstance(health.get(key), dict) and health[key].get('height'):
+                return int(health[key]['height'])
+        return int(health.get('scannerHeight') or 0)
+
+    def iter_pages(self, from_height: Optional[int] = None, to_height: Optional[int] = None,
+                   immutable: bool = False, **filters: Any) -> Iterator[List[Dict[str, Any]]]:
+        """Pages of actions in [from_height, to_height], newest first, via nextPageToken.
+
+        Only the upper bound is sent to Midgard; actions below from_height are
+        trimmed here and end the paging.
+        """
+        params: Dict[str, Any] = {'limit': self.page_limit, **filters}
+        if to_height is not None:
+            params['height'] = to_height
+        while True:
+            data = self.get('/actions', params, immutable=immutable)
+            actions = data.get('actions', [])
+            # Token pages carry no height bounds; stop once they pass below from_height
+            below = from_height is not None and bool(actions) and action_height(actions[-1]) < from_height
+            if below:
+                actions = [action for action in actions if action_height(action) >= from_height]
+            if actions:
+                yield actions
+            token = (data.get('meta') or {}).get('nextPageToken')
+            if below or not token or len(data.get('actions', [])) < self.page_limit:
+                return
+            params = {'limit': self.page_limit, 'nextPageToken': token, **filters}
+
+    def fetch_range(self, from_height: int, to_height: int, immutable: bool = False,
+                    **filters: Any) -> List[Dict[str, Any]]:
+        """Every action in [from_height, to_height], oldest first"""
+        actions = [action for page in self.iter_pages(from_height, to_height, immutable, **filters)
+                   for action in page]
+        actions.reverse()
+        return actions
+
+
+class ThorchainSync:
+    """Height-windowed, concurrent Midgard sync deduplicated by txID"""
+
+    def __init__(self, client: MidgardClient, window_blocks: int = 50000, workers: int = 4):
+        self.client = client
+        self.window_blocks = max(1, int(window_blocks))
+        self.workers = max(1, int(workers))
+
+    def windows(self, start_height: int, end_height: int) -> List[Tuple[int, int]]:
+        return [(low, min(low + self.window_blocks - 1, end_height))
+                for low in range(start_height, end_height + 1, self.window_blocks)]
+
+    def sync(self, start_height: int, end_height: int, stable_height: Optional[int] = None,
+             **filters: Any) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """Yield (window end height, new actions oldest first) for each window in order.
+
+        Windows are fetched concurrently (at most workers ahead of the caller);
+        a window is only yielded after every window below it. Windows ending at
+        or below stable_height are treated as immutable and disk-cached.
+        """
+        if end_height < start_height:
+            return
+        windows = self.windows(start_height, end_height)
+        # Windows are disjoint in height, so a duplicate can only repeat within
+        # a window or across a boundary; two windows of txIDs are enough
+        previous: set = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='midgard') as pool:
+            futures = {}
+            next_submit = 0
+            for index, (low, high) in enumerate(windows):
+                while next_submit < len(windows) and next_submit < index + self.workers:
+                    window_low, window_high = windows[next_submit]
+                    immutable = stable_height is not None and window_high <= stable_height
+                    futures[next_submit] = pool.submit(self.client.fetch_range, window_low, window_high,
+                                                       immutable, **filters)
+                    next_submit += 1
+                actions = futures.pop(index).result()
+
+                current: set = set()
+                fresh = []
+                for action in actions:
+                    tx_id = action_tx_id(action)
+                    if tx_id and (tx_id in current or tx_id in previous):
+                        continue
+                    current.add(tx_id)
+                    fresh.append(action)
+                previous = current
+                logger.info(f"📦 Heights {low}-{high}: {len(fresh)} actions")
+                yield high, fresh
+
+
+def swap_affiliates(action: Dict[str, Any]) -> List[str]:
+    """Affiliate names/addresses Midgard attributes to a swap (metadata.swap.affiliateAddress)"""
+    swap = (action.get('metadata') or {}).get('swap') or {}
+    value = swap.get('affiliateAddress') or ''
+    return [part.strip().lower() for part in value.split('/') if part.strip()]
+
+
+def action_affiliates(action: Dict[str, Any]) -> set:
+    """Affiliates of a swap from Midgard's metadata and from its memo"""
+    memo = parse_memo(action_memo(action))
+    return set(swap_affiliates(action)) | set(memo.affiliates if memo else ())
+
+
+def probe_server_filter(client: MidgardClient, affiliates: List[str],
+                        address: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """Midgard query parameters that filter swaps to the affiliate server-side.
+
+    Tries ``affiliate`` (names and addresses), then ``address``. A parameter
+    counts as supported if Midgard accepts it, returns a non-empty sample, and
+    every sampled swap lists one of the affiliates (or the address) as its
+    affiliate; an instance that ignores unknown parameters returns unrelated
+    swaps and is rejected. Returns None when only client-side filtering will
+    work.
+    """
+    wanted = {affiliate.lower() for affiliate in affiliates}
+    if address:
+        wanted.add(address.lower())
+    candidates = [{'affiliate': ','.join(affiliates)}]
+    if address:
+        candidates.append({'address': address})
+
+    for params in candidates:
+        try:
+            data = client.get('/actions', {'limit': 10, 'type': 'swap', **params})
+        except requests.RequestException as e:
+            logger.info(f"🔍 Midgard rejected {list(params)[0]} filter: {e}")
+            continue
+        actions = data.get('actions', [])
+        if not actions:
+            logger.info(f"🔍 Midgard returned no swaps for the {list(params)[0]} filter")
+            continue
+        if all(wanted & action_affiliates(action) for action in actions):
+            logger.info(f"✅ Midgard supports server-side {list(params)[0]} filtering")
+            return params
+        logger.info(f"🔍 Midgard ignored the {list(params)[0]} filter")
+    return None
@@ -1,75 +1,432 @@
 import sqlite3
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, List, Tuple
 from web3 import Web3
 import threading
+import time
 import os
 
+from multicall import MulticallResolver
+
+# Tiered lookup: in-process memory cache -> SQLite -> Multicall3 on-chain calls.
+# Memory hits take no lock and do no I/O; SQLite connections are reused per
+# thread; RPC resolution happens outside every lock, and concurrent misses for
+# the same token wait for a single resolution instead of repeating it.
+# Failed lookups are cached too (token_failures), with a TTL per reason code,
+# so non-ERC-20 addresses and reverting contracts are not re-queried on every
+# row by any process sharing the store.
+#
+# Tokens are keyed on (chain_id, address): the same address is a different
+# token (or nothing) on Ethereum, Base and Polygon. Addresses are stored
+# lowercase. Callers that omit chain_id get Ethereum mainnet.
+
 _DB_PATH = os.path.expanduser('~/.token_cache.sqlite')
 _WEB3 = None
-_DB_LOCK = threading.Lock()
+_RESOLVERS: Dict[int, MulticallResolver] = {}
+_MEMORY_CAPACITY = 50_000
+DEFAULT_CHAIN_ID = 1
+
+# Chain names used across the listeners/config -> EVM chain id
+CHAIN_IDS = {
+    'ethereum': 1,
+    'optimism': 10,
+    'bsc': 56,
+    'gnosis': 100,
+    'polygon': 137,
+    'base': 8453,
+    'arbitrum': 42161,
+    'avalanche': 43114,
+}
 
 # --- DB Schema ---
+SCHEMA_VERSION = 2
+
 _SCHEMA = '''
 CREATE TABLE IF NOT EXISTS tokens (
-    address TEXT PRIMARY KEY,
+    chain_id INTEGER NOT NULL,
+    address TEXT NOT NULL,
     symbol TEXT,
     name TEXT,
     decimals INTEGER,
     price REAL,
-    updated_at INTEGER
+    updated_at INTEGER,
+    PRIMARY KEY (chain_id, address)
+);
+CREATE INDEX IF NOT EXISTS idx_tokens_symbol ON tokens (symbol COLLATE NOCASE, chain_id);
+CREATE TABLE IF NOT EXISTS token_failures (
+    chain_id INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    source TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    failed_at INTEGER NOT NULL,
+    expires_at INTEGER NOT NULL,
+    PRIMARY KEY (chain_id, address, source)
 );
 '''
 
+# Upsert used by every writer of the token store
+UPSERT_TOKEN_SQL = (
+    'INSERT OR REPLACE INTO tokens (chain_id, address, symbol, name, decimals, price, updated_at) '
+    'VALUES (?, ?, ?, ?, ?, ?, strftime("%s","now"))'
+)
+
+# --- Negative Cache TTLs (seconds, per reason code) ---
+# Overridden by storage.negative_cache.ttl in the central config when available
+NEGATIVE_TTLS = {
+    'not_erc20': 7 * 86400,      # decimals() reverted / not a contract
+    'not_found': 86400,          # external source (CMC) has no such token
+    'unidentified': 86400,       # every identification method failed
+    'rate_limited': 300,
+    'rpc_error': 300,            # transport failure, retry soon
+}
+_DEFAULT_NEGATIVE_TTL = 3600
+_TTLS_LOADED = False
+
+# --- Memory Tier ---
+class _ClockCache:
+    """Bounded in-memory cache with CLOCK (second-chance) eviction.
+
+    Reads are a single dict lookup plus setting a reference bit, both atomic
+    under the GIL, so they never block. Only inserts and evictions lock.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries: Dict[str, list] = {}  # key -> [value, referenced]
+        self._ring: List[str] = []
+        self._slots: Dict[str, int] = {}  # key -> ring index, kept after discard for reuse
+        self._hand = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry[1] = True
+        return entry[0]
+
+    def put(self, key: str, value: Dict) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[0] = value
+                entry[1] = True
+                return
+            if key in self._slots:
+                # Discarded earlier; its ring slot is still reserved
+                pass
+            elif len(self._ring) < self.capacity:
+                self._slots[key] = len(self._ring)
+                self._ring.append(key)
+            else:
+                # Advance the hand, clearing reference bits, until an unreferenced slot is found
+                while True:
+                    victim = self._ring[self._hand]
+                    victim_entry = self._entries.get(victim)
+                    if victim_entry is None or not victim_entry[1]:
+                        break
+                    victim_entry[1] = False
+                    self._hand = (self._hand + 1) % self.capacity
+                self._entries.pop(victim, None)
+                del self._slots[victim]
+                self._ring[self._hand] = key
+                self._slots[key] = self._hand
+                self._hand = (self._hand + 1) % self.capacity
+            self._entries[key] = [value, False]
+
+    def discard(self, key: str) -> None:
+        # The ring slot stays reserved for the key: a later put reuses it, or it
+        # is reclaimed as an unreferenced victim
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+            self._ring = []
+            self._slots = {}
+            self._hand = 0
+
+_MEMORY = _ClockCache(_MEMORY_CAPACITY)
+
+def _key(chain_id: int, address: str) -> str:
+    return f"{chain_id}:{address.lower()}"
+
+def _memory_lookup(key: str) -> Tuple[bool, Optional[Dict]]:
+    """(hit, info) from the memory tier; unexpired negative entries hit with None."""
+    info = _MEMORY.get(key)
+    if info is None:
+        return False, None
+    if 'negative' in info:
+        if info['expires_at'] > time.time():
+            return True, None
+        _MEMORY.discard(key)
+        return False, None
+    return True, info
+
 # --- Web3 Init ---
-def init_web3(rpc_url: str) -> None:
-    """Initialize Web3 connection for fallback lookups."""
+def init_web3(rpc_url: str, chain_id: int = DEFAULT_CHAIN_ID) -> None:
+    """Initialize Web3 connection for fallback lookups on a chain."""
     global _WEB3
-    _WEB3 = Web3(Web3.HTTPProvider(rpc_url))
+    w3 = Web3(Web3.HTTPProvider(rpc_url))
+    if chain_id == DEFAULT_CHAIN_ID:
+        _WEB3 = w3
+    register_resolver(chain_id, MulticallResolver(w3))
+
+def register_resolver(chain_id: int, resolver: MulticallResolver) -> None:
+    """Use an existing (listener-owned) resolver for on-chain lookups on a chain."""
+    _RESOLVERS[chain_id] = resolver
+
+def has_resolver(chain_id: int) -> bool:
+    return chain_id in _RESOLVERS
 
 # --- DB Connection ---
+_LOCAL = threading.local()
+_SCHEMA_LOCK = threading.Lock()
+_SCHEMA_READY = False
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Bring an existing store up to SCHEMA_VERSION."""
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(tokens)')]
+    if columns and 'chain_id' not in columns:
+        # v1 was keyed on address alone and bootstrapped from multi-chain token lists,
+        # so its rows cannot be attributed to a chain; they are re-learned on the next miss
+        conn.execute('DROP TABLE tokens')
+    failure_columns = [row[1] for row in conn.execute('PRAGMA table_info(token_failures)')]
+    if failure_columns and 'chain_id' not in failure_columns:
+        # Negative entries are disposable; they are re-learned on the next miss
+        conn.execute('DROP TABLE token_failures')
+    # Left behind by an earlier migration that copied v1 rows in as mainnet
+    conn.execute('DROP TABLE IF EXISTS tokens_v1')
+    conn.executescript(_SCHEMA)
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.commit()
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    global _SCHEMA_READY
+    if _SCHEMA_READY:
+        return
+    with _SCHEMA_LOCK:
+        if not _SCHEMA_READY:
+            conn.execute('PRAGMA journal_mode=WAL')
+            if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                _migrate(conn)
+            _SCHEMA_READY = True
+
 def _get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(_DB_PATH)
-    conn.execute(_SCHEMA)
+    """Open a new connection owned (and closed) by the caller."""
+    conn = sqlite3.connect(_DB_PATH, timeout=30)
+    _ensure_schema(conn)
+    return conn
+
+def _thread_conn() -> sqlite3.Connection:
+    """Connection reused for the lifetime of the calling thread."""
+    conn = getattr(_LOCAL, 'conn', None)
+    if conn is None:
+        conn = _LOCAL.conn = _get_conn()
     return conn
 
+def _in_batches(conn: sqlite3.Connection, sql: str, params: List, keys: List[str]):
+    """Run `sql` (ending in an IN clause placeholder `{}`) over keys in batches of 500."""
+    for start in range(0, len(keys), 500):
+        batch = keys[start:start + 500]
+        yield from conn.execute(sql.format(",".join("?" * len(batch))), [*params, *batch])
+
+# --- Tiers ---
+def _db_lookup(addresses: List[str], chain_id: int) -> Dict[str, Dict]:
+    found = {}
+    rows = _in_batches(_thread_conn(),
+                       'SELECT address, symbol, name, decimals, price FROM tokens WHERE chain_id = ? AND address IN ({})',
+                       [chain_id], addresses)
+    for address, symbol, name, decimals, price in rows:
+        found[address] = {'chain_id': chain_id, 'address': address, 'symbol': symbol, 'name': name,
+                          'decimals': decimals, 'price': price}
+    return found
+
+def store_token_infos(infos: Iterable[Dict], chain_id: int = DEFAULT_CHAIN_ID) -> None:
+    """Persist token infos ({address, symbol, name, decimals[, price]}) for a chain."""
+    rows = [(chain_id, i['address'].lower(), i.get('symbol'), i.get('name'), i.get('decimals'), i.get('price'))
+            for i in infos]
+    if not rows:
+        return
+    conn = _thread_conn()
+    conn.executemany(UPSERT_TOKEN_SQL, rows)
+    conn.commit()
+    for row in rows:
+        _MEMORY.discard(_key(chain_id, row[1]))
+
+def _rpc_lookup(addresses: List[str], chain_id: int) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+    """Resolve addresses through one Multicall3 round trip (per 500 tokens).
+
+    Returns (resolved infos, failure reason per unresolved address).
+    """
+    resolver = _RESOLVERS.get(chain_id)
+    if not resolver:
+        raise RuntimeError(f'No RPC for chain {chain_id}. Call init_web3() or register_resolver() first.')
+    try:
+        metadata = resolver.token_metadata(addresses)
+    except Exception:
+        # Transport/node failure (reverts never raise): retry soon, don't cache as non-ERC-20
+        return {}, {address: 'rpc_error' for address in addresses}
+    resolved = {}
+    for info in metadata.values():
+        if info:
+            address = info['address'].lower()
+            resolved[address] = {**info, 'chain_id': chain_id, 'address': address, 'price': None}
+    return resolved, {address: 'not_erc20' for address in addresses if address not in resolved}
+
+# --- Negative Cache ---
+def _negative_ttl(reason: str) -> int:
+    global _TTLS_LOADED
+    if not _TTLS_LOADED:
+        _TTLS_LOADED = True
+        try:
+            from config_loader import get_config
+            NEGATIVE_TTLS.update(get_config().get_negative_cache_config().get('ttl', {}) or {})
+        except Exception:
+            pass
+    return int(NEGATIVE_TTLS.get(reason, _DEFAULT_NEGATIVE_TTL))
+
+def _db_failures(addresses: List[str], source: str, chain_id: int) -> Dict[str, Tuple[str, int]]:
+    """Unexpired failures for lowercase addresses: {address: (reason, expires_at)}."""
+    rows = _in_batches(_thread_conn(),
+                       'SELECT address, reason, expires_at FROM token_failures '
+                       'WHERE chain_id = ? AND source = ? AND expires_at > ? AND address IN ({})',
+                       [chain_id, source, int(time.time())], addresses)
+    return {address: (reason, expires_at) for address, reason, expires_at in rows}
+
+def _remember_negative(chain_id: int, address: str, reason: str, expires_at: int) -> None:
+    _MEMORY.put(_key(chain_id, address), {'negative': reason, 'expires_at': expires_at})
+
+def record_failures(failures: Dict[str, str], source: str = 'rpc', ttl: Optional[int] = None,
+                    chain_id: int = DEFAULT_CHAIN_ID) -> None:
+    """Persist failed lookups ({address: reason}) for their reason's TTL."""
+    if not failures:
+        return
+    now = int(time.time())
+    rows = [(chain_id, address.lower(), source, reason, now, now + (ttl if ttl is not None else _negative_ttl(reason)))
+            for address, reason in failures.items()]
+    conn = _thread_conn()
+    conn.executemany('INSERT OR REPLACE INTO token_failures (chain_id, address, source, reason, failed_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    if source == 'rpc':
+        for _, address, _, reason, _, expires_at in rows:
+            _remember_negative(chain_id, address, reason, expires_at)
+
+def record_failure(address: str, reason: str, source: str = 'rpc', ttl: Optional[int] = None,
+                   chain_id: int = DEFAULT_CHAIN_ID) -> None:
+    """Persist one failed lookup (source: 'rpc', 'cmc', 'identify', ...)."""
+    record_failures({address: reason}, source, ttl, chain_id)
+
+def negative_reason(address: str, source: str = 'rpc', chain_id: int = DEFAULT_CHAIN_ID) -> Optional[str]:
+    """Reason code of an unexpired failed lookup, or None."""
+    failure = _db_failures([address.lower()], source, chain_id).get(address.lower())
+    return failure[0] if failure else None
+
+def clear_failures(address: str, source: Optional[str] = None, chain_id: int = DEFAULT_CHAIN_ID) -> None:
+    """Forget failed lookups for an address (all sources by default)."""
+    conn = _thread_conn()
+    if source is None:
+        conn.execute('DELETE FROM token_failures WHERE chain_id = ? AND address = ?', (chain_id, address.lower()))
+    else:
+        conn.execute('DELETE FROM token_failures WHERE chain_id = ? AND address = ? AND source = ?',
+                     (chain_id, address.lower(), source))
+    conn.commit()
+    _MEMORY.discard(_key(chain_id, address))
+
+# --- Single-flight ---
+_INFLIGHT: Dict[str, Tuple[threading.Event, list]] = {}  # key -> (done, [result])
+_INFLIGHT_LOCK = threading.Lock()
+
+def _load(addresses: List[str], chain_id: int) -> Dict[str, Dict]:
+    """Fill memory misses (lowercase addresses) from SQLite, then a single batched RPC resolution."""
+    found = _db_lookup(addresses, chain_id)
+    missing = [a for a in addresses if a not in found]
+    if missing:
+        # Addresses that failed recently stay negative until their TTL expires
+        negative = _db_failures(missing, 'rpc', chain_id)
+        for address, (reason, expires_at) in negative.items():
+            _remember_negative(chain_id, address, reason, expires_at)
+        missing = [a for a in missing if a not in negative]
+    if missing:
+        resolved, failed = _rpc_lookup(missing, chain_id)
+        if resolved:
+            store_token_infos(resolved.values(), chain_id)
+            found.update(resolved)
+        record_failures(failed, 'rpc', chain_id=chain_id)
+    for address, info in found.items():
+        _MEMORY.put(_key(chain_id, address), info)
+    return found
+
+def _resolve(key: str, address: str, chain_id: int) -> Optional[Dict]:
+    """Resolve a memory miss once across threads."""
+    with _INFLIGHT_LOCK:
+        inflight = _INFLIGHT.get(key)
+        leader = inflight is None
+        if leader:
+            inflight = _INFLIGHT[key] = (threading.Event(), [None])
+    event, result = inflight
+    if not leader:
+        # The leader's result, not the memory tier (which may already have evicted it)
+        event.wait()
+        return result[0]
+
+    try:
+        result[0] = _load([address], chain_id).get(address)
+        return result[0]
+    finally:
+        with _INFLIGHT_LOCK:
+            del _INFLIGHT[key]
+        event.set()
+
 # --- Main API ---
-def get_token_info(address: str) -> Optional[Dict]:
+def get_token_info(address: str, chain_id: int = DEFAULT_CHAIN_ID) -> Optional[Dict]:
     """Get token info from cache, fallback to Web3 if missing."""
-    address = Web3.to_checksum_address(address)
-    with _DB_LOCK:
-        conn = _get_conn()
-        cur = conn.execute('SELECT symbol, name, decimals, price FROM tokens WHERE address = ?', (address,))
-        row = cur.fetchone()
-        if row:
-            symbol, name, decimals, price = row
-            return {'address': address, 'symbol': symbol, 'name': name, 'decimals': decimals, 'price': price}
-        # Fallback to Web3
-        if not _WEB3:
-            raise RuntimeError('Web3 not initialized. Call init_web3() first.')
-        try:
-            contract = _WEB3.eth.contract(address=address, abi=[
-                {"constant":True,"inputs":[],"name":"symbol","outputs":[{"name":"","type":"string"}],"type":"function"},
-                {"constant":True,"inputs":[],"name":"name","outputs":[{"name":"","type":"string"}],"type":"function"},
-                {"constant":True,"inputs":[],"name":"decimals","outputs":[{"name":"","type":"uint8"}],"type":"function"}
-            ])
-            symbol = contract.functions.symbol().call()
-            name = contract.functions.name().call()
-            decimals = contract.functions.decimals().call()
-            price = None
-            # Insert into cache
-            conn.execute('INSERT OR REPLACE INTO tokens (address, symbol, name, decimals, price, updated_at) VALUES (?, ?, ?, ?, ?, strftime("%s","now"))',
-                         (address, symbol, name, decimals, price))
-            conn.commit()
-            return {'address': address, 'symbol': symbol, 'name': name, 'decimals': decimals, 'price': price}
-        except Exception as e:
-            return None
-        finally:
-            conn.close()
+    key = _key(chain_id, address)
+    hit, info = _memory_lookup(key)
+    if hit:
+        return info
+    return _resolve(key, address.lower(), chain_id)
+
+def get_token_infos(addresses: Iterable[str], chain_id: int = DEFAULT_CHAIN_ID) -> Dict[str, Optional[Dict]]:
+    """Get token info for many addresses, keyed by the addresses as given.
+
+    Memory misses are read from SQLite in one query and the remainder resolved
+    through Multicall3, so a whole chunk of tokens costs one RPC round trip.
+    """
+    results: Dict[str, Optional[Dict]] = {}
+    misses: List[str] = []
+    for address in addresses:
+        hit, info = _memory_lookup(_key(chain_id, address))
+        results[address] = info
+        if not hit:
+            misses.append(address)
+    if misses:
+        loaded = _load(list(dict.fromkeys(a.lower() for a in misses)), chain_id)
+        for address in misses:
+            results[address] = loaded.get(address.lower())
+    return results
+
+def find_by_symbol(symbol: str, chain_id: Optional[int] = None) -> List[Dict]:
+    """Stored tokens with a symbol (case-insensitive), optionally on one chain."""
+    sql = 'SELECT chain_id, address, symbol, name, decimals, price FROM tokens WHERE symbol = ? COLLATE NOCASE'
+    params: List = [symbol]
+    if chain_id is not None:
+        sql += ' AND chain_id = ?'
+        params.append(chain_id)
+    return [{'chain_id': c, 'address': a, 'symbol': s, 'name': n, 'decimals': d, 'price': p}
+            for c, a, s, n, d, p in _thread_conn().execute(sql, params)]
+
+def invalidate(address: Optional[str] = None, chain_id: int = DEFAULT_CHAIN_ID) -> None:
+    """Drop one address (or everything) from the in-process cache after external DB writes."""
+    if address is None:
+        _MEMORY.clear()
+    else:
+        _MEMORY.discard(_key(chain_id, address))
 
-def format_token_amount(amount: int, address: str) -> str:
+def format_token_amount(amount: int, address: str, chain_id: int = DEFAULT_CHAIN_ID) -> str:
     """Format a raw token amount using cached decimals."""
-    info = get_token_info(address)
+    info = get_token_info(address, chain_id)
     if not info or info['decimals'] is None:
         return str(amount)
     decimals = info['decimals']
-    return f"{amount / (10 ** decimals):,.6f} {info['symbol'] or ''}" 
\ No newline at end of file
+    return f"{amount / (10 ** decimals):,.6f} {info['symbol'] or ''}"
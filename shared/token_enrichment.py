@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Chunk Token Enrichment
+Collects the ERC-20 contracts seen in a chunk's Transfer logs while receipts
+are parsed, then resolves them all at once through the shared token store
+(memory -> SQLite keyed on chain id and address -> one Multicall3 round trip
+for the misses) and annotates the chunk's rows with symbol and decimals before
+they reach the sink.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from web3 import Web3
+
+from multicall import MulticallResolver
+import token_cache
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+ZERO_ADDRESS = '0x0000000000000000000000000000000000000000'
+
+# Row columns holding token addresses; each gets <column>_symbol and <column>_decimals
+TOKEN_COLUMNS = ('volume_token', 'affiliate_fee_token')
+
+
+def transfer_logs(receipt: Dict) -> List[Dict]:
+    """ERC-20 Transfer logs of a receipt, in log order"""
+    return [log_entry for log_entry in receipt['logs']
+            if len(log_entry['topics']) >= 3 and log_entry['topics'][0].hex().lower().endswith(TRANSFER_TOPIC[2:])]
+
+
+class ChunkTokenEnricher:
+    """Per-listener token metadata prefetch for Transfer-log tokens"""
+
+    def __init__(self, columns: Iterable[str] = TOKEN_COLUMNS):
+        self.columns = tuple(columns)
+        self._pending: Dict[int, Set[str]] = {}
+
+    def collect(self, chain_id: int, receipt: Dict):
+        """Remember the token contracts of a receipt's Transfer logs"""
+        pending = self._pending.setdefault(chain_id, set())
+        for log_entry in transfer_logs(receipt):
+            pending.add(log_entry['address'].lower())
+
+    def _resolve(self, chain_id: int, w3: Web3, rows: List[Dict[str, Any]]) -> Dict[str, Optional[Dict]]:
+        addresses = self._pending.pop(chain_id, set())
+        addresses.update(row[column].lower() for row in rows for column in self.columns
+                         if row.get(column) and row[column] != ZERO_ADDRESS)
+        if not addresses:
+            return {}
+
+        if not token_cache.has_resolver(chain_id):
+            token_cache.register_resolver(chain_id, MulticallResolver(w3))
+        try:
+            return token_cache.get_token_infos(addresses, chain_id)
+        except Exception as e:
+            # Leave the rows unannotated; the tokens are retried with the next chunk
+            logger.warning(f"⚠️ Token metadata prefetch failed on chain {chain_id}: {e}")
+            return {}
+
+    def annotate(self, chain_id: int, w3: Web3, rows: List[Dict[str, Any]]):
+        """Resolve the chunk's tokens and add symbol/decimals columns to rows"""
+        known = self._resolve(chain_id, w3, rows)
+
+        for row in rows:
+            for column in self.columns:
+                address = row.get(column)
+                info = known.get(address.lower()) if address else None
+                row[f"{column}_symbol"] = (info or {}).get('symbol') or ''
+                row[f"{column}_decimals"] = '' if info is None else info['decimals']
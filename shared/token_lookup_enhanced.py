@@ -6,13 +6,17 @@ Uses Uniswap for LP tokens.
 """
 
 import os
-import requests
 import sqlite3
 import time
 from typing import Dict, List, Optional
 from web3 import Web3
 from dotenv import load_dotenv
 
+import token_cache
+from cmc_client import CMCClient
+from multicall import MulticallResolver
+from token_cache import DEFAULT_CHAIN_ID, negative_reason, record_failure
+
 load_dotenv()
 
 class EnhancedTokenLookup:
@@ -28,6 +32,12 @@ class EnhancedTokenLookup:
             self.w3 = Web3(Web3.HTTPProvider(f'https://mainnet.infura.io/v3/{self.infura_api_key}'))
         else:
             self.w3 = None
+        self.multicall = MulticallResolver(self.w3) if self.w3 else None
+        # CoinMarketCap results are stored with on-chain decimals read through this resolver
+        if self.multicall and not token_cache.has_resolver(DEFAULT_CHAIN_ID):
+            token_cache.register_resolver(DEFAULT_CHAIN_ID, self.multicall)
+        # Lookups from concurrent callers are coalesced into multi-token requests
+        self.cmc = CMCClient(self.cmc_api_key) if self.cmc_api_key else None
         
         # Uniswap V2 Factory address
         self.uniswap_v2_factory = '0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f'
@@ -51,39 +61,26 @@ class EnhancedTokenLookup:
 
     def get_cmc_token_info(self, address: str) -> Optional[Dict]:
         """Get token info from CoinMarketCap API"""
-        if not self.cmc_api_key:
+        if not self.cmc:
             return None
         
         try:
-            # First try by contract address
-            url = "https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/latest"
-            params = {
-                'address': address,
-                'CMC_PRO_API_KEY': self.cmc_api_key
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if 'data' in data and address.lower() in data['data']:
-                    token_data = data['data'][address.lower()]
-                    return {
-                        'symbol': token_data['symbol'],
-                        'name': token_data['name'],
-                        'decimals': 18,  # Most tokens use 18 decimals
-                        'price': token_data['quote']['USD']['price'] if 'quote' in token_data else None,
-                        'market_cap': token_data['quote']['USD']['market_cap'] if 'quote' in token_data else None,
-                        'source': 'coinmarketcap'
-                    }
-            
-            # If not found by address, try searching by symbol
-            # This is useful for bridge tokens that might have different addresses
-            return None
-            
+            return self.cmc.get_token_info(address)
         except Exception as e:
             print(f"Error fetching from CoinMarketCap: {e}")
             return None
 
+    def get_cmc_token_infos(self, addresses: List[str]) -> Dict[str, Optional[Dict]]:
+        """Get token info for many addresses in batched CoinMarketCap requests"""
+        if not self.cmc:
+            return {address: None for address in addresses}
+        
+        try:
+            return self.cmc.get_token_infos(addresses)
+        except Exception as e:
+            print(f"Error fetching from CoinMarketCap: {e}")
+            return {address: None for address in addresses}
+
     def detect_lp_token(self, address: str) -> Optional[Dict]:
         """Detect if token is an LP token using Uniswap"""
         if not self.w3:
@@ -109,31 +106,26 @@ class EnhancedTokenLookup:
     def _check_uniswap_v2_lp(self, address: str) -> Optional[Dict]:
         """Check if token is a Uniswap V2 LP token"""
         try:
-            # Uniswap V2 LP token ABI (minimal)
-            lp_abi = [
-                {"constant": True, "inputs": [], "name": "token0", "outputs": [{"name": "", "type": "address"}], "type": "function"},
-                {"constant": True, "inputs": [], "name": "token1", "outputs": [{"name": "", "type": "address"}], "type": "function"},
-                {"constant": True, "inputs": [], "name": "getReserves", "outputs": [{"name": "_reserve0", "type": "uint112"}, {"name": "_reserve1", "type": "uint112"}, {"name": "_blockTimestampLast", "type": "uint32"}], "type": "function"}
-            ]
-            
-            contract = self.w3.eth.contract(address=address, abi=lp_abi)
+            # token0/token1/getReserves in one aggregate3 call; non-pairs come back as None
+            pair = self.multicall.pair_info([address]).get(Web3.to_checksum_address(address))
+            if not pair:
+                return None
             
-            # Try to call token0() - if it works, this is likely an LP token
-            token0 = contract.functions.token0().call()
-            token1 = contract.functions.token1().call()
-            
-            # Get token symbols
-            token0_symbol = self._get_token_symbol(token0)
-            token1_symbol = self._get_token_symbol(token1)
+            # Both underlying symbols in a second round trip
+            underlying = self.multicall.token_metadata([pair['token0'], pair['token1']])
+            token0_symbol = (underlying.get(pair['token0']) or {}).get('symbol') or 'UNKNOWN'
+            token1_symbol = (underlying.get(pair['token1']) or {}).get('symbol') or 'UNKNOWN'
             
             return {
                 'symbol': f'UNI-V2 {token0_symbol}-{token1_symbol}',
                 'name': f'Uniswap V2 {token0_symbol}-{token1_symbol} LP',
                 'decimals': 18,
-                'token0': token0,
-                'token1': token1,
+                'token0': pair['token0'],
+                'token1': pair['token1'],
                 'token0_symbol': token0_symbol,
                 'token1_symbol': token1_symbol,
+                'reserve0': pair['reserve0'],
+                'reserve1': pair['reserve1'],
                 'type': 'uniswap_v2_lp',
                 'source': 'uniswap'
             }
@@ -184,10 +176,8 @@ class EnhancedTokenLookup:
     def _get_token_symbol(self, address: str) -> str:
         """Get token symbol from contract"""
         try:
-            # Minimal ERC-20 ABI for symbol
-            abi = [{"constant": True, "inputs": [], "name": "symbol", "outputs": [{"name": "", "type": "string"}], "type": "function"}]
-            contract = self.w3.eth.contract(address=address, abi=abi)
-            return contract.functions.symbol().call()
+            info = self.multicall.token_metadata([address]).get(Web3.to_checksum_address(address))
+            return (info or {}).get('symbol') or "UNKNOWN"
         except:
             return "UNKNOWN"
 
@@ -273,6 +263,12 @@ class EnhancedTokenLookup:
         """Enhanced token identification using multiple sources"""
         print(f"🔍 Enhanced identification for: {address}")
         
+        # Tokens that failed every method recently are not retried until the TTL expires
+        reason = negative_reason(address, 'identify')
+        if reason:
+            print(f"⏭️ Skipping {address}: cached failure ({reason})")
+            return None
+        
         # 1. Try CoinMarketCap first
         cmc_info = self.get_cmc_token_info(address)
         if cmc_info:
@@ -304,35 +300,35 @@ class EnhancedTokenLookup:
             return basic_info
         
         print(f"❌ Could not identify token: {address}")
+        if self.w3 or self.cmc_api_key:
+            record_failure(address, 'unidentified', source='identify')
         return None
 
     def _get_basic_token_info(self, address: str) -> Optional[Dict]:
         """Get basic token info from blockchain"""
-        if not self.w3:
-            return None
+        return self.get_basic_token_infos([address]).get(address)
+
+    def get_basic_token_infos(self, addresses: List[str]) -> Dict[str, Optional[Dict]]:
+        """Get basic token info for many addresses in one Multicall3 round trip"""
+        if not self.w3 or not addresses:
+            return {address: None for address in addresses}
         
         try:
-            # Minimal ERC-20 ABI
-            abi = [
-                {"constant": True, "inputs": [], "name": "symbol", "outputs": [{"name": "", "type": "string"}], "type": "function"},
-                {"constant": True, "inputs": [], "name": "name", "outputs": [{"name": "", "type": "string"}], "type": "function"},
-                {"constant": True, "inputs": [], "name": "decimals", "outputs": [{"name": "", "type": "uint8"}], "type": "function"}
-            ]
-            
-            contract = self.w3.eth.contract(address=address, abi=abi)
-            symbol = contract.functions.symbol().call()
-            name = contract.functions.name().call()
-            decimals = contract.functions.decimals().call()
-            
-            return {
-                'symbol': symbol,
-                'name': name,
-                'decimals': decimals,
-                'source': 'blockchain'
-            }
-            
+            metadata = self.multicall.token_metadata(addresses)
         except Exception as e:
-            return None
+            print(f"Error fetching token metadata: {e}")
+            return {address: None for address in addresses}
+        
+        infos = {}
+        for address in addresses:
+            info = metadata.get(Web3.to_checksum_address(address))
+            infos[address] = {
+                'symbol': info['symbol'],
+                'name': info['name'],
+                'decimals': info['decimals'],
+                'source': 'blockchain'
+            } if info else None
+        return infos
 
 def main():
     """Test the enhanced token lookup"""
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Cross-chain Token Registry
+Known tokens across the chains the listeners cover, with dict indexes on
+(chain, address), on symbol (case-insensitive, several candidates per symbol)
+and on THORChain asset notation (ETH.USDC-0XA0B8..., BTC.BTC, synth BTC/BTC,
+trade ETH~ETH). The registry is built once from the seed below, persisted as
+JSON, and shared read-only through get_registry(). The JSON records a hash of
+the seed it was built from and is rebuilt whenever the seed changes.
+
+Native assets use the zero address on EVM chains and an empty address on
+other chains.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from webscrape_index import THORCHAIN_CHAINS, parse_thorchain_asset
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_PATH = 'databases/token_registry.json'
+REGISTRY_VERSION = 1
+NATIVE_EVM = '0x0000000000000000000000000000000000000000'
+
+# symbol -> (name, {chain: (address, decimals)})
+REGISTRY_SEED: Dict[str, Tuple[str, Dict[str, Tuple[str, int]]]] = {
+    'ETH': ('Ether', {
+        'ethereum': (NATIVE_EVM, 18), 'arbitrum': (NATIVE_EVM, 18),
+        'optimism': (NATIVE_EVM, 18), 'base': (NATIVE_EVM, 18),
+    }),
+    'WETH': ('Wrapped Ether', {
+        'ethereum': ('0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2', 18),
+        'polygon': ('0x7ceB23fD6bC0adD59E62ac25578270cFf1b9f619', 18),
+        'arbitrum': ('0x82aF49447D8a07e3bd95BD0d56f35241523fBab1', 18),
+        'optimism': ('0x4200000000000000000000000000000000000006', 18),
+        'base': ('0x4200000000000000000000000000000000000006', 18),
+        'avalanche': ('0x49D5c2BdFfac6CE2BFdB6640F4F80f226bc10bAB', 18),
+    }),
+    'BTC': ('Bitcoin', {'bitcoin': ('', 8)}),
+    'WBTC': ('Wrapped BTC', {
+        'ethereum': ('0x2260FAC5E5542a773Aa44fBCfeDf7C193bc2C599', 8),
+        'polygon': ('0x1BFD67037B42Cf73acF2047067bd4F2C47D9BfD6', 8),
+        'arbitrum': ('0x2f2a2543B76A4166549F7aaB2e75Bef0aefC5B0f', 8),
+        'optimism': ('0x68f180fcCe6836688e9084f035309E29Bf0A2095', 8),
+    }),
+    'CBBTC': ('Coinbase Wrapped BTC', {
+        'ethereum': ('0xcbB7C0000aB88B473b1f5aFd9ef808440eed33Bf', 8),
+        'base': ('0xcbB7C0000aB88B473b1f5aFd9ef808440eed33Bf', 8),
+    }),
+    'USDC': ('USD Coin', {
+        'ethereum': ('0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48', 6),
+        'polygon': ('0x3c499c542cEF5E3811e1192ce70d8cC03d5c3359', 6),
+        'arbitrum': ('0xaf88d065e77c8cC2239327C5EDb3A432268e5831', 6),
+        'optimism': ('0x0b2C639c533813f4Aa9D7837CAf62653d097Ff85', 6),
+        'base': ('0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913', 6),
+        'avalanche': ('0xB97EF9Ef8734C71904D8002F8b6Bc66Dd9c48a6E', 6),
+    }),
+    'USDC.E': ('Bridged USD Coin', {
+        'polygon': ('0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174', 6),
+    }),
+    'USDT': ('Tether USD', {
+        'ethereum': ('0xdAC17F958D2ee523a2206206994597C13D831ec7', 6),
+        'polygon': ('0xc2132D05D31c914a87C6611C10748AEb04B58e8F', 6),
+        'arbitrum': ('0xFd086bC7CD5C481DCC9C85ebE478A1C0b69FCbb9', 6),
+        'optimism': ('0x94b008aA00579c1307B0EF2c499aD98a8ce58e58', 6),
+        'base': ('0xfde4C96c8593536E31F229EA8f37b2ADa2699bb2', 6),
+        'avalanche': ('0x9702230A8Ea53601f5cD2dc00fDBc13d4dF4A8c7', 6),
+    }),
+    'DAI': ('Dai Stablecoin', {
+        'ethereum': ('0x6B175474E89094C44Da98b954EedeAC495271d0F', 18),
+        'polygon': ('0x8f3Cf7ad23Cd3CaDbD9735AFf958023239c6A063', 18),
+        'arbitrum': ('0xDA10009cBd5D07dd0CeCc66161FC93D7c9000da1', 18),
+        'optimism': ('0xDA10009cBd5D07dd0CeCc66161FC93D7c9000da1', 18),
+        'base': ('0x50c5725949A6F0c72E6C4a641F24049A917DB0Cb', 18),
+    }),
+    'FOX': ('ShapeShift FOX', {
+        'ethereum': ('0xc770EEfAd204B5180dF6a14Ee197D99d808ee52d', 18),
+    }),
+    'BAL': ('Balancer', {'ethereum': ('0xba100000625a3754423978a60c9317c58a424e3D', 18)}),
+    'AURA': ('Aura', {'ethereum': ('0xC0c293ce456fF0ED870ADd3aFf0D1bBd3Bf3D8a2', 18)}),
+    'LIT': ('Timeless', {'ethereum': ('0xfd0205066521550D7d7AB546DA51B6fD5d7Ee9e0', 18)}),
+    'AURABAL': ('Aura BAL', {'ethereum': ('0x616e8BfA43F920657B3497DBf40D6b1A02D4608d', 18)}),
+    'SWETH': ('Swell Ether', {'ethereum': ('0xf951E335afb289353dc249e82926178EaC7DEd78', 18)}),
+    'STETH': ('Lido Staked Ether', {'ethereum': ('0xae7ab96520DE3A18E5e111B5EaAb095312D7fE84', 18)}),
+    'WSTETH': ('Wrapped stETH', {'ethereum': ('0x7f39C581F595B53c5cb19bD0b3f8dA6c935E2Ca0', 18)}),
+    'MPL': ('Maple', {'ethereum': ('0x33349B282065b0284d756F0577FB39c158F935e6', 18)}),
+    'RUNE': ('THORChain', {
+        'thorchain': ('', 8),
+        'ethereum': ('0x3155BA85D5F96b2d030a4966AF206230e46849cb', 18),
+    }),
+    'TCY': ('THORChain Yield', {'thorchain': ('', 8)}),
+    'DOGE': ('Dogecoin', {'dogecoin': ('', 8)}),
+    'LTC': ('Litecoin', {'litecoin': ('', 8)}),
+    'BCH': ('Bitcoin Cash', {'bitcoincash': ('', 8)}),
+    'ATOM': ('Cosmos', {'cosmos': ('', 6)}),
+    'AVAX': ('Avalanche', {'avalanche': (NATIVE_EVM, 18)}),
+    'WAVAX': ('Wrapped AVAX', {'avalanche': ('0xB31f66AA3C1e785363F0875A1B74E27b85FD66c7', 18)}),
+    'BNB': ('BNB', {'bsc': (NATIVE_EVM, 18)}),
+}
+
+# Symbols that stand for a wrapped token on chains without the native asset
+WRAPPED_ALIASES = {'BTC': ('WBTC', 'CBBTC'), 'ETH': ('WETH',), 'AVAX': ('WAVAX',)}
+
+# Registry chain -> THORChain chain prefix
+_THOR_PREFIXES = {chain: prefix for prefix, chain in THORCHAIN_CHAINS.items()}
+
+
+class TokenRegistry:
+    """Read-only token indexes; entries are dicts and must not be mutated"""
+
+    def __init__(self, entries: Iterable[Dict]):
+        self._entries: List[Dict] = []
+        self._by_address: Dict[Tuple[str, str], Dict] = {}
+        self._by_symbol: Dict[str, List[Dict]] = {}
+        self._by_symbol_chain: Dict[Tuple[str, str], List[Dict]] = {}
+        self._by_thor_asset: Dict[str, Dict] = {}
+
+        for entry in entries:
+            entry = {
+                'symbol': entry['symbol'].upper(),
+                'name': entry['name'],
+                'chain': entry['chain'].lower(),
+                'address': entry['address'].lower(),
+                'decimals': int(entry['decimals']),
+            }
+            self._entries.append(entry)
+            self._by_address[(entry['chain'], entry['address'])] = entry
+            self._by_symbol.setdefault(entry['symbol'], []).append(entry)
+            self._by_symbol_chain.setdefault((entry['symbol'], entry['chain']), []).append(entry)
+            prefix = _THOR_PREFIXES.get(entry['chain'])
+            if prefix:
+                notation = f"{prefix}.{entry['symbol']}"
+                if entry['address'] and entry['address'] != NATIVE_EVM:
+                    notation += f"-{entry['address']}"
+                self._by_thor_asset[notation.upper()] = entry
+
+    @classmethod
+    def from_seed(cls, seed: Dict = REGISTRY_SEED) -> 'TokenRegistry':
+        return cls({'symbol': symbol, 'name': name, 'chain': chain, 'address': address, 'decimals': decimals}
+                   for symbol, (name, chains) in seed.items()
+                   for chain, (address, decimals) in chains.items())
+
+    # -------------------------------------------------------------------------
+    # Lookups
+    # -------------------------------------------------------------------------
+
+    def by_address(self, chain: str, address: str) -> Optional[Dict]:
+        """Token at an address on a chain"""
+        return self._by_address.get((chain.lower(), address.lower()))
+
+    def by_symbol(self, symbol: str, chain: Optional[str] = None) -> List[Dict]:
+        """Every token with a symbol (case-insensitive), optionally on one chain"""
+        if chain is None:
+            return list(self._by_symbol.get(symbol.upper(), []))
+        return list(self._by_symbol_chain.get((symbol.upper(), chain.lower()), []))
+
+    def resolve(self, symbol: str, chain: str) -> Optional[Dict]:
+        """Token for a symbol on a chain, falling back to its wrapped form (BTC -> WBTC/cbBTC)"""
+        for candidate in (symbol.upper(),) + WRAPPED_ALIASES.get(symbol.upper(), ()):
+            entries = self.by_symbol(candidate, chain)
+            if entries:
+                return entries[0]
+        return None
+
+    def by_thor_asset(self, asset: str) -> Optional[Dict]:
+        """Token for a THORChain asset string (pool, synth or trade notation)"""
+        normalized = asset.strip().upper().replace('/', '.', 1).replace('~', '.', 1)
+        entry = self._by_thor_asset.get(normalized)
+        if entry is not None:
+            return entry
+        parsed = parse_thorchain_asset(asset.strip())
+        if parsed is None:
+            return None
+        symbol, chain, address = parsed
+        if address:
+            return self.by_address(chain, address)
+        candidates = self.by_symbol(symbol, chain)
+        return candidates[0] if candidates else None
+
+    def symbol_to_address(self, chain: str) -> Dict[str, str]:
+        """symbol -> address for one chain (first entry per symbol)"""
+        mapping: Dict[str, str] = {}
+        for entry in self._entries:
+            if entry['chain'] == chain.lower():
+                mapping.setdefault(entry['symbol'], entry['address'])
+        return mapping
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    # -------------------------------------------------------------------------
+    # Persistence
+    # -------------------------------------------------------------------------
+
+    def save(self, path: str, seed_hash: str = ''):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': REGISTRY_VERSION, 'seed': seed_hash, 'tokens': self._entries}, f,
+                      separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, seed_hash: str = '') -> Optional['TokenRegistry']:
+        """Registry persisted at path, or None if missing, from another version or another seed"""
+        try:
+            with open(path, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if saved.get('version') != REGISTRY_VERSION or saved.get('seed', '') != seed_hash:
+            return None
+        return cls(saved.get('tokens', []))
+
+
+def seed_hash(seed: Dict = REGISTRY_SEED) -> str:
+    """Content hash of a registry seed"""
+    return hashlib.sha256(json.dumps(seed, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+_REGISTRY: Optional[TokenRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry(path: str = DEFAULT_REGISTRY_PATH) -> TokenRegistry:
+    """Process-wide registry: loaded from path, or built from the seed and persisted"""
+    global _REGISTRY
+    if _REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                current_seed = seed_hash()
+                registry = TokenRegistry.load(path, current_seed)
+                if registry is None:
+                    registry = TokenRegistry.from_seed()
+                    try:
+                        registry.save(path, current_seed)
+                    except OSError as e:
+                        logger.warning(f"⚠️ Could not persist token registry to {path}: {e}")
+                _REGISTRY = registry
+    return _REGISTRY
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Transfer Valuation Engine
+Values a whole chunk of token transfers at once: raw integer amounts stay exact
+(they are what lands in the CSV), while the USD figures are computed in one
+numpy pass over (token, hour) keys. Each distinct key is priced once, and
+decimals come from the token store annotations, never an assumed 18. Legs
+CoinMarketCap cannot price fall back to on-chain pool reserves at the row's
+block when a pool oracle is configured.
+"""
+
+import logging
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pool_oracle import PoolPriceOracle
+from price_history import PriceHistory, hour_bucket
+
+logger = logging.getLogger(__name__)
+
+# (raw amount column, token column, USD column); the token column's
+# <column>_symbol / <column>_decimals come from ChunkTokenEnricher
+VALUE_LEGS = (
+    ('volume_amount', 'volume_token', 'volume_usd'),
+    ('affiliate_fee_amount', 'affiliate_fee_token', 'affiliate_fee_usd'),
+)
+
+
+def transfer_amount(log_entry: Dict) -> int:
+    """Exact uint256 amount of an ERC-20 Transfer log"""
+    data = log_entry['data']
+    if isinstance(data, str):
+        data = bytes.fromhex(data[2:] if data.startswith('0x') else data)
+    return int.from_bytes(bytes(data[:32]), 'big')
+
+
+def value_transfers(keys: Sequence[Hashable], raw_amounts: Sequence[int], decimals: Sequence[int],
+                    price_of: Callable[[Hashable], Optional[float]]) -> np.ndarray:
+    """USD value of each transfer; NaN where the key has no price.
+
+    keys identify what is priced (e.g. (symbol, hour)); price_of is called once
+    per distinct key and the result is broadcast back through inverse indices.
+    """
+    count = len(keys)
+    index: Dict[Hashable, int] = {}
+    inverse = np.fromiter((index.setdefault(key, len(index)) for key in keys), dtype=np.int64, count=count)
+
+    unique_prices = np.array([price if (price := price_of(key)) is not None else np.nan for key in index],
+                             dtype=np.float64)
+    # float(int) rounds a uint256 correctly; the exact int is kept by the caller
+    amounts = np.fromiter(map(float, raw_amounts), dtype=np.float64, count=count)
+    scale = np.power(10.0, -np.fromiter(decimals, dtype=np.float64, count=count))
+    return amounts * scale * unique_prices[inverse]
+
+
+class ValuationEngine:
+    """Chunk-level USD valuation of listener rows at each row's timestamp"""
+
+    def __init__(self, price_history: PriceHistory, oracle: Optional[PoolPriceOracle] = None,
+                 legs: Sequence[Tuple[str, str, str]] = VALUE_LEGS):
+        self.price_history = price_history
+        self.oracle = oracle
+        self.legs = tuple(legs)
+
+    def value_rows(self, rows: List[Dict[str, Any]], chain_id: Optional[int] = None, w3: Any = None) -> int:
+        """Fill the USD columns of rows in place; returns how many legs were priced.
+
+        chain_id and w3 enable the pool oracle fallback for legs without a
+        CoinMarketCap price.
+        """
+        targets: List[Tuple[Dict[str, Any], str]] = []
+        keys: List[Tuple[str, int]] = []
+        amounts: List[int] = []
+        decimals: List[int] = []
+
+        for row in rows:
+            for amount_column, token_column, usd_column in self.legs:
+                symbol = row.get(f"{token_column}_symbol")
+                token_decimals = row.get(f"{token_column}_decimals")
+                if not symbol or token_decimals in (None, ''):
+                    continue
+                try:
+                    amount = int(row.get(amount_column) or 0)
+                except ValueError:
+                    continue
+                if amount <= 0:
+                    continue
+                targets.append((row, usd_column))
+                keys.append((symbol.upper(), hour_bucket(row['timestamp'])))
+                amounts.append(amount)
+                decimals.append(int(token_decimals))
+
+        if not targets:
+            return 0
+
+        # One range fetch per symbol for the chunk, then per-key reads hit SQLite/memory
+        hours = [hour for _, hour in keys]
+        self.price_history.prefetch({symbol for symbol, _ in keys}, min(hours), max(hours))
+        usd = value_transfers(keys, amounts, decimals,
+                              lambda key: self.price_history.price_at(key[0], key[1], fetch=False))
+
+        usd = usd.tolist()
+        unpriced = [i for i, value in enumerate(usd) if value != value]  # NaN
+        if unpriced and self.oracle is not None and w3 is not None:
+            usd_by_index = self._value_on_chain(chain_id, w3, [(targets[i], amounts[i], decimals[i]) for i in unpriced])
+            for position, i in enumerate(unpriced):
+                if usd_by_index[position] is not None:
+                    usd[i] = usd_by_index[position]
+
+        priced = 0
+        for (row, usd_column), value in zip(targets, usd, strict=True):
+            if value == value:
+                row[usd_column] = str(value)
+                priced += 1
+        if priced < len(targets):
+            logger.info(f"⚠️ {len(targets) - priced}/{len(targets)} transfers had no price")
+        return priced
+
+    def _value_on_chain(self, chain_id: int, w3: Any,
+                        legs: List[Tuple[Tuple[Dict[str, Any], str], int, int]]) -> List[Optional[float]]:
+        """Pool-oracle USD values for (target, raw amount, decimals) legs at their blocks"""
+        token_column = {usd_column: token_column for _, token_column, usd_column in self.legs}
+        requests = [(row[token_column[usd_column]], int(row['block_number'])) for (row, usd_column), _, _ in legs]
+        prices = self.oracle.prices_at(chain_id, w3, requests)
+        values = []
+        for (token, block), (_, amount, token_decimals) in zip(requests, legs, strict=True):
+            price = prices.get((w3.to_checksum_address(token), block))
+            values.append(None if price is None else amount / 10 ** token_decimals * price)
+        return values
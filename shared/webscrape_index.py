@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Webscrape Token Index
+The viewblock THORChain dump and the CoW Swap dashboard export are converted
+once into a sorted, tab-separated index (one SYMBOL, CHAIN, ADDRESS, SOURCES
+line per token) next to the source files. Queries memory-map the index and
+binary-search it by symbol, so nothing is read until the first lookup and
+lookups never parse the original datasets. The index is rebuilt automatically
+when a source file is newer than it.
+"""
+
+import csv
+import logging
+import mmap
+import os
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = 'webscrape/token_index.tsv'
+THORCHAIN_SOURCE = 'webscrape/viewblock_thorchain_combined_dedup_2025-07-29.csv'
+COWSWAP_SOURCE = 'webscrape/CoW Swap Partner Dashboard Table.xlsx'
+
+# THORChain chain prefixes -> chain names used across the listeners/config
+THORCHAIN_CHAINS = {
+    'ETH': 'ethereum', 'BASE': 'base', 'AVAX': 'avalanche', 'BSC': 'bsc', 'ARB': 'arbitrum',
+    'BTC': 'bitcoin', 'LTC': 'litecoin', 'BCH': 'bitcoincash', 'DOGE': 'dogecoin',
+    'GAIA': 'cosmos', 'THOR': 'thorchain', 'XRP': 'ripple', 'TRON': 'tron',
+}
+
+
+def parse_thorchain_asset(asset: str) -> Optional[Tuple[str, str, str]]:
+    """(symbol, chain, address) of a THORChain asset such as ETH.USDC-0XA0B8..."""
+    for separator in ('.', '/', '~'):
+        if separator in asset:
+            chain, rest = asset.split(separator, 1)
+            break
+    else:
+        return None
+    symbol, _, address = rest.partition('-')
+    if not symbol:
+        return None
+    address = address.lower() if address.upper().startswith('0X') else ''
+    return symbol.upper(), THORCHAIN_CHAINS.get(chain.upper(), chain.lower()), address
+
+
+class WebscrapeIndex:
+    """Lazily memory-mapped symbol index over the webscrape datasets"""
+
+    def __init__(self, index_path: str = DEFAULT_INDEX_PATH, thorchain_csv: str = THORCHAIN_SOURCE,
+                 cowswap_xlsx: str = COWSWAP_SOURCE):
+        self.index_path = index_path
+        self.sources = {'thorchain': thorchain_csv, 'cowswap': cowswap_xlsx}
+        self._mm: Optional[mmap.mmap] = None
+        self._file = None
+        self._empty = False
+
+    # -------------------------------------------------------------------------
+    # Building
+    # -------------------------------------------------------------------------
+
+    def _is_stale(self) -> bool:
+        if not os.path.exists(self.index_path):
+            return True
+        built_at = os.path.getmtime(self.index_path)
+        return any(os.path.exists(path) and os.path.getmtime(path) > built_at for path in self.sources.values())
+
+    def _read_thorchain(self) -> Iterator[Tuple[str, str, str]]:
+        with open(self.sources['thorchain'], newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                for column in ('from_asset', 'to_asset'):
+                    parsed = parse_thorchain_asset(row.get(column) or '')
+                    if parsed:
+                        yield parsed
+
+    def _read_cowswap(self) -> Iterator[Tuple[str, str, str]]:
+        import pandas as pd  # only needed to (re)build the index from the XLSX export
+        df = pd.read_excel(self.sources['cowswap'], sheet_name=0, usecols=['Sell Token', 'Buy Token'])
+        for column in ('Sell Token', 'Buy Token'):
+            for symbol in df[column].dropna().unique():
+                yield str(symbol).strip().upper(), '', ''
+
+    def build(self) -> int:
+        """Convert the source datasets into the sorted index; returns its line count"""
+        entries: Dict[Tuple[str, str, str], Set[str]] = {}
+        readers = {'thorchain': self._read_thorchain, 'cowswap': self._read_cowswap}
+        for source, read in readers.items():
+            if not os.path.exists(self.sources[source]):
+                continue
+            try:
+                for key in read():
+                    if key[0] and '\t' not in ''.join(key):
+                        entries.setdefault(key, set()).add(source)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not index {self.sources[source]}: {e}")
+
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+            for (symbol, chain, address), sources in sorted(entries.items()):
+                f.write(f"{symbol}\t{chain}\t{address}\t{','.join(sorted(sources))}\n")
+        os.replace(tmp_path, self.index_path)
+        logger.info(f"✅ Indexed {len(entries)} webscrape tokens into {self.index_path}")
+        return len(entries)
+
+    def _open(self) -> Optional[mmap.mmap]:
+        if self._mm is None and not self._empty:
+            if self._is_stale() and any(os.path.exists(path) for path in self.sources.values()):
+                self.build()
+            if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) == 0:
+                self._empty = True
+                return None
+            self._file = open(self.index_path, 'rb')
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+
+    def _lower_bound(self, mm: mmap.mmap, key: bytes) -> int:
+        """Offset of the first line whose symbol is >= key"""
+        lo, hi = 0, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            newline = mm.rfind(b'\n', lo, mid)
+            start = newline + 1 if newline >= 0 else lo
+            end = mm.find(b'\n', start)
+            end = len(mm) if end < 0 else end
+            if mm[start:end].split(b'\t', 1)[0] < key:
+                lo = end + 1
+            else:
+                hi = start
+        return lo
+
+    def lookup(self, symbol: str) -> List[Dict[str, object]]:
+        """Every (chain, address, sources) entry recorded for a symbol"""
+        mm = self._open()
+        if mm is None:
+            return []
+        key = symbol.strip().upper().encode('utf-8')
+        position = self._lower_bound(mm, key)
+        matches = []
+        while position < len(mm):
+            end = mm.find(b'\n', position)
+            end = len(mm) if end < 0 else end
+            fields = mm[position:end].decode('utf-8').split('\t')
+            if fields[0].encode('utf-8') != key:
+                break
+            matches.append({'symbol': fields[0], 'chain': fields[1], 'address': fields[2],
+                            'sources': fields[3].split(',')})
+            position = end + 1
+        return matches
+
+    def has_symbol(self, symbol: str, source: Optional[str] = None) -> bool:
+        """Whether a symbol appears in the datasets (optionally a given source)"""
+        return any(source is None or source in entry['sources'] for entry in self.lookup(symbol))
+
+    def symbols(self, source: Optional[str] = None) -> Set[str]:
+        """All indexed symbols (full scan; for reports, not hot paths)"""
+        mm = self._open()
+        if mm is None:
+            return set()
+        found = set()
+        for line in iter(mm.readline, b''):
+            fields = line.decode('utf-8').rstrip('\n').split('\t')
+            if source is None or source in fields[3].split(','):
+                found.add(fields[0])
+        mm.seek(0)
+        return found
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = self._file = None
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+CSV Consolidator - Incremental Cross-Protocol Dataset
+=====================================================
+
+Builds storage.file_patterns.consolidated (consolidated_transactions.csv) from
+the per-protocol transactions CSVs written by the listeners.
+
+Each run only reads the bytes appended to every source file since the previous
+run. Watermarks are kept per file identity (device + inode), so a source file
+that the CSV sink rotates aside keeps its watermark under its new name and the
+fresh active file starts from zero. Rows are normalized to one unified schema
+(protocol-specific columns such as bridge_type, pool/from_asset and order_uid
+are kept, empty for other protocols), deduplicated against a persistent index
+and appended through the CSV sink.
+
+Key Features:
+- Incremental: cost is proportional to new rows, not history
+- Unified schema with a protocol column and unix-second timestamps
+- Idempotent: replays after a crash do not duplicate rows
+"""
+
+import os
+import sys
+import csv
+import hashlib
+import io
+import json
+import logging
+import time
+from typing import Dict, List, Any
+
+# Add shared directory to path for centralized config
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+
+# Import centralized configuration
+from config_loader import get_config
+from csv_sink import CSVSink, rotated_paths
+from dedup_index import DedupIndex, make_key
+
+# =============================================================================
+# UNIFIED SCHEMA
+# =============================================================================
+
+CONSOLIDATED_HEADERS = [
+    'protocol', 'tx_hash', 'chain', 'block_number', 'log_index', 'timestamp',
+    'from_address', 'to_address', 'affiliate_address', 'affiliate_fee_amount',
+    'affiliate_fee_token', 'affiliate_fee_usd', 'volume_amount', 'volume_token',
+    'volume_usd', 'gas_used', 'gas_price',
+    'volume_token_symbol', 'volume_token_decimals',
+    'affiliate_fee_token_symbol', 'affiliate_fee_token_decimals',
+    # Portals
+    'bridge_type', 'source_chain', 'destination_chain',
+    # THORChain
+    'pool', 'from_asset', 'to_asset', 'from_amount', 'to_amount',
+    'affiliate_fee_asset', 'affiliate_fee_amount_asset',
+    # CoW Swap
+    'order_uid', 'receiver',
+    'created_at'
+]
+
+# Per-protocol source column -> unified column, for sources whose names differ
+COLUMN_ALIASES: Dict[str, Dict[str, str]] = {
+    'relay': {'transaction_hash': 'tx_hash'},
+}
+
+
+def _normalize_timestamp(value: Any) -> str:
+    """Unix seconds from seconds, milliseconds or (Midgard) nanoseconds"""
+    try:
+        ts = int(float(value))
+    except (TypeError, ValueError):
+        return ''
+    if ts > 10 ** 17:
+        ts //= 10 ** 9
+    elif ts > 10 ** 11:
+        ts //= 10 ** 3
+    return str(ts)
+
+
+def consolidated_key(row: Dict[str, Any]) -> bytes:
+    """Dedup key for a consolidated row (protocol-qualified).
+
+    Rows without a tx id are keyed on their non-empty columns instead, so a
+    source re-read from offset 0 (a header migration rewrites the file under
+    a new inode, resetting its watermark) does not append them again.
+    """
+    key = make_key(f"{row.get('protocol', '')}:{row.get('chain', '')}",
+                   row.get('tx_hash', ''), row.get('log_index', ''))
+    if key is not None:
+        return key
+    content = json.dumps({column: value for column, value in row.items() if value not in (None, '')},
+                         sort_keys=True, default=str)
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+
+# =============================================================================
+# CONSOLIDATOR
+# =============================================================================
+
+class CSVConsolidator:
+    """Incrementally merges per-protocol transactions CSVs into one dataset"""
+
+    def __init__(self):
+        """Initialize the consolidator with centralized configuration"""
+        self.config = get_config()
+        self.logger = logging.getLogger(__name__)
+
+        # Get storage paths
+        self.csv_dir = self.config.get_storage_path('csv_directory')
+        self.transactions_dir = os.path.join(self.csv_dir, 'transactions')
+        self.block_tracking_dir = os.path.join(self.csv_dir, 'block_tracking')
+        os.makedirs(self.transactions_dir, exist_ok=True)
+        os.makedirs(self.block_tracking_dir, exist_ok=True)
+
+        # Source files: every transactions pattern except the output itself
+        patterns = self.config.config.get('storage', {}).get('file_patterns', {})
+        consolidated_name = patterns.get('consolidated', 'consolidated_transactions.csv')
+        self.sources = {
+            protocol: os.path.join(self.transactions_dir, pattern)
+            for protocol, pattern in patterns.items()
+            if protocol not in ('consolidated', 'block_tracker') and '{' not in pattern
+            and pattern.endswith('.csv')
+        }
+
+        consolidated_path = os.path.join(self.transactions_dir, consolidated_name)
+        self.sink = CSVSink(consolidated_path, CONSOLIDATED_HEADERS, **self.config.get_csv_sink_config())
+        self.dedup_index = DedupIndex(os.path.splitext(consolidated_path)[0] + '.dedup.sqlite',
+                                      key_func=consolidated_key, **self.config.get_dedup_config())
+        if self.dedup_index.is_new:
+            self.dedup_index.seed_from_csv(self.sink.all_paths())
+
+        self.watermark_path = os.path.join(self.block_tracking_dir, 'consolidated_watermarks.json')
+        self.watermarks = self._load_watermarks()
+
+        self.logger.info("✅ CSVConsolidator initialized successfully")
+        self.logger.info(f"📂 Sources: {', '.join(self.sources) or 'none'}")
+
+# =============================================================================
+# WATERMARKS
+# =============================================================================
+
+    def _load_watermarks(self) -> Dict[str, Dict[str, Any]]:
+        """Load per-file watermarks ({'dev:inode': {path, offset, header}})"""
+        try:
+            with open(self.watermark_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('files', {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"⚠️ Could not read watermarks ({e}), starting from the beginning")
+            return {}
+
+    def _save_watermarks(self, live_keys: set):
+        """Persist watermarks atomically, dropping files that no longer exist"""
+        self.watermarks = {key: value for key, value in self.watermarks.items() if key in live_keys}
+        tmp_path = f"{self.watermark_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'updated_at': int(time.time()), 'files': self.watermarks}, f, separators=(',', ':'))
+        os.replace(tmp_path, self.watermark_path)
+
+# =============================================================================
+# READING & NORMALIZATION
+# =============================================================================
+
+    def _read_new_rows(self, path: str, watermark: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Read complete rows appended after the watermark offset and advance it"""
+        offset = watermark.get('offset', 0)
+        size = os.path.getsize(path)
+        if size < offset:
+            # File was truncated or replaced in place; dedup makes a re-read safe
+            self.logger.warning(f"⚠️ {path} shrank below its watermark, re-reading it")
+            offset = 0
+            watermark.pop('header', None)
+        if size == offset:
+            return []
+
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(size - offset)
+
+        # Only consume complete lines; a partially flushed row is read next run
+        end = data.rfind(b'\n')
+        if end < 0:
+            return []
+        data = data[:end + 1]
+
+        reader = csv.reader(io.StringIO(data.decode('utf-8'), newline=''))
+        if offset == 0 or 'header' not in watermark:
+            if offset != 0:
+                with open(path, 'r', newline='', encoding='utf-8') as f:
+                    watermark['header'] = next(csv.reader(f), [])
+            else:
+                watermark['header'] = next(reader, [])
+        header = watermark['header']
+
+        rows = [dict(zip(header, values, strict=True)) for values in reader if values]
+        watermark['offset'] = offset + len(data)
+        return rows
+
+    def _normalize(self, protocol: str, row: Dict[str, str]) -> Dict[str, Any]:
+        """Map a protocol row onto the unified schema"""
+        aliases = COLUMN_ALIASES.get(protocol, {})
+        normalized = {aliases.get(column, column): value for column, value in row.items()}
+        normalized['protocol'] = protocol
+        normalized['timestamp'] = _normalize_timestamp(normalized.get('timestamp'))
+        return normalized
+
+# =============================================================================
+# MAIN CONSOLIDATION
+# =============================================================================
+
+    def run(self) -> int:
+        """Consolidate rows appended since the last run, returning rows written"""
+        total_written = 0
+        live_keys = set()
+
+        for protocol, active_path in self.sources.items():
+            for path in rotated_paths(active_path):
+                stat = os.stat(path)
+                file_key = f"{stat.st_dev}:{stat.st_ino}"
+                live_keys.add(file_key)
+                watermark = self.watermarks.setdefault(file_key, {'offset': 0})
+                watermark['path'] = path
+
+                rows = self._read_new_rows(path, watermark)
+                if not rows:
+                    continue
+
+                normalized = [self._normalize(protocol, row) for row in rows]
+                new_rows = self.dedup_index.filter_new(normalized)
+                self.sink.write_rows(new_rows)
+                total_written += len(new_rows)
+                self.logger.info(f"📥 {protocol}: {len(rows)} new rows in {os.path.basename(path)}, "
+                                 f"{len(new_rows)} consolidated")
+
+        # Rows first, then dedup keys, then the watermarks that skip them
+        self.sink.checkpoint()
+        self.dedup_index.commit()
+        self._save_watermarks(live_keys)
+
+        self.logger.info(f"🎯 Consolidation completed. Rows written: {total_written}")
+        return total_written
+
+    def close(self):
+        """Release the sink and dedup index"""
+        self.sink.close()
+        self.dedup_index.close()
+
+# =============================================================================
+# MAIN EXECUTION
+# =============================================================================
+
+def main():
+    """Main function to run the consolidator"""
+    try:
+        consolidator = CSVConsolidator()
+        total_written = consolidator.run()
+        consolidator.close()
+
+        print("\n✅ Consolidation completed successfully!")
+        print(f"   Rows written: {total_written}")
+
+    except Exception as e:
+        logging.error(f"❌ Error running consolidator: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
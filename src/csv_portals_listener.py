@@ -47,6 +47,13 @@ from config_loader import (
     get_event_signature,
     get_threshold
 )
+from csv_sink import CSVSink
+from csv_stats import RunningStats
+from dedup_index import DedupIndex
+from token_enrichment import ChunkTokenEnricher, transfer_logs
+from pool_oracle import PoolPriceOracle
+from price_history import PriceHistory
+from valuation import ValuationEngine, transfer_amount
 
 # =============================================================================
 # CONFIGURATION & SETUP
@@ -98,6 +105,11 @@ class CSVPortalsListener:
         self.web3_connections = {}
         self._initialize_web3_connections()
         
+        # Token symbols/decimals are prefetched once per chunk, not per row
+        self.token_enricher = ChunkTokenEnricher()
+        self.valuation = ValuationEngine(PriceHistory(**self.config.get_price_history_config()),
+                                         oracle=PoolPriceOracle())
+        
         # Initialize CSV structure
         self._init_csv_structure()
         
@@ -146,21 +158,35 @@ class CSVPortalsListener:
         os.makedirs(self.transactions_dir, exist_ok=True)
         os.makedirs(self.block_tracking_dir, exist_ok=True)
         
-        # Initialize transactions CSV
+        # Open the long-lived transactions sink (writes the header for new files)
         transactions_path = os.path.join(self.transactions_dir, 'portals_transactions.csv')
-        if not os.path.exists(transactions_path):
-            headers = [
-                'tx_hash', 'chain', 'block_number', 'timestamp', 'from_address',
-                'to_address', 'affiliate_address', 'affiliate_fee_amount',
-                'affiliate_fee_token', 'affiliate_fee_usd', 'volume_amount',
-                'volume_token', 'volume_usd', 'gas_used', 'gas_price',
-                'bridge_type', 'source_chain', 'destination_chain', 'created_at'
-            ]
-            with open(transactions_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
+        is_new = not os.path.exists(transactions_path)
+        self.transaction_headers = [
+            'tx_hash', 'chain', 'block_number', 'timestamp', 'from_address',
+            'to_address', 'affiliate_address', 'affiliate_fee_amount',
+            'affiliate_fee_token', 'affiliate_fee_usd', 'volume_amount',
+            'volume_token', 'volume_usd', 'gas_used', 'gas_price',
+            'bridge_type', 'source_chain', 'destination_chain',
+            'volume_token_symbol', 'volume_token_decimals',
+            'affiliate_fee_token_symbol', 'affiliate_fee_token_decimals',
+            'log_index', 'created_at'
+        ]
+        self.transactions_sink = CSVSink(transactions_path, self.transaction_headers,
+                                         **self.config.get_csv_sink_config())
+        if is_new:
             self.logger.info(f"✅ Created Portals transactions CSV: {transactions_path}")
         
+        # Running aggregates persisted next to the CSV (rebuilt if missing or stale)
+        self.transactions_stats = RunningStats(transactions_path)
+        self.transactions_stats.load()
+        
+        # Keys of rows already written, consulted before every write; seeded
+        # from the existing CSVs the first time the index is created
+        self.dedup_index = DedupIndex(os.path.splitext(transactions_path)[0] + '.dedup.sqlite',
+                                      **self.config.get_dedup_config())
+        if self.dedup_index.is_new:
+            self.dedup_index.seed_from_csv(self.transactions_sink.all_paths())
+        
         # Initialize block tracker CSV
         block_tracker_path = os.path.join(self.block_tracking_dir, 'portals_block_tracker.csv')
         if not os.path.exists(block_tracker_path):
@@ -239,13 +265,26 @@ class CSVPortalsListener:
         if not transactions:
             return
         
-        transactions_path = os.path.join(self.transactions_dir, 'portals_transactions.csv')
+        # Skip rows already written by an earlier (possibly overlapping) run
+        new_transactions = self.dedup_index.filter_new(transactions)
+        skipped = len(transactions) - len(new_transactions)
+        if skipped:
+            self.logger.info(f"⏭️ Skipped {skipped} already-saved Portals transactions")
+        transactions = new_transactions
+        if not transactions:
+            return
         
-        with open(transactions_path, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=transactions[0].keys())
-            writer.writerows(transactions)
+        # Rows are buffered by the sink and made durable at the next checkpoint
+        self.transactions_sink.write_rows(transactions)
+        self.transactions_stats.update(transactions)
         
         self.logger.info(f"✅ Saved {len(transactions)} Portals transactions to CSV")
+    
+    def _checkpoint_storage(self):
+        """Make written rows durable, then persist the dedup keys and aggregates describing them"""
+        self.transactions_sink.checkpoint()
+        self.dedup_index.commit()
+        self.transactions_stats.save()
 
 # =============================================================================
 # TRANSACTION PROCESSING & DETECTION
@@ -318,6 +357,11 @@ class CSVPortalsListener:
                 except Exception as e:
                     self.logger.error(f"❌ Error parsing log {i+1} on {chain_name}: {e}")
                     continue
+            
+            # Resolve every token seen in this chunk in one round trip
+            if transactions:
+                self.token_enricher.annotate(connection['config']['chain_id'], w3, transactions)
+                self.valuation.value_rows(transactions, connection['config']['chain_id'], w3)
                     
         except Exception as e:
             self.logger.error(f"❌ Error processing {chain_name}: {e}")
@@ -349,6 +393,7 @@ class CSVPortalsListener:
                 'tx_hash': tx_hash,
                 'chain': chain_name,
                 'block_number': block_number,
+                'log_index': log.get('logIndex', ''),
                 'timestamp': block['timestamp'],
                 'from_address': tx['from'],
                 'to_address': tx['to'],
@@ -369,6 +414,7 @@ class CSVPortalsListener:
             
             # Extract volume and fee information
             self._extract_volume_and_fees(w3, receipt, transaction)
+            self.token_enricher.collect(self.web3_connections[chain_name]['config']['chain_id'], receipt)
             
             return transaction
             
@@ -494,25 +540,19 @@ class CSVPortalsListener:
     def _extract_volume_and_fees(self, w3: Web3, receipt: Dict, transaction: Dict):
         """Extract volume and fee information from transaction receipt"""
         try:
-            # Look for transfer events to calculate volume
-            transfer_topic = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
-            
-            total_volume = 0
-            for log_entry in receipt['logs']:
-                if log_entry['topics'] and log_entry['topics'][0].hex() == transfer_topic:
-                    if len(log_entry['data']) >= 32:
-                        amount_hex = log_entry['data'].hex()
-                        amount = int(amount_hex, 16)
-                        # Rough USD estimation (would need price feeds for accuracy)
-                        estimated_usd = amount / (10 ** 18) * 50  # Placeholder
-                        total_volume += estimated_usd
-            
-            transaction['volume_amount'] = str(total_volume)
-            transaction['volume_usd'] = str(total_volume)
-            
-            # For now, set affiliate fee to 0 (would need specific Portals logic)
-            transaction['affiliate_fee_amount'] = '0'
-            transaction['affiliate_fee_usd'] = '0'
+            # The first Transfer is the input leg, a Transfer to a ShapeShift
+            # affiliate carries the fee. Amounts stay exact raw integers; USD is
+            # filled in per chunk by the valuation engine once decimals are known.
+            transfers = transfer_logs(receipt)
+            if transfers:
+                transaction['volume_token'] = transfers[0]['address']
+                transaction['volume_amount'] = str(transfer_amount(transfers[0]))
+            affiliates = {a.lower().replace('0x', '') for a in self.shapeshift_affiliates}
+            for log_entry in transfers:
+                if log_entry['topics'][2].hex().lower()[-40:] in affiliates:
+                    transaction['affiliate_fee_token'] = log_entry['address']
+                    transaction['affiliate_fee_amount'] = str(transfer_amount(log_entry))
+                    break
             
         except Exception as e:
             self.logger.error(f"❌ Error extracting volume and fees: {e}")
@@ -582,8 +622,10 @@ class CSVPortalsListener:
                         self.save_transactions_to_csv(transactions)
                         total_transactions += len(transactions)
                     
-                    # Update block tracker (only if not using override)
+                    # Update block tracker (only if not using override), making the
+                    # chunk durable before the tracker moves past it
                     if start_block_override is None:
+                        self._checkpoint_storage()
                         self.update_block_tracker(chain_name, chunk_end)
                     
                     # Rate limiting
@@ -595,6 +637,7 @@ class CSVPortalsListener:
                 self.logger.error(f"❌ Error processing {chain_name}: {e}")
                 continue
         
+        self._checkpoint_storage()
         self.logger.info(f"🎯 Portals listener completed. Total transactions: {total_transactions}")
         return total_transactions
 
@@ -603,40 +646,16 @@ class CSVPortalsListener:
 # =============================================================================
 
     def get_csv_stats(self) -> Dict[str, Any]:
-        """Get statistics about the CSV data"""
-        transactions_path = os.path.join(self.transactions_dir, 'portals_transactions.csv')
-        
-        if not os.path.exists(transactions_path):
-            return {'total_transactions': 0, 'chains': {}, 'affiliate_addresses': {}}
-        
-        try:
-            with open(transactions_path, 'r', newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-            
-            stats = {
-                'total_transactions': len(rows),
-                'chains': {},
-                'affiliate_addresses': {}
-            }
-            
-            for row in rows:
-                chain = row.get('chain', 'unknown')
-                affiliate = row.get('affiliate_address', 'unknown')
-                
-                if chain not in stats['chains']:
-                    stats['chains'][chain] = 0
-                stats['chains'][chain] += 1
-                
-                if affiliate not in stats['affiliate_addresses']:
-                    stats['affiliate_addresses'][affiliate] = 0
-                stats['affiliate_addresses'][affiliate] += 1
-            
-            return stats
-            
-        except Exception as e:
-            self.logger.error(f"❌ Error getting CSV stats: {e}")
-            return {'total_transactions': 0, 'chains': {}, 'affiliate_addresses': {}}
+        """Get statistics about the CSV data from the running aggregates"""
+        stats = self.transactions_stats
+        return {
+            'total_transactions': stats.total_transactions,
+            'chains': stats.counts('chains'),
+            'affiliate_addresses': stats.counts('affiliate_addresses'),
+            'days': stats.totals('days'),
+            'volume_usd': stats.volume_usd,
+            'affiliate_fee_usd': stats.affiliate_fee_usd
+        }
 
 # =============================================================================
 # MAIN EXECUTION
@@ -13,10 +13,11 @@ Key Features:
 - Dual detection: affiliate name "ss" + address thor122h9hlrugzdny9ct95z6g7afvpzu34s73uklju
 - Cross-chain liquidity pool transaction support
 
-Enhanced Affiliate Detection (Commented Out):
-- Memo pattern detection using :ss: suffix (e.g., :ss:55, :ss:0)
-- Asset-specific patterns: =:b: (Bitcoin), =:r: (RUNE), =:THOR.TCY: (THORChain)
-- Based on discoveries from blocks 22,456,113 and 22,470,673
+Affiliate Detection:
+- Memos (SWAP:ASSET:DEST:LIMIT:AFFILIATE:FEE) are parsed once per Midgard page
+  (shared/thorchain_memo.py); '/'-separated affiliate and fee lists are supported
+- The affiliate field is matched exactly, then metadata.swap.affiliateAddress
+- ShapeShift's fee is amount * bps / 10000 of the inbound asset, valued in USD
 
 Author: ShapeShift Affiliate Tracker Team
 Version: v6.0 - Clean Centralized CSV
@@ -28,32 +29,37 @@ import sys
 import time
 import logging
 import csv
-import requests
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 
 # Add shared directory to path for centralized config
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
 
 # Import centralized configuration
-from config_loader import (
-    get_config,
-    get_storage_path,
-    get_listener_config,
-    get_threshold
-)
+from config_loader import get_config
+from csv_sink import CSVSink
+from csv_stats import RunningStats
+from dedup_index import DedupIndex
+from price_history import PriceHistory
+from thorchain_memo import Memo, action_memo, affiliate_fee, parse_memo, parse_page
+from http_cache import HTTPCache
+from thorchain_sync import MidgardClient, ThorchainSync, probe_server_filter, swap_affiliates
+from token_registry import get_registry
+from webscrape_index import parse_thorchain_asset
 
 # =============================================================================
 # CONFIGURATION & SETUP
 # =============================================================================
 
+# last_processed_offset is kept for trackers written before height cursors
+TRACKER_HEADERS = ['last_processed_offset', 'last_processed_date', 'total_swaps_processed',
+                   'last_processed_height']
+
 class CSVThorChainListener:
     """CSV-based listener for THORChain swaps with ShapeShift affiliate fees
     
-    Note: Enhanced affiliate detection logic using memo patterns (:ss:) has been
-    discovered and documented but is currently commented out. See the 
-    _is_shapeshift_affiliate_swap method for details on the enhanced detection
-    patterns found in blocks 22,456,113 and 22,470,673.
+    Affiliate swaps are selected by Midgard itself when it supports the
+    affiliate/address query filters (filter_mode: auto|server|client), and
+    matched exactly on the memo's affiliate field otherwise.
     """
     
     def __init__(self):
@@ -70,6 +76,7 @@ class CSVThorChainListener:
         # Get ShapeShift affiliate information for THORChain
         self.shapeshift_affiliate_address = thorchain_config.get('affiliate_address', 'thor122h9hlrugzdny9ct95z6g7afvpzu34s73uklju')
         self.shapeshift_affiliate_name = thorchain_config.get('affiliate_name', 'ss')
+        self.affiliate_ids = {self.shapeshift_affiliate_name.lower(), self.shapeshift_affiliate_address.lower()}
         
         # Get storage paths
         self.csv_dir = self.config.get_storage_path('csv_directory')
@@ -79,11 +86,30 @@ class CSVThorChainListener:
         # Get listener configuration
         self.listener_config = self.config.get_listener_config('thorchain')
         self.api_rate_limit = self.listener_config.get('api_rate_limit', 1.0)
-        self.max_swaps_per_request = self.listener_config.get('max_swaps_per_request', 100)
+        self.max_swaps_per_request = self.listener_config.get('max_swaps_per_request', 50)
+        self.start_height = int(self.listener_config.get('start_height', 0))
+        
+        self.stable_confirmations = int(self.listener_config.get('stable_confirmations', 100))
+        
+        # Midgard is paged by height windows and nextPageToken cursors, never offsets;
+        # responses are revalidated with ETags and settled windows are cached on disk
+        self.http_cache = HTTPCache(**self.config.get_http_cache_config())
+        self.midgard = MidgardClient(self.midgard_api, rate_limit=self.api_rate_limit,
+                                     page_limit=self.max_swaps_per_request, cache=self.http_cache)
+        self.sync_engine = ThorchainSync(self.midgard,
+                                         window_blocks=self.listener_config.get('backfill_window_blocks', 50000),
+                                         workers=self.listener_config.get('backfill_workers', 4))
+        
+        # Affiliate filtering: auto (probe Midgard), server or client
+        self.filter_mode = str(self.listener_config.get('filter_mode', 'auto')).lower()
+        self.server_filters: Optional[Dict[str, str]] = None
         
         # Get thresholds
         self.min_volume_usd = self.config.get_threshold('minimum_volume_usd')
         
+        # Hourly USD prices, prefetched per page and read at each swap's timestamp
+        self.price_history = PriceHistory(**self.config.get_price_history_config())
+        
         # Initialize CSV structure
         self._init_csv_structure()
         
@@ -98,37 +124,47 @@ class CSVThorChainListener:
         os.makedirs(self.transactions_dir, exist_ok=True)
         os.makedirs(self.block_tracking_dir, exist_ok=True)
         
-        # Initialize transactions CSV
+        # Open the long-lived transactions sink (writes the header for new files)
         transactions_path = os.path.join(self.transactions_dir, 'thorchain_transactions.csv')
-        if not os.path.exists(transactions_path):
-            headers = [
-                'tx_hash', 'chain', 'block_number', 'timestamp', 'from_address',
-                'to_address', 'affiliate_address', 'affiliate_fee_amount',
-                'affiliate_fee_token', 'affiliate_fee_usd', 'volume_amount',
-                'volume_token', 'volume_usd', 'gas_used', 'gas_price',
-                'pool', 'from_asset', 'to_asset', 'from_amount', 'to_amount',
-                'affiliate_fee_asset', 'affiliate_fee_amount_asset', 'created_at'
-            ]
-            with open(transactions_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
+        is_new = not os.path.exists(transactions_path)
+        self.transaction_headers = [
+            'tx_hash', 'chain', 'block_number', 'timestamp', 'from_address',
+            'to_address', 'affiliate_address', 'affiliate_fee_amount',
+            'affiliate_fee_token', 'affiliate_fee_usd', 'volume_amount',
+            'volume_token', 'volume_usd', 'gas_used', 'gas_price',
+            'pool', 'from_asset', 'to_asset', 'from_amount', 'to_amount',
+            'affiliate_fee_asset', 'affiliate_fee_amount_asset', 'created_at'
+        ]
+        self.transactions_sink = CSVSink(transactions_path, self.transaction_headers,
+                                         **self.config.get_csv_sink_config())
+        if is_new:
             self.logger.info(f"✅ Created THORChain transactions CSV: {transactions_path}")
         
-        # Initialize block tracker CSV (for API pagination tracking)
+        # Running aggregates persisted next to the CSV (rebuilt if missing or stale)
+        self.transactions_stats = RunningStats(transactions_path, {'pools': 'pool', 'affiliate_addresses': 'affiliate_address'})
+        self.transactions_stats.load()
+        
+        # Keys of rows already written, consulted before every write; seeded
+        # from the existing CSVs the first time the index is created
+        self.dedup_index = DedupIndex(os.path.splitext(transactions_path)[0] + '.dedup.sqlite',
+                                      **self.config.get_dedup_config())
+        if self.dedup_index.is_new:
+            self.dedup_index.seed_from_csv(self.transactions_sink.all_paths())
+        
+        # Initialize block tracker CSV (THORChain height the sync has reached)
         block_tracker_path = os.path.join(self.block_tracking_dir, 'thorchain_block_tracker.csv')
         if not os.path.exists(block_tracker_path):
-            headers = ['last_processed_offset', 'last_processed_date', 'total_swaps_processed']
             with open(block_tracker_path, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
-                writer.writerow(headers)
+                writer.writerow(TRACKER_HEADERS)
             self.logger.info(f"✅ Created THORChain block tracker CSV: {block_tracker_path}")
 
 # =============================================================================
 # CSV MANAGEMENT & TRACKING
 # =============================================================================
 
-    def get_last_processed_offset(self) -> int:
-        """Get the last processed offset for API pagination"""
+    def get_last_processed_height(self) -> int:
+        """Get the last THORChain height whose actions are durably processed"""
         block_tracker_path = os.path.join(self.block_tracking_dir, 'thorchain_block_tracker.csv')
         
         if not os.path.exists(block_tracker_path):
@@ -138,14 +174,14 @@ class CSVThorChainListener:
             with open(block_tracker_path, 'r', newline='', encoding='utf-8') as f:
                 reader = csv.DictReader(f)
                 for row in reader:
-                    return int(row.get('last_processed_offset', 0))
+                    return int(row.get('last_processed_height') or 0)
         except Exception as e:
             self.logger.error(f"❌ Error reading block tracker: {e}")
         
         return 0
     
-    def update_block_tracker(self, offset: int):
-        """Update the block tracker with the latest processed offset"""
+    def update_block_tracker(self, height: int, swaps_processed: int):
+        """Update the block tracker with the latest processed height"""
         block_tracker_path = os.path.join(self.block_tracking_dir, 'thorchain_block_tracker.csv')
         
         # Read existing data
@@ -159,197 +195,217 @@ class CSVThorChainListener:
         
         # Update or add entry
         if rows:
-            rows[0]['last_processed_offset'] = str(offset)
-            rows[0]['last_processed_date'] = str(int(time.time()))
-            rows[0]['total_swaps_processed'] = str(int(rows[0].get('total_swaps_processed', 0)) + 1)
+            row = {header: rows[0].get(header) or '0' for header in TRACKER_HEADERS}
+            row['total_swaps_processed'] = str(int(row['total_swaps_processed']) + swaps_processed)
         else:
-            rows.append({
-                'last_processed_offset': str(offset),
-                'last_processed_date': str(int(time.time())),
-                'total_swaps_processed': '1'
-            })
+            row = {'last_processed_offset': '0', 'total_swaps_processed': str(swaps_processed)}
+        row['last_processed_height'] = str(height)
+        row['last_processed_date'] = str(int(time.time()))
         
         # Write updated data
-        headers = ['last_processed_offset', 'last_processed_date', 'total_swaps_processed']
-        with open(block_tracker_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
+        tmp_path = block_tracker_path + '.tmp'
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=TRACKER_HEADERS)
             writer.writeheader()
-            writer.writerows(rows)
+            writer.writerow(row)
+        os.replace(tmp_path, block_tracker_path)
     
     def save_transactions_to_csv(self, transactions: List[Dict[str, Any]]):
         """Save THORChain transactions to CSV file"""
         if not transactions:
             return
         
-        transactions_path = os.path.join(self.transactions_dir, 'thorchain_transactions.csv')
+        # Skip rows already written by an earlier (possibly overlapping) run
+        new_transactions = self.dedup_index.filter_new(transactions)
+        skipped = len(transactions) - len(new_transactions)
+        if skipped:
+            self.logger.info(f"⏭️ Skipped {skipped} already-saved THORChain transactions")
+        transactions = new_transactions
+        if not transactions:
+            return
         
-        with open(transactions_path, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=transactions[0].keys())
-            writer.writerows(transactions)
+        # Rows are buffered by the sink and made durable at the next checkpoint
+        self.transactions_sink.write_rows(transactions)
+        self.transactions_stats.update(transactions)
         
         self.logger.info(f"✅ Saved {len(transactions)} THORChain transactions to CSV")
+    
+    def _checkpoint_storage(self):
+        """Make written rows durable, then persist the dedup keys and aggregates describing them"""
+        self.transactions_sink.checkpoint()
+        self.dedup_index.commit()
+        self.transactions_stats.save()
 
 # =============================================================================
 # THORCHAIN API INTEGRATION
 # =============================================================================
 
-    def fetch_thorchain_swaps(self, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        """Fetch THORChain swaps from Midgard API"""
-        try:
-            url = f"{self.midgard_api}/actions"
-            params = {
-                'offset': offset,
-                'limit': limit,
-                'type': 'swap'  # Only fetch swap actions
-            }
-            
-            self.logger.info(f"📡 Fetching THORChain swaps: offset={offset}, limit={limit}")
-            
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            actions = data.get('actions', [])
-            
-            self.logger.info(f"✅ Fetched {len(actions)} THORChain swap actions")
-            return actions
-            
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"❌ Error fetching THORChain swaps: {e}")
-            return []
-        except Exception as e:
-            self.logger.error(f"❌ Unexpected error fetching THORChain swaps: {e}")
-            return []
-    
     def filter_shapeshift_affiliate_swaps(self, swaps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Filter swaps to only include ShapeShift affiliate transactions"""
-        affiliate_swaps = []
-        
-        for swap in swaps:
+        return [swap for swap, _ in self.match_affiliate_swaps(swaps)]
+    
+    def match_affiliate_swaps(self, swaps: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], int]]:
+        """(swap, affiliate fee bps) for every ShapeShift swap in a page; memos are parsed once per page"""
+        matched = []
+        for swap, memo in zip(swaps, parse_page(swaps), strict=True):
             try:
-                # Check if this swap involves ShapeShift affiliate
-                if self._is_shapeshift_affiliate_swap(swap):
-                    affiliate_swaps.append(swap)
-                    
+                bps = self._affiliate_bps(swap, memo)
+                if bps is not None:
+                    matched.append((swap, bps))
             except Exception as e:
                 self.logger.warning(f"⚠️ Error processing swap: {e}")
                 continue
         
-        self.logger.info(f"🎯 Found {len(affiliate_swaps)} ShapeShift affiliate swaps out of {len(swaps)} total")
-        return affiliate_swaps
+        self.logger.info(f"🎯 Found {len(matched)} ShapeShift affiliate swaps out of {len(swaps)} total")
+        return matched
+    
+    def _affiliate_bps(self, swap: Dict[str, Any], memo: Optional[Memo]) -> Optional[int]:
+        """ShapeShift's fee (bps) on a swap, or None if ShapeShift is not an affiliate.
+        
+        Uses the memo's affiliate field (SWAP:ASSET:DEST:LIMIT:AFFILIATE:FEE),
+        then the affiliate Midgard records in metadata.swap, matching the
+        configured name and address exactly.
+        """
+        if memo is not None:
+            bps = memo.affiliate_bps(self.affiliate_ids)
+            if bps is not None:
+                return bps
+        
+        affiliates = swap_affiliates(swap)
+        fees = str(((swap.get('metadata') or {}).get('swap') or {}).get('affiliateFee') or '').split('/')
+        for index, affiliate in enumerate(affiliates):
+            if affiliate in self.affiliate_ids:
+                fee = fees[index] if index < len(fees) else fees[-1]
+                return int(fee) if fee.strip().isdigit() else 0
+        return None
     
     def _is_shapeshift_affiliate_swap(self, swap: Dict[str, Any]) -> bool:
-        """Check if a swap involves ShapeShift affiliate"""
+        """Check if a swap names ShapeShift as an affiliate"""
         try:
-            # Check for affiliate name "ss" in the swap data
-            swap_data = swap.get('in', {})
-            if isinstance(swap_data, dict):
-                # Look for affiliate information in swap metadata
-                memo = swap_data.get('memo', '')
-                if self.shapeshift_affiliate_name.lower() in memo.lower():
-                    return True
-                
-                # Check for affiliate address in memo or other fields
-                if self.shapeshift_affiliate_address.lower() in memo.lower():
-                    return True
-            
-            # Check out data as well
-            swap_data = swap.get('out', {})
-            if isinstance(swap_data, dict):
-                memo = swap_data.get('memo', '')
-                if self.shapeshift_affiliate_name.lower() in memo.lower():
-                    return True
-                if self.shapeshift_affiliate_address.lower() in memo.lower():
-                    return True
-            
-            # Check additional fields that might contain affiliate info
-            for field in ['memo', 'affiliate', 'referrer', 'partner']:
-                if field in swap and self.shapeshift_affiliate_name.lower() in str(swap[field]).lower():
-                    return True
-                if field in swap and self.shapeshift_affiliate_address.lower() in str(swap[field]).lower():
-                    return True
-            
-            # =============================================================================
-            # ENHANCED SHAPESHIFT AFFILIATE DETECTION LOGIC (COMMENTED OUT)
-            # =============================================================================
-            # Based on discoveries from blocks 22,456,113 and 22,470,673
-            # This logic provides more accurate affiliate detection using memo patterns
-            
-            # # Check for ShapeShift affiliate memo patterns in swap metadata
-            # swap_metadata = swap.get('metadata', {}).get('swap', {})
-            # if swap_metadata:
-            #     # Check memo field for ShapeShift affiliate pattern (:ss:)
-            #     memo = swap_metadata.get('memo', '')
-            #     if memo and ':ss:' in memo.lower():
-            #         self.logger.info(f"🎯 Found ShapeShift affiliate transaction with :ss: pattern: {memo}")
-            #         return True
-            #     
-            #     # Check affiliate address in swap metadata
-            #     affiliate_address = swap_metadata.get('affiliateAddress', '')
-            #     if affiliate_address and self.shapeshift_affiliate_address in affiliate_address:
-            #         self.logger.info(f"🎯 Found ShapeShift affiliate transaction with address: {affiliate_address}")
-            #         return True
-            #     
-            #     # Check for specific memo patterns we discovered:
-            #     # =:b:...:ss:55 (Bitcoin transactions with 55 basis points)
-            #     # =:r:...:ss:55 (RUNE transactions with 55 basis points)  
-            #     # =:THOR.TCY:...:ss:0 (THORChain TCY transactions with 0 basis points)
-            #     if memo:
-            #         memo_parts = memo.split(':')
-            #         if len(memo_parts) >= 4:
-            #             # Check if memo ends with :ss: pattern
-            #             if memo_parts[-2] == 'ss':
-            #                 basis_points = memo_parts[-1]
-            #                 self.logger.info(f"🎯 Found ShapeShift affiliate transaction with :ss:{basis_points} pattern")
-            #                 return True
-            #             
-            #             # Check for specific asset patterns
-            #             if memo_parts[1] in ['b', 'r'] and 'ss' in memo_parts:
-            #                 self.logger.info(f"🎯 Found ShapeShift affiliate transaction with asset pattern: {memo_parts[1]}")
-            #                 return True
-            
-            # # Alternative approach: Check if any field contains the :ss: pattern
-            # for key, value in swap.items():
-            #     if isinstance(value, str) and ':ss:' in value.lower():
-            #         self.logger.info(f"🎯 Found ShapeShift affiliate transaction with :ss: in field {key}: {value}")
-            #         return True
-            
-            # =============================================================================
-            # END ENHANCED LOGIC
-            # =============================================================================
-            
-            return False
-            
+            return self._affiliate_bps(swap, parse_memo(action_memo(swap))) is not None
         except Exception as e:
             self.logger.warning(f"⚠️ Error checking affiliate involvement: {e}")
             return False
 
+    def resolve_swap_filters(self) -> Dict[str, str]:
+        """Midgard query filters for the configured filter_mode.
+        
+        'server' always sends the affiliate filter, 'client' never does, and
+        'auto' probes Midgard once and falls back to client-side filtering
+        when the affiliate/address parameters are rejected or ignored.
+        """
+        if self.server_filters is not None:
+            return self.server_filters
+        
+        affiliates = [self.shapeshift_affiliate_name, self.shapeshift_affiliate_address]
+        if self.filter_mode == 'client':
+            self.server_filters = {}
+        elif self.filter_mode == 'server':
+            self.server_filters = {'affiliate': ','.join(affiliates)}
+        else:
+            probed = probe_server_filter(self.midgard, affiliates, self.shapeshift_affiliate_address)
+            if probed is None:
+                self.logger.warning("⚠️ Midgard cannot filter by affiliate, falling back to client-side filtering")
+            self.server_filters = probed or {}
+        
+        mode = 'server' if self.server_filters else 'client'
+        self.logger.info(f"🎯 Affiliate filtering: {mode}-side ({self.filter_mode} mode)")
+        return self.server_filters
+
 # =============================================================================
 # TRANSACTION PROCESSING & CONVERSION
 # =============================================================================
 
-    def convert_swap_to_transaction(self, swap: Dict[str, Any]) -> Dict[str, Any]:
-        """Convert a THORChain swap to our transaction format"""
+    def _swap_tx_id(self, swap: Dict[str, Any]) -> str:
+        """Get the inbound transaction ID of a Midgard action (also the dedup key)"""
+        if swap.get('txID'):
+            return swap['txID']
+        
+        # Midgard returns 'in' as a list of {address, coins, txID}
+        in_entries = swap.get('in', [])
+        if isinstance(in_entries, dict):
+            in_entries = [in_entries]
+        for entry in in_entries:
+            if isinstance(entry, dict) and entry.get('txID'):
+                return entry['txID']
+        
+        return '0x0000000000000000000000000000000000000000000000000000000000000000'
+    
+    @staticmethod
+    def _first_entry(entries: Any) -> Dict[str, Any]:
+        """First {address, coins, txID} entry of a Midgard 'in'/'out' field"""
+        if isinstance(entries, dict):
+            return entries
+        if isinstance(entries, list) and entries and isinstance(entries[0], dict):
+            return entries[0]
+        return {}
+    
+    @staticmethod
+    def _asset_symbol(asset: str) -> str:
+        """Price symbol of a THORChain asset (BTC.BTC -> BTC, ETH.USDC-0XA0B8... -> USDC, BTC/BTC -> BTC)"""
+        entry = get_registry().by_thor_asset(asset)
+        if entry is not None:
+            return entry['symbol']
+        parsed = parse_thorchain_asset(asset)
+        return parsed[0] if parsed else asset.upper()
+    
+    def prefetch_prices(self, swaps: List[Dict[str, Any]]):
+        """Fetch hourly prices for every inbound asset over the page's time span in one pass"""
+        symbols = set()
+        dates = []
+        for swap in swaps:
+            coins = self._first_entry(swap.get('in')).get('coins') or [{}]
+            if coins[0].get('asset'):
+                symbols.add(self._asset_symbol(coins[0]['asset']))
+            if swap.get('date'):
+                dates.append(int(swap['date']))
+        if symbols and dates:
+            self.price_history.prefetch(symbols, min(dates), max(dates))
+    
+    def convert_swap_to_transaction(self, swap: Dict[str, Any], fee_bps: Optional[int] = None) -> Dict[str, Any]:
+        """Convert a THORChain swap to our transaction format.
+        
+        fee_bps is ShapeShift's affiliate fee from the memo; it is parsed from
+        the swap when not given.
+        """
         try:
+            if fee_bps is None:
+                fee_bps = self._affiliate_bps(swap, parse_memo(action_memo(swap))) or 0
+            
             # Extract basic swap information
-            tx_hash = swap.get('txID', '0x0000000000000000000000000000000000000000000000000000000000000000')
+            tx_hash = self._swap_tx_id(swap)
             timestamp = swap.get('date', int(time.time()))
             
-            # Extract in/out information
-            in_data = swap.get('in', {})
-            out_data = swap.get('out', {})
+            # Extract in/out information (Midgard returns lists of {address, coins, txID})
+            in_data = self._first_entry(swap.get('in'))
+            out_data = self._first_entry(swap.get('out'))
+            in_coin = (in_data.get('coins') or [{}])[0]
+            out_coin = (out_data.get('coins') or [{}])[0]
             
             # Calculate volume (use in amount as primary volume indicator)
-            volume_amount = 0
-            volume_token = '0x0000000000000000000000000000000000000000'
+            volume_amount = in_coin.get('amount', '0')
+            volume_token = in_coin.get('asset', '0x0000000000000000000000000000000000000000')
             volume_usd = 0
             
-            if isinstance(in_data, dict):
-                volume_amount = in_data.get('amount', '0')
-                volume_token = in_data.get('coins', [{}])[0].get('asset', '0x0000000000000000000000000000000000000000') if in_data.get('coins') else '0x0000000000000000000000000000000000000000'
-                # Convert to USD (simplified - would need price feeds for accuracy)
+            # The affiliate fee is taken in the inbound asset: amount * bps / 10000
+            try:
+                fee_amount = affiliate_fee(int(volume_amount), fee_bps)
+            except (ValueError, TypeError):
+                fee_amount = 0
+            fee_usd = 0
+            
+            # Midgard amounts are 1e8 base units for every asset; value at the swap's hour.
+            # Prices were prefetched for the whole page, so rows only read the store.
+            if in_coin.get('asset'):
                 try:
-                    volume_usd = float(volume_amount) / (10 ** 8) * 50  # Rough estimate
+                    symbol = self._asset_symbol(in_coin['asset'])
+                    value = self.price_history.value_usd(symbol, int(volume_amount) / 10 ** 8, timestamp,
+                                                         fetch=False)
+                    volume_usd = value if value is not None else 0
+                    if fee_amount:
+                        value = self.price_history.value_usd(symbol, fee_amount / 10 ** 8, timestamp,
+                                                             fetch=False)
+                        fee_usd = value if value is not None else 0
                 except (ValueError, TypeError):
                     volume_usd = 0
             
@@ -359,24 +415,24 @@ class CSVThorChainListener:
                 'chain': 'thorchain',
                 'block_number': swap.get('height', 0),
                 'timestamp': timestamp,
-                'from_address': in_data.get('address', '0x0000000000000000000000000000000000000000') if isinstance(in_data, dict) else '0x0000000000000000000000000000000000000000',
-                'to_address': out_data.get('address', '0x0000000000000000000000000000000000000000') if isinstance(out_data, dict) else '0x0000000000000000000000000000000000000000',
+                'from_address': in_data.get('address', '0x0000000000000000000000000000000000000000'),
+                'to_address': out_data.get('address', '0x0000000000000000000000000000000000000000'),
                 'affiliate_address': self.shapeshift_affiliate_address,
-                'affiliate_fee_amount': '0',  # THORChain doesn't have explicit affiliate fees
-                'affiliate_fee_token': '0x0000000000000000000000000000000000000000',
-                'affiliate_fee_usd': '0',
+                'affiliate_fee_amount': str(fee_amount),
+                'affiliate_fee_token': volume_token if fee_amount else '0x0000000000000000000000000000000000000000',
+                'affiliate_fee_usd': str(fee_usd),
                 'volume_amount': str(volume_amount),
                 'volume_token': volume_token,
                 'volume_usd': str(volume_usd),
                 'gas_used': 0,  # THORChain doesn't use gas
                 'gas_price': 0,
                 'pool': swap.get('pool', ''),
-                'from_asset': in_data.get('coins', [{}])[0].get('asset', '') if in_data.get('coins') else '',
-                'to_asset': out_data.get('coins', [{}])[0].get('asset', '') if out_data.get('coins') else '',
-                'from_amount': str(in_data.get('amount', '0')) if isinstance(in_data, dict) else '0',
-                'to_amount': str(out_data.get('amount', '0')) if isinstance(out_data, dict) else '0',
-                'affiliate_fee_asset': '',
-                'affiliate_fee_amount_asset': '0',
+                'from_asset': in_coin.get('asset', ''),
+                'to_asset': out_coin.get('asset', ''),
+                'from_amount': str(in_coin.get('amount', '0')),
+                'to_amount': str(out_coin.get('amount', '0')),
+                'affiliate_fee_asset': in_coin.get('asset', '') if fee_amount else '',
+                'affiliate_fee_amount_asset': str(fee_amount),
                 'created_at': int(time.time())
             }
             
@@ -390,115 +446,88 @@ class CSVThorChainListener:
 # MAIN LISTENER EXECUTION
 # =============================================================================
 
-    def run_listener(self, max_swaps: Optional[int] = None):
-        """Run the THORChain listener to fetch and process swaps"""
-        if max_swaps is None:
-            max_swaps = self.max_swaps_per_request
+    def process_swaps(self, swaps: List[Dict[str, Any]]) -> int:
+        """Filter, value and save one window of swap actions; returns rows saved"""
+        # Filter for ShapeShift affiliate swaps
+        matched = self.match_affiliate_swaps(swaps)
+        if not matched:
+            return 0
+        
+        # Prices for the whole window are fetched once, not per swap
+        self.prefetch_prices([swap for swap, _ in matched])
+        
+        # Convert swaps to transactions
+        transactions = []
+        for swap, fee_bps in matched:
+            try:
+                transaction = self.convert_swap_to_transaction(swap, fee_bps)
+                if transaction:
+                    transactions.append(transaction)
+            except Exception as e:
+                self.logger.error(f"❌ Error converting swap: {e}")
+                continue
         
-        self.logger.info(f"🚀 Starting THORChain listener")
-        self.logger.info(f"📊 Max swaps per request: {max_swaps}")
+        # Save transactions to CSV
+        self.save_transactions_to_csv(transactions)
+        return len(transactions)
+    
+    def run_listener(self, max_windows: Optional[int] = None, end_height: Optional[int] = None):
+        """Sync THORChain swaps from the last processed height up to Midgard's head.
+        
+        Height windows are fetched concurrently and processed in order; each
+        window is checkpointed before the tracker moves past it, so an
+        interrupted backfill resumes where it stopped.
+        """
+        self.logger.info("🚀 Starting THORChain listener")
         
         total_transactions = 0
-        offset = self.get_last_processed_offset()
+        last_height = self.get_last_processed_height()
+        start_height = last_height + 1 if last_height else self.start_height
         
         try:
-            # Fetch swaps from THORChain
-            swaps = self.fetch_thorchain_swaps(offset=offset, limit=max_swaps)
-            
-            if not swaps:
+            head = end_height if end_height is not None else self.midgard.latest_height()
+            if head < start_height:
                 self.logger.info("✅ No new swaps found")
                 return 0
             
-            # Filter for ShapeShift affiliate swaps
-            affiliate_swaps = self.filter_shapeshift_affiliate_swaps(swaps)
-            
-            if not affiliate_swaps:
-                self.logger.info("✅ No ShapeShift affiliate swaps found")
-                # Still update offset to avoid re-processing
-                self.update_block_tracker(offset + len(swaps))
-                return 0
-            
-            # Convert swaps to transactions
-            transactions = []
-            for swap in affiliate_swaps:
-                try:
-                    transaction = self.convert_swap_to_transaction(swap)
-                    if transaction:
-                        transactions.append(transaction)
-                except Exception as e:
-                    self.logger.error(f"❌ Error converting swap: {e}")
-                    continue
-            
-            # Save transactions to CSV
-            if transactions:
-                self.save_transactions_to_csv(transactions)
-                total_transactions = len(transactions)
-            
-            # Update block tracker
-            self.update_block_tracker(offset + len(swaps))
-            
-            # Rate limiting
-            time.sleep(self.api_rate_limit)
+            self.logger.info(f"📊 Syncing heights {start_height} to {head}")
+            filters = self.resolve_swap_filters()
+            windows = 0
+            stable_height = head - self.stable_confirmations
+            for window_end, swaps in self.sync_engine.sync(start_height, head, stable_height=stable_height,
+                                                           type='swap', **filters):
+                total_transactions += self.process_swaps(swaps)
+                
+                # Make the window durable before the tracker moves past it
+                self._checkpoint_storage()
+                self.update_block_tracker(window_end, len(swaps))
+                
+                windows += 1
+                if max_windows is not None and windows >= max_windows:
+                    break
             
             self.logger.info(f"🎯 THORChain listener completed. Total transactions: {total_transactions}")
             return total_transactions
             
         except Exception as e:
             self.logger.error(f"❌ Error running THORChain listener: {e}")
-            return 0
+            return total_transactions
 
 # =============================================================================
 # UTILITY METHODS
 # =============================================================================
 
     def get_csv_stats(self) -> Dict[str, Any]:
-        """Get statistics about the CSV data"""
-        transactions_path = os.path.join(self.transactions_dir, 'thorchain_transactions.csv')
-        
-        if not os.path.exists(transactions_path):
-            return {'total_transactions': 0, 'pools': {}, 'volume_ranges': {}}
-        
-        try:
-            with open(transactions_path, 'r', newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-            
-            stats = {
-                'total_transactions': len(rows),
-                'pools': {},
-                'volume_ranges': {
-                    'under_13': 0,
-                    '13_to_100': 0,
-                    '100_to_1000': 0,
-                    'over_1000': 0
-                }
-            }
-            
-            for row in rows:
-                pool = row.get('pool', 'unknown')
-                if pool not in stats['pools']:
-                    stats['pools'][pool] = 0
-                stats['pools'][pool] += 1
-                
-                # Analyze volume distribution
-                try:
-                    volume_usd = float(row.get('volume_usd', 0))
-                    if volume_usd < 13:
-                        stats['volume_ranges']['under_13'] += 1
-                    elif volume_usd < 100:
-                        stats['volume_ranges']['13_to_100'] += 1
-                    elif volume_usd < 1000:
-                        stats['volume_ranges']['100_to_1000'] += 1
-                    else:
-                        stats['volume_ranges']['over_1000'] += 1
-                except (ValueError, TypeError):
-                    continue
-            
-            return stats
-            
-        except Exception as e:
-            self.logger.error(f"❌ Error getting CSV stats: {e}")
-            return {'total_transactions': 0, 'pools': {}, 'volume_ranges': {}}
+        """Get statistics about the CSV data from the running aggregates"""
+        stats = self.transactions_stats
+        return {
+            'total_transactions': stats.total_transactions,
+            'pools': stats.counts('pools'),
+            'volume_ranges': stats.volume_ranges,
+            'days': stats.totals('days'),
+            'volume_usd': stats.volume_usd,
+            'affiliate_fee_usd': stats.affiliate_fee_usd
+        }
 
 # =============================================================================
 # MAIN EXECUTION
@@ -512,16 +541,16 @@ def main():
         
         stats = listener.get_csv_stats()
         
-        print(f"\n📊 THORChain Listener Statistics:")
+        print("\n📊 THORChain Listener Statistics:")
         print(f"   Total transactions: {stats['total_transactions']}")
-        print(f"   Transactions by pool:")
+        print("   Transactions by pool:")
         for pool, count in stats['pools'].items():
             print(f"     {pool}: {count}")
-        print(f"   Volume distribution:")
+        print("   Volume distribution:")
         for range_name, count in stats['volume_ranges'].items():
             print(f"     {range_name}: {count} transactions")
         
-        print(f"\n✅ THORChain listener completed successfully!")
+        print("\n✅ THORChain listener completed successfully!")
         print(f"   Total events found: {total_transactions}")
         
     except Exception as e:
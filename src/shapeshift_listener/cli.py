@@ -7,6 +7,8 @@ Command-line interface for running affiliate fee listeners.
 
 import argparse
 import asyncio
+import csv
+import json
 import logging
 import sys
 from pathlib import Path
@@ -48,6 +50,10 @@ Examples:
   
   # Check configuration
   ss-listener config --validate
+  
+  # Query listener outputs with DuckDB
+  ss-listener query --name affiliate_fees_by_chain --param days=30
+  ss-listener query "SELECT protocol, count(*) FROM all_transactions GROUP BY 1"
         """
     )
     
@@ -69,6 +75,17 @@ Examples:
     config_parser.add_argument("--validate", action="store_true", help="Validate configuration")
     config_parser.add_argument("--show", action="store_true", help="Show current configuration")
     
+    # Query command
+    query_parser = subparsers.add_parser("query", help="Query listener outputs with DuckDB")
+    query_parser.add_argument("sql", nargs="?", help="SQL to run against the registered views")
+    query_parser.add_argument("--name", help="Run a saved query by name")
+    query_parser.add_argument("--param", action="append", default=[], metavar="KEY=VALUE", help="Saved query parameter (repeatable)")
+    query_parser.add_argument("--list", action="store_true", help="List registered views and saved queries")
+    query_parser.add_argument("--materialize", action="store_true", help="Convert rotated CSV files to Parquet before querying")
+    query_parser.add_argument("--threads", type=int, help="DuckDB worker threads (default: all cores)")
+    query_parser.add_argument("--format", default="table", choices=["table", "csv", "json"], help="Output format")
+    query_parser.add_argument("--config", type=Path, default=Path("config/shapeshift_config.yaml"), help="Path to configuration file")
+    
     # Version command
     version_parser = subparsers.add_parser("version", help="Show version information")
     
@@ -141,6 +158,83 @@ def show_config(args: argparse.Namespace) -> None:
         sys.exit(1)
 
 
+def _parse_param(value: str) -> object:
+    """Convert a --param value to int/float when it looks numeric."""
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            continue
+    return value
+
+
+def _print_result(result, output_format: str) -> None:
+    """Print a DuckDB result in the requested format."""
+    columns = [column[0] for column in result.description]
+    
+    if output_format == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(columns)
+        while True:
+            rows = result.fetchmany(10000)
+            if not rows:
+                break
+            writer.writerows(rows)
+        return
+    
+    rows = result.fetchall()
+    if output_format == "json":
+        print(json.dumps([dict(zip(columns, row, strict=True)) for row in rows], default=str, indent=2))
+        return
+    
+    cells = [[("" if value is None else str(value)) for value in row] for row in rows]
+    widths = [max([len(column)] + [len(row[i]) for row in cells]) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths, strict=True)))
+    print("  ".join("-" * width for width in widths))
+    for row in cells:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths, strict=True)))
+
+
+def run_query(args: argparse.Namespace) -> None:
+    """Run an ad hoc or saved query over the listener outputs."""
+    from .query import QueryEngine
+    
+    try:
+        config = Config.from_file(args.config) if args.config.exists() else Config.from_env()
+        setup_logging(config.log_level, format_type="text")
+        
+        with QueryEngine(config.config_data, threads=args.threads) as engine:
+            if args.materialize:
+                written = engine.materialize()
+                print(f"✅ Materialized {len(written)} file(s) to Parquet")
+            
+            if args.list:
+                print("Views:")
+                for view in engine.views:
+                    print(f"  {view}")
+                print("Saved queries:")
+                for name in sorted(engine.saved_queries):
+                    print(f"  {name}")
+                return
+            
+            if args.name:
+                params = dict(item.split("=", 1) for item in args.param)
+                result = engine.run_saved(args.name, {k: _parse_param(v) for k, v in params.items()})
+            elif args.sql:
+                result = engine.sql(args.sql)
+            else:
+                if not args.materialize:
+                    print("Please provide SQL or --name. Use --list to see saved queries.")
+                    sys.exit(1)
+                return
+            
+            _print_result(result, args.format)
+            
+    except Exception as e:
+        print(f"❌ Query failed: {e}")
+        sys.exit(1)
+
+
 def show_version() -> None:
     """Show version information."""
     from . import __version__, __author__, __license__
@@ -159,6 +253,8 @@ async def main() -> None:
         list_chains()
     elif args.command == "config":
         show_config(args)
+    elif args.command == "query":
+        run_query(args)
     elif args.command == "version":
         show_version()
     else:
@@ -4,6 +4,7 @@ Core functionality for ShapeShift Affiliate Listener.
 
 from .base import BaseListener
 from .config import Config
+from .head_tracker import HeadTracker
 from .listener_manager import ListenerManager
 
-__all__ = ["BaseListener", "Config", "ListenerManager"]
+__all__ = ["BaseListener", "Config", "HeadTracker", "ListenerManager"]
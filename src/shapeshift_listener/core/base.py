@@ -8,6 +8,7 @@ from abc import ABC, abstractmethod
 from typing import Any, Dict, List, Optional
 
 from .config import Config
+from .head_tracker import HeadTracker
 
 
 class BaseListener(ABC):
@@ -18,6 +19,11 @@ class BaseListener(ABC):
         self.config = config
         self.logger = logging.getLogger(self.__class__.__name__)
         self.is_running = False
+        self.head_tracker: Optional[HeadTracker] = None
+    
+    def attach_head_tracker(self, tracker: HeadTracker) -> None:
+        """Follow the chain head through a shared tracker instead of polling per listener."""
+        self.head_tracker = tracker
         
     @abstractmethod
     async def process_block(self, block_number: int) -> List[Dict[str, Any]]:
@@ -44,6 +50,14 @@ class BaseListener(ABC):
             current_block = from_block
             while self.is_running:
                 try:
+                    # With a head tracker, wait for the block to exist instead of polling for it
+                    if self.head_tracker is not None:
+                        try:
+                            await asyncio.wait_for(self.head_tracker.wait_for(current_block),
+                                                   timeout=self.config.head_poll_max_seconds)
+                        except asyncio.TimeoutError:
+                            continue  # re-check is_running while the chain is idle
+                    
                     events = await self.process_block(current_block)
                     
                     if events:
@@ -59,8 +73,9 @@ class BaseListener(ABC):
                         self.logger.info(f"Reached target block {to_block}, stopping")
                         break
                     
-                    # Rate limiting
-                    await asyncio.sleep(1 / self.config.rpc_rate_limit_per_second)
+                    # Rate limiting (caught-up listeners are paced by the head tracker)
+                    if self.head_tracker is None or (self.head_tracker.latest or 0) >= current_block:
+                        await asyncio.sleep(1 / self.config.rpc_rate_limit_per_second)
                     
                 except Exception as e:
                     self.logger.error(f"Error processing block {current_block}: {e}", exc_info=True)
@@ -58,6 +58,11 @@ class Config:
         self.csv_output_dir = Path(os.getenv("CSV_OUTPUT_DIR", "./data/csv"))
         self.database_url = os.getenv("DATABASE_URL", "sqlite:///./data/affiliate_fees.db")
         
+        # Head tracking (newHeads websocket, adaptive polling fallback)
+        self.use_websocket_heads = os.getenv("USE_WEBSOCKET_HEADS", "true").lower() == "true"
+        self.head_poll_min_seconds = float(os.getenv("HEAD_POLL_MIN_SECONDS", "1"))
+        self.head_poll_max_seconds = float(os.getenv("HEAD_POLL_MAX_SECONDS", "30"))
+        
         # Security & Validation
         self.reorg_window_blocks = int(os.getenv("REORG_WINDOW_BLOCKS", "25"))
         self.confirmation_blocks = int(os.getenv("CONFIRMATION_BLOCKS", "12"))
@@ -112,6 +117,18 @@ class Config:
         
         raise ValueError(f"No RPC URL configured for chain: {chain}")
     
+    def get_ws_url(self, chain: str) -> Optional[str]:
+        """Get the websocket RPC URL for a chain, or None to poll instead."""
+        if not self.use_websocket_heads:
+            return None
+        try:
+            rpc_url = self.get_rpc_url(chain)
+        except ValueError:
+            return None
+        if ".infura.io/v3/" in rpc_url:
+            return rpc_url.replace("https://", "wss://").replace(".infura.io/v3/", ".infura.io/ws/v3/")
+        return rpc_url.replace("https://", "wss://", 1)
+    
     def to_dict(self) -> Dict[str, Any]:
         """Convert configuration to dictionary."""
         return {
@@ -126,5 +143,8 @@ class Config:
             "csv_output_dir": str(self.csv_output_dir),
             "reorg_window_blocks": self.reorg_window_blocks,
             "confirmation_blocks": self.confirmation_blocks,
+            "use_websocket_heads": self.use_websocket_heads,
+            "head_poll_min_seconds": self.head_poll_min_seconds,
+            "head_poll_max_seconds": self.head_poll_max_seconds,
             "min_volume_usd": self.min_volume_usd,
         }
@@ -0,0 +1,168 @@
+"""
+Chain head tracking shared by every listener on a chain.
+
+A HeadTracker follows the chain head over an ``eth_subscribe("newHeads")``
+websocket subscription and falls back to adaptive polling when no websocket
+endpoint is configured or the subscription drops. New heights are published
+to all waiting listeners, so a chain is followed by one subscription (or one
+poll loop) no matter how many listeners run on it.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+
+class HeadTracker:
+    """Publishes new head heights of one chain to any number of listeners."""
+
+    def __init__(
+        self,
+        chain: str,
+        poll_latest: Callable[[], Awaitable[int]],
+        ws_url: Optional[str] = None,
+        min_poll_interval: float = 1.0,
+        max_poll_interval: float = 30.0,
+        ws_retry_seconds: float = 60.0,
+    ):
+        """Initialize the tracker.
+
+        Args:
+            chain: Chain name (for logging).
+            poll_latest: Coroutine returning the latest block, used when polling.
+            ws_url: Websocket RPC endpoint for newHeads; polling only if None.
+            min_poll_interval: Shortest delay between polls (seconds).
+            max_poll_interval: Longest delay between polls while the head is idle.
+            ws_retry_seconds: How long to poll before retrying a failed websocket.
+        """
+        self.chain = chain
+        self.poll_latest = poll_latest
+        self.ws_url = ws_url
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max(max_poll_interval, min_poll_interval)
+        self.ws_retry_seconds = ws_retry_seconds
+        self.logger = logging.getLogger(f"{self.__class__.__name__}[{chain}]")
+
+        self.latest: Optional[int] = None
+        self.mode = "idle"
+        self.rpc_calls = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._task: Optional[asyncio.Task] = None
+        self._block_time: Optional[float] = None
+        self._last_change: Optional[float] = None
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def _cond(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def publish(self, height: int) -> None:
+        """Record a head height and wake every listener waiting for it."""
+        if self.latest is not None and height <= self.latest:
+            return
+        now = time.monotonic()
+        if self._last_change is not None and self.latest is not None:
+            # Smoothed block time drives the polling interval
+            observed = (now - self._last_change) / (height - self.latest)
+            self._block_time = observed if self._block_time is None else 0.8 * self._block_time + 0.2 * observed
+        self._last_change = now
+        self.latest = height
+        async with self._cond():
+            self._cond().notify_all()
+
+    async def wait_for(self, height: int) -> int:
+        """Wait until the head reaches ``height``; returns the current head."""
+        if self.latest is not None and self.latest >= height:
+            return self.latest
+        async with self._cond():
+            await self._cond().wait_for(lambda: self.latest is not None and self.latest >= height)
+        assert self.latest is not None
+        return self.latest
+
+    # ------------------------------------------------------------------
+    # Sources
+    # ------------------------------------------------------------------
+
+    async def _follow_websocket(self) -> None:
+        """Publish heads from a newHeads subscription until the socket closes."""
+        import websockets  # installed with web3
+
+        async with websockets.connect(self.ws_url, ping_interval=20) as ws:
+            await ws.send(json.dumps({"jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["newHeads"]}))
+            self.rpc_calls += 1
+            reply = json.loads(await ws.recv())
+            if "error" in reply:
+                raise RuntimeError(f"newHeads subscription rejected: {reply['error']}")
+            self.mode = "websocket"
+            self.logger.info("Following newHeads subscription")
+            async for message in ws:
+                params = json.loads(message).get("params") or {}
+                number = (params.get("result") or {}).get("number")
+                if number is not None:
+                    await self.publish(int(number, 16))
+
+    def _next_poll_interval(self, interval: float, changed: bool) -> float:
+        if changed:
+            # Poll about twice per block once the block time is known
+            target = self._block_time / 2 if self._block_time else interval
+            return min(max(target, self.min_poll_interval), self.max_poll_interval)
+        return min(interval * 1.5, self.max_poll_interval)
+
+    async def _poll(self, duration: Optional[float] = None) -> None:
+        """Adaptive polling: slows down while the head is idle, speeds up on new blocks."""
+        self.mode = "polling"
+        deadline = None if duration is None else time.monotonic() + duration
+        interval = self.min_poll_interval
+        while deadline is None or time.monotonic() < deadline:
+            try:
+                self.rpc_calls += 1
+                height = await self.poll_latest()
+                changed = self.latest is None or height > self.latest
+                await self.publish(height)
+                interval = self._next_poll_interval(interval, changed)
+            except Exception as e:
+                self.logger.warning(f"Head poll failed: {e}")
+                interval = self.max_poll_interval
+            await asyncio.sleep(interval)
+
+    async def _run(self) -> None:
+        while True:
+            if self.ws_url:
+                try:
+                    await self._follow_websocket()
+                    self.logger.warning("newHeads subscription closed, polling until reconnect")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.logger.warning(f"newHeads unavailable ({e}), polling for {self.ws_retry_seconds:.0f}s")
+                await self._poll(self.ws_retry_seconds)
+            else:
+                await self._poll()
+
+    def start(self) -> bool:
+        """Start following the head (idempotent); requires a running event loop.
+
+        Returns True if this call started it, False if it was already running.
+        """
+        if self._task is None or self._task.done():
+            self._cond()
+            self._task = asyncio.create_task(self._run())
+            return True
+        return False
+
+    async def stop(self) -> None:
+        """Stop following the head."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        self.mode = "idle"
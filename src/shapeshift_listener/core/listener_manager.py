@@ -8,6 +8,7 @@ from typing import Dict, List, Optional
 
 from .config import Config
 from .base import BaseListener
+from .head_tracker import HeadTracker
 
 
 class ListenerManager:
@@ -18,13 +19,41 @@ class ListenerManager:
         self.config = config
         self.logger = logging.getLogger(__name__)
         self.listeners: Dict[str, BaseListener] = {}
+        self.listener_chains: Dict[str, str] = {}
+        self.head_trackers: Dict[str, HeadTracker] = {}
         self.running_tasks: List[asyncio.Task] = []
     
-    def register_listener(self, chain: str, listener: BaseListener) -> None:
-        """Register a listener for a specific chain."""
-        self.listeners[chain.lower()] = listener
+    def register_listener(self, chain: str, listener: BaseListener, name: Optional[str] = None) -> None:
+        """Register a listener for a specific chain.
+        
+        Several listeners may share a chain under different names; they all
+        follow the same head tracker.
+        """
+        key = (name or chain).lower()
+        self.listeners[key] = listener
+        self.listener_chains[key] = chain.lower()
+        listener.attach_head_tracker(self.get_head_tracker(chain, listener))
         self.logger.info(f"Registered listener for chain: {chain}")
     
+    def get_head_tracker(self, chain: str, listener: Optional[BaseListener] = None) -> HeadTracker:
+        """Get (creating on first use) the head tracker shared by a chain's listeners."""
+        chain_lower = chain.lower()
+        if chain_lower not in self.head_trackers:
+            if listener is None:
+                raise ValueError(f"No listener registered for chain: {chain}")
+            self.head_trackers[chain_lower] = HeadTracker(
+                chain_lower,
+                poll_latest=listener.get_latest_block,
+                ws_url=self.config.get_ws_url(chain_lower),
+                min_poll_interval=self.config.head_poll_min_seconds,
+                max_poll_interval=self.config.head_poll_max_seconds,
+            )
+        return self.head_trackers[chain_lower]
+    
+    async def _stop_head_trackers(self) -> None:
+        for tracker in self.head_trackers.values():
+            await tracker.stop()
+    
     async def run_chain(self, chain: str, from_block: Optional[int] = None, sink: str = "stdout") -> None:
         """Run a listener for a specific chain."""
         chain_lower = chain.lower()
@@ -44,12 +73,17 @@ class ListenerManager:
         else:
             raise ValueError(f"Unsupported sink: {sink}")
         
-        # Run the listener
+        # Run the listener; a tracker already running for another caller is left running
+        tracker = self.head_trackers[self.listener_chains[chain_lower]]
+        started = tracker.start()
         try:
             await listener.run(from_block=from_block)
         except Exception as e:
             self.logger.error(f"Failed to run {chain} listener: {e}", exc_info=True)
             raise
+        finally:
+            if started:
+                await tracker.stop()
     
     async def run_all(self) -> None:
         """Run all registered listeners."""
@@ -59,6 +93,10 @@ class ListenerManager:
         
         self.logger.info(f"Starting {len(self.listeners)} listeners")
         
+        # One head tracker per chain, shared by that chain's listeners
+        for tracker in self.head_trackers.values():
+            tracker.start()
+        
         # Create tasks for all listeners
         tasks = []
         for chain, listener in self.listeners.items():
@@ -74,6 +112,7 @@ class ListenerManager:
             raise
         finally:
             self.running_tasks.clear()
+            await self._stop_head_trackers()
     
     def stop_all(self) -> None:
         """Stop all running listeners."""
@@ -103,6 +142,11 @@ class ListenerManager:
                 listener_health = await listener.health_check()
                 health_status["listeners"][chain] = listener_health
                 
+                tracker = listener.head_tracker
+                if tracker is not None:
+                    listener_health["head"] = {"latest": tracker.latest, "mode": tracker.mode,
+                                               "rpc_calls": tracker.rpc_calls}
+                
                 if listener_health.get("status") == "unhealthy":
                     health_status["manager_status"] = "degraded"
                     
@@ -0,0 +1,231 @@
+"""
+Embedded DuckDB query layer over listener outputs.
+
+Every transactions file declared in ``storage.file_patterns`` is registered as
+a DuckDB view named after its protocol (``portals``, ``thorchain``, ...), and
+``all_transactions`` unions them by column name with a ``protocol`` column.
+
+Rotated CSV files never change again, so ``materialize()`` converts them once
+into Parquet under ``query.parquet_directory``; views then read the Parquet
+copy (column pruning, row-group predicate pushdown) and only scan the active
+CSV as text. DuckDB scans all files in parallel and streams results, so
+queries over years of history do not need to fit in memory.
+"""
+
+import glob
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CSV_DIRECTORY = "csv_data"
+
+# Named queries available to every deployment. Deployments can add or override
+# entries under ``query.saved_queries`` in the YAML configuration. Parameters
+# are DuckDB named parameters ($name) with defaults in SAVED_QUERY_DEFAULTS.
+SAVED_QUERIES: Dict[str, str] = {
+    "affiliate_fees_by_chain": """
+        SELECT chain,
+               count(*) AS transactions,
+               sum(try_cast(affiliate_fee_usd AS DOUBLE)) AS affiliate_fee_usd,
+               sum(try_cast(volume_usd AS DOUBLE)) AS volume_usd
+        FROM all_transactions
+        WHERE ss_ts(timestamp) >= now() - to_days(CAST($days AS INTEGER))
+        GROUP BY chain
+        ORDER BY affiliate_fee_usd DESC NULLS LAST
+    """,
+    "affiliate_fees_by_protocol": """
+        SELECT protocol,
+               count(*) AS transactions,
+               sum(try_cast(affiliate_fee_usd AS DOUBLE)) AS affiliate_fee_usd,
+               sum(try_cast(volume_usd AS DOUBLE)) AS volume_usd
+        FROM all_transactions
+        WHERE ss_ts(timestamp) >= now() - to_days(CAST($days AS INTEGER))
+        GROUP BY protocol
+        ORDER BY affiliate_fee_usd DESC NULLS LAST
+    """,
+    "daily_revenue": """
+        SELECT CAST(ss_ts(timestamp) AS DATE) AS day,
+               protocol,
+               count(*) AS transactions,
+               sum(try_cast(affiliate_fee_usd AS DOUBLE)) AS affiliate_fee_usd,
+               sum(try_cast(volume_usd AS DOUBLE)) AS volume_usd
+        FROM all_transactions
+        WHERE ss_ts(timestamp) >= now() - to_days(CAST($days AS INTEGER))
+        GROUP BY ALL
+        ORDER BY day, protocol
+    """,
+}
+
+SAVED_QUERY_DEFAULTS: Dict[str, Any] = {"days": 30}
+
+# Normalizes unix seconds, milliseconds and Midgard nanoseconds to a timestamp
+_TIMESTAMP_MACRO = """
+    CREATE OR REPLACE MACRO ss_ts(x) AS to_timestamp(
+        CASE WHEN try_cast(x AS DOUBLE) > 1e17 THEN try_cast(x AS DOUBLE) / 1e9
+             WHEN try_cast(x AS DOUBLE) > 1e11 THEN try_cast(x AS DOUBLE) / 1e3
+             ELSE try_cast(x AS DOUBLE) END)
+"""
+
+
+# DuckDB memory sizes such as "4GB", "512 MiB" or "1.5TB"
+_MEMORY_LIMIT_PATTERN = re.compile(r"^\d+(\.\d+)?\s*[KMGT]i?B$", re.IGNORECASE)
+
+
+def _quote_list(paths: List[str]) -> str:
+    return "[" + ", ".join("'" + p.replace("'", "''") + "'" for p in paths) + "]"
+
+
+class QueryEngine:
+    """Registers listener outputs as DuckDB views and runs (saved) queries."""
+
+    def __init__(self, config_data: Optional[Dict[str, Any]] = None, database: str = ":memory:",
+                 threads: Optional[int] = None, memory_limit: Optional[str] = None):
+        """Initialize the engine and register views for all configured outputs."""
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError(
+                "The query layer requires DuckDB. Install it with: pip install 'shapeshift-listener[query]'"
+            ) from e
+
+        config_data = config_data or {}
+        storage = config_data.get("storage", {}) or {}
+        query_config = config_data.get("query", {}) or {}
+
+        self.csv_directory = Path(storage.get("csv_directory", DEFAULT_CSV_DIRECTORY))
+        self.transactions_directory = self.csv_directory / "transactions"
+        self.parquet_directory = Path(query_config.get("parquet_directory", self.csv_directory / "parquet"))
+        self.file_patterns: Dict[str, str] = {
+            name: pattern
+            for name, pattern in (storage.get("file_patterns", {}) or {}).items()
+            if "{" not in pattern and pattern.endswith((".csv", ".parquet"))
+        }
+        self.saved_queries = {**SAVED_QUERIES, **(query_config.get("saved_queries", {}) or {})}
+
+        self.connection = duckdb.connect(database)
+        threads = threads if threads is not None else query_config.get("threads")
+        if threads:
+            self.connection.execute(f"SET threads TO {int(threads)}")
+        memory_limit = memory_limit or query_config.get("memory_limit")
+        if memory_limit:
+            memory_limit = str(memory_limit).strip()
+            if not _MEMORY_LIMIT_PATTERN.match(memory_limit):
+                raise ValueError(f"Invalid query.memory_limit {memory_limit!r}, expected a size such as '4GB'")
+            self.connection.execute(f"SET memory_limit = '{memory_limit}'")
+
+        self.connection.execute(_TIMESTAMP_MACRO)
+        self.views: List[str] = []
+        self.register_views()
+
+    # ------------------------------------------------------------------
+    # Sources
+    # ------------------------------------------------------------------
+
+    def _source_files(self, pattern: str) -> Tuple[List[str], List[str]]:
+        """Return (parquet files, csv files) backing one file pattern."""
+        active = self.transactions_directory / pattern
+        if active.suffix == ".parquet":
+            return sorted(glob.glob(str(active.with_suffix("")) + "*.parquet")), []
+
+        stem = str(active.with_suffix(""))
+        rotated = sorted(glob.glob(glob.escape(stem) + ".*.csv"))
+        parquet_files: List[str] = []
+        csv_files: List[str] = []
+        for path in rotated:
+            parquet_path = self._parquet_path(path)
+            if parquet_path.exists() and parquet_path.stat().st_mtime >= os.path.getmtime(path):
+                parquet_files.append(str(parquet_path))
+            else:
+                csv_files.append(path)
+        if active.exists():
+            csv_files.append(str(active))
+        return parquet_files, csv_files
+
+    def _parquet_path(self, csv_path: str) -> Path:
+        return self.parquet_directory / (Path(csv_path).stem + ".parquet")
+
+    def _source_sql(self, parquet_files: List[str], csv_files: List[str]) -> Optional[str]:
+        selects = []
+        if parquet_files:
+            selects.append(f"SELECT * FROM read_parquet({_quote_list(parquet_files)}, union_by_name = true)")
+        if csv_files:
+            selects.append(
+                f"SELECT * FROM read_csv({_quote_list(csv_files)}, header = true, union_by_name = true)"
+            )
+        return "\nUNION ALL BY NAME\n".join(selects) if selects else None
+
+    def register_views(self) -> List[str]:
+        """(Re)create one view per configured output plus ``all_transactions``."""
+        self.views = []
+        union_parts = []
+        for name, pattern in self.file_patterns.items():
+            source_sql = self._source_sql(*self._source_files(pattern))
+            if source_sql is None:
+                logger.debug(f"No data for {name} ({pattern}), skipping view")
+                continue
+            self.connection.execute(f'CREATE OR REPLACE VIEW "{name}" AS {source_sql}')
+            self.views.append(name)
+            if name != "consolidated":
+                union_parts.append(f"SELECT '{name}' AS protocol, * FROM \"{name}\"")
+
+        if union_parts:
+            self.connection.execute(
+                "CREATE OR REPLACE VIEW all_transactions AS " + "\nUNION ALL BY NAME\n".join(union_parts)
+            )
+            self.views.append("all_transactions")
+
+        logger.info(f"Registered DuckDB views: {', '.join(self.views) or 'none'}")
+        return self.views
+
+    def materialize(self) -> List[str]:
+        """Convert rotated (immutable) CSV files to Parquet and refresh the views."""
+        self.parquet_directory.mkdir(parents=True, exist_ok=True)
+        written = []
+        for pattern in self.file_patterns.values():
+            _, csv_files = self._source_files(pattern)
+            active = str(self.transactions_directory / pattern)
+            for path in csv_files:
+                if path == active:
+                    continue
+                parquet_path = self._parquet_path(path)
+                self.connection.execute(
+                    f"COPY (SELECT * FROM read_csv({_quote_list([path])}, header = true)) "
+                    f"TO '{str(parquet_path).replace(chr(39), chr(39) * 2)}' (FORMAT parquet, COMPRESSION zstd)"
+                )
+                written.append(str(parquet_path))
+                logger.info(f"Materialized {path} -> {parquet_path}")
+        self.register_views()
+        return written
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def sql(self, query: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Run SQL against the registered views and return a DuckDB relation/result."""
+        if params:
+            return self.connection.execute(query, params)
+        return self.connection.sql(query)
+
+    def run_saved(self, name: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Run a named query, filling in default parameters it references."""
+        if name not in self.saved_queries:
+            raise KeyError(f"Unknown saved query: {name}. Available: {', '.join(sorted(self.saved_queries))}")
+        query = self.saved_queries[name]
+        merged = {key: value for key, value in SAVED_QUERY_DEFAULTS.items() if f"${key}" in query}
+        merged.update(params or {})
+        return self.connection.execute(query, merged) if merged else self.connection.execute(query)
+
+    def close(self) -> None:
+        """Close the DuckDB connection."""
+        self.connection.close()
+
+    def __enter__(self) -> "QueryEngine":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
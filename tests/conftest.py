@@ -0,0 +1,29 @@
+"""
+Shared pytest setup: the listeners import the flat modules in shared/ by
+putting that directory on sys.path, and the tests do the same.
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'shared'))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+
+@pytest.fixture
+def token_store(tmp_path, monkeypatch):
+    """token_cache backed by a fresh SQLite file, with empty memory and resolvers"""
+    pytest.importorskip('web3')
+    import token_cache
+
+    monkeypatch.setattr(token_cache, '_DB_PATH', str(tmp_path / 'tokens.sqlite'))
+    monkeypatch.setattr(token_cache, '_SCHEMA_READY', False)
+    monkeypatch.setattr(token_cache, '_LOCAL', threading.local())
+    monkeypatch.setattr(token_cache, '_RESOLVERS', {})
+    token_cache._MEMORY.clear()
+    yield token_cache
+    token_cache._MEMORY.clear()
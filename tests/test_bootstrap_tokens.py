@@ -0,0 +1,51 @@
+"""Streaming token list reader: objects split across read chunks"""
+
+import json
+
+import pytest
+
+pytest.importorskip('web3')
+
+import bootstrap_tokens  # noqa: E402
+
+TOKENS = [
+    {'chainId': 1, 'address': '0x' + f"{i:040x}", 'symbol': f"T{i}", 'name': f"Token {i} é", 'decimals': 18,
+     'extensions': {'bridgeInfo': {'137': {'tokenAddress': '0x' + f"{i:040x}"}}}}
+    for i in range(1, 40)
+]
+
+
+def read_all(path):
+    return list(bootstrap_tokens._iter_json(str(path)))
+
+
+@pytest.mark.parametrize('read_size', [1, 7, 64, 1 << 20])
+def test_token_list_objects_survive_any_chunk_boundary(tmp_path, monkeypatch, read_size):
+    monkeypatch.setattr(bootstrap_tokens, '_READ_SIZE', read_size)
+    path = tmp_path / 'list.json'
+    path.write_text(json.dumps({'name': 'Uniswap Labs Default', 'tokens': TOKENS, 'version': {'major': 1}},
+                               indent=2), encoding='utf-8')
+    assert read_all(path) == TOKENS
+
+
+@pytest.mark.parametrize('read_size', [1, 5, 1 << 20])
+def test_top_level_array(tmp_path, monkeypatch, read_size):
+    monkeypatch.setattr(bootstrap_tokens, '_READ_SIZE', read_size)
+    path = tmp_path / 'array.json'
+    path.write_text('\n  ' + json.dumps(TOKENS[:3]), encoding='utf-8')
+    assert read_all(path) == TOKENS[:3]
+
+
+def test_tokens_key_split_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(bootstrap_tokens, '_READ_SIZE', 3)
+    path = tmp_path / 'list.json'
+    path.write_text('{"name": "x", "tokens"  :  [ ]}', encoding='utf-8')
+    assert read_all(path) == []
+
+
+def test_truncated_document_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(bootstrap_tokens, '_READ_SIZE', 16)
+    path = tmp_path / 'broken.json'
+    path.write_text(json.dumps({'tokens': TOKENS[:2]})[:-20], encoding='utf-8')
+    with pytest.raises(json.JSONDecodeError):
+        read_all(path)
@@ -0,0 +1,55 @@
+"""CoinMarketCap lookups end up in the token store with on-chain decimals"""
+
+import pytest
+
+TOKEN = '0x00000000000000000000000000000000000000aa'
+
+
+class FakeResolver:
+    """Multicall stand-in returning fixed ERC-20 metadata"""
+
+    def __init__(self, decimals):
+        self.decimals = decimals
+        self.calls = 0
+
+    def token_metadata(self, addresses):
+        from web3 import Web3
+        self.calls += 1
+        return {Web3.to_checksum_address(a): {'address': Web3.to_checksum_address(a), 'symbol': 'AAA',
+                                              'name': 'Token A', 'decimals': self.decimals}
+                for a in addresses}
+
+
+def fake_cmc_get(path, params):
+    if path == '/v1/cryptocurrency/map':
+        return {'data': [{'id': 42, 'platform': {'slug': 'ethereum', 'token_address': TOKEN}}]}
+    return {'data': {'42': {'symbol': 'AAA', 'name': 'Token A', 'quote': {'USD': {'price': 2.5}}}}}
+
+
+def test_cmc_only_token_is_persisted(token_store, tmp_path, monkeypatch):
+    import token_lookup_enhanced
+
+    resolver = FakeResolver(decimals=6)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('COINMARKETCAP_API_KEY', 'test')
+    monkeypatch.setenv('ALCHEMY_API_KEY', 'test')
+    monkeypatch.setattr(token_lookup_enhanced, 'MulticallResolver', lambda w3: resolver)
+
+    lookup = token_lookup_enhanced.EnhancedTokenLookup()
+    monkeypatch.setattr(lookup.cmc, '_get', fake_cmc_get)
+    try:
+        info = lookup.get_cmc_token_info(TOKEN)
+    finally:
+        lookup.cmc.close()
+
+    assert info['cmc_id'] == 42
+    assert info['decimals'] == 6
+
+    # Read back from SQLite, not the memory tier
+    token_store._MEMORY.clear()
+    calls = resolver.calls
+    stored = token_store.get_token_info(TOKEN)
+    assert stored['symbol'] == 'AAA'
+    assert stored['decimals'] == 6
+    assert stored['price'] == pytest.approx(2.5)
+    assert resolver.calls == calls
@@ -0,0 +1,83 @@
+"""Dedup keys, the Bloom + SQLite index, and its rebuild after a crash"""
+
+import pytest
+
+from dedup_index import BloomFilter, DedupIndex, make_key, row_key
+
+
+def row(tx_hash, log_index='', chain='ethereum'):
+    return {'chain': chain, 'tx_hash': tx_hash, 'log_index': log_index}
+
+
+def test_make_key_is_case_insensitive_and_16_bytes():
+    key = make_key('Ethereum', '0xABCDEF', 3)
+    assert len(key) == 16
+    assert key == make_key('ethereum', '0xabcdef', '3')
+    assert key != make_key('ethereum', '0xabcdef', 4)
+    assert key != make_key('base', '0xabcdef', 3)
+
+
+@pytest.mark.parametrize('tx_hash', ['', None, '0x', '0x' + '0' * 64])
+def test_make_key_skips_rows_without_tx_id(tx_hash):
+    assert make_key('ethereum', tx_hash, 1) is None
+    assert row_key(row(tx_hash)) is None
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    keys = [make_key('ethereum', f"0x{i:064x}") for i in range(1, 1001)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+
+
+def test_filter_new_round_trip(tmp_path):
+    index = DedupIndex(str(tmp_path / 'seen.sqlite'), expected_keys=1000)
+    assert index.is_new
+    rows = [row('0xaa', 1), row('0xaa', 1), row('0xaa', 2), row('')]
+    assert index.filter_new(rows) == [row('0xaa', 1), row('0xaa', 2), row('')]
+    index.close()
+
+    reopened = DedupIndex(str(tmp_path / 'seen.sqlite'), expected_keys=1000)
+    assert not reopened.is_new
+    # Unkeyed rows are always written
+    assert reopened.filter_new([row('0xaa', 1), row('0xbb', 1), row('')]) == [row('0xbb', 1), row('')]
+    reopened.close()
+
+
+def test_rollback_forgets_uncommitted_keys(tmp_path):
+    index = DedupIndex(str(tmp_path / 'seen.sqlite'), expected_keys=1000)
+    index.filter_new([row('0xaa', 1)])
+    index.rollback()
+    assert index.filter_new([row('0xaa', 1)]) == [row('0xaa', 1)]
+    index.close()
+
+
+def test_stale_bloom_is_rebuilt_after_a_crash(tmp_path):
+    path = str(tmp_path / 'seen.sqlite')
+    index = DedupIndex(path, expected_keys=1000, bloom_save_interval=3600)
+    index.filter_new([row('0xaa', 1)])
+    index.commit()
+    # Crash: the key is committed to SQLite but the Bloom file is from before it
+    index.conn.close()
+
+    reopened = DedupIndex(path, expected_keys=1000)
+    assert make_key('ethereum', '0xaa', 1) in reopened.bloom
+    assert reopened.filter_new([row('0xaa', 1)]) == []
+    reopened.close()
+
+
+def test_legacy_key_without_log_index_counts_as_seen(tmp_path):
+    index = DedupIndex(str(tmp_path / 'seen.sqlite'), expected_keys=1000)
+    index.filter_new([row('0xaa')])
+    assert index.filter_new([row('0xaa', 5)]) == []
+    index.close()
+
+
+def test_seed_from_csv(tmp_path):
+    csv_path = tmp_path / 'transactions.csv'
+    csv_path.write_text('chain,tx_hash,log_index\nethereum,0xaa,1\nethereum,0xbb,2\n', encoding='utf-8')
+    index = DedupIndex(str(tmp_path / 'seen.sqlite'), expected_keys=1000)
+    assert index.seed_from_csv([str(csv_path)]) == 2
+    assert index.filter_new([row('0xaa', '1'), row('0xcc', '1')]) == [row('0xcc', '1')]
+    index.close()
@@ -0,0 +1,49 @@
+"""Head tracker lifetime across the listener manager's runs"""
+
+import asyncio
+
+from shapeshift_listener.core import BaseListener, Config, ListenerManager
+
+
+class IdleListener(BaseListener):
+    async def process_block(self, block_number):
+        return []
+
+    async def get_latest_block(self):
+        return 100
+
+    async def run(self, from_block=None, to_block=None):
+        await asyncio.sleep(0)
+
+
+def test_run_chain_stops_only_the_tracker_it_started():
+    async def scenario():
+        manager = ListenerManager(Config())
+        manager.register_listener('ethereum', IdleListener(manager.config))
+        manager.register_listener('base', IdleListener(manager.config))
+        base = manager.head_trackers['base']
+        assert base.start()
+
+        await manager.run_chain('ethereum')
+        assert manager.head_trackers['ethereum']._task is None
+        assert base._task is not None and not base._task.done()
+
+        # Already running for another caller: left running
+        await manager.run_chain('base')
+        assert not base._task.done()
+        await base.stop()
+
+    asyncio.run(scenario())
+
+
+def test_wait_for_returns_the_published_head():
+    async def scenario():
+        manager = ListenerManager(Config())
+        manager.register_listener('ethereum', IdleListener(manager.config))
+        tracker = manager.head_trackers['ethereum']
+        waiter = asyncio.create_task(tracker.wait_for(5))
+        await asyncio.sleep(0)
+        await tracker.publish(7)
+        return await waiter
+
+    assert asyncio.run(scenario()) == 7
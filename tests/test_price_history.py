@@ -0,0 +1,49 @@
+"""Range prefetch coverage of the historical price store"""
+
+import time
+
+from price_history import HOUR, PriceHistory
+
+BASE = 1_600_000_000 // HOUR * HOUR
+
+
+def make_history(tmp_path, prices, failure_ttl=300):
+    calls = []
+
+    def fetcher(token, start_hour, end_hour):
+        calls.append((start_hour, end_hour))
+        return dict(prices)
+
+    history = PriceHistory(db_path=str(tmp_path / 'prices.sqlite'), api_key='', fetcher=fetcher,
+                           failure_ttl=failure_ttl)
+    return history, calls
+
+
+def test_fetched_range_is_not_requested_again(tmp_path):
+    history, calls = make_history(tmp_path, {BASE + h * HOUR: 1.0 + h for h in range(11)})
+    assert history.prefetch(['ETH'], BASE, BASE + 10 * HOUR) == 11
+    history.prefetch(['ETH'], BASE + 2 * HOUR, BASE + 8 * HOUR)
+    assert calls == [(BASE, BASE + 10 * HOUR)]
+    assert history.price_at('ETH', BASE + 4 * HOUR + 59, fetch=False) == 5.0
+
+
+def test_empty_result_is_retried_after_failure_ttl(tmp_path):
+    history, calls = make_history(tmp_path, {}, failure_ttl=0.1)
+    history.prefetch(['NEW'], BASE, BASE + 10 * HOUR)
+    history.prefetch(['NEW'], BASE, BASE + 10 * HOUR)
+    assert len(calls) == 1
+    assert history._coverage('NEW') == []
+
+    time.sleep(0.2)
+    history.prefetch(['NEW'], BASE, BASE + 10 * HOUR)
+    assert len(calls) == 2
+
+
+def test_only_quoted_hours_are_covered(tmp_path):
+    history, calls = make_history(tmp_path, {BASE + 3 * HOUR: 1.0, BASE + 5 * HOUR: 2.0}, failure_ttl=0.1)
+    history.prefetch(['NEW'], BASE, BASE + 10 * HOUR)
+    assert history._coverage('NEW') == [(BASE + 3 * HOUR, BASE + 5 * HOUR)]
+
+    time.sleep(0.2)
+    history.prefetch(['NEW'], BASE, BASE + 10 * HOUR)
+    assert calls[1:] == [(BASE, BASE + 2 * HOUR), (BASE + 6 * HOUR, BASE + 10 * HOUR)]
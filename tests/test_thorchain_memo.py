@@ -0,0 +1,83 @@
+"""THORChain memo parsing on real memo formats"""
+
+import pytest
+
+from thorchain_memo import action_memo, affiliate_fee, parse_memo, parse_page
+
+SS = {'ss', 'thor1xmaggkcln5m5fnha2780xrdrulmplvfrz6wj3l'}
+
+
+def test_full_swap_memo():
+    memo = parse_memo('SWAP:ETH.USDC-0XA0B86991C6218B36C1D19D4A2E9EB0CE3606EB48:0x1234:1000000:ss:55')
+    assert memo.is_swap is True
+    assert memo.action == 'swap'
+    assert memo.asset == 'ETH.USDC-0XA0B86991C6218B36C1D19D4A2E9EB0CE3606EB48'
+    assert memo.destination == '0x1234'
+    assert memo.limit == '1000000'
+    assert memo.affiliates == ('ss',)
+    assert memo.bps == (55,)
+    assert memo.affiliate_bps(SS) == 55
+
+
+def test_shorthand_streaming_swap():
+    # '=' swap, 'r' (RUNE) shorthand asset, streaming limit/interval/quantity
+    memo = parse_memo('=:r:thor1abc:0/1/0:ss:55')
+    assert memo.is_swap
+    assert memo.asset == 'r'
+    assert memo.limit == '0/1/0'
+    assert memo.affiliate_bps(SS) == 55
+
+
+def test_multiple_affiliates_with_per_affiliate_fees():
+    memo = parse_memo('=:BTC.BTC:bc1qxyz:0/3/0:t/ss:10/55')
+    assert memo.affiliates == ('t', 'ss')
+    assert memo.bps == (10, 55)
+    assert memo.affiliate_bps(SS) == 55
+    assert memo.affiliate_bps({'t'}) == 10
+
+
+def test_single_fee_applies_to_every_affiliate():
+    memo = parse_memo('=:ETH.ETH:0xabc:0:t/SS:25')
+    assert memo.affiliates == ('t', 'ss')
+    assert memo.affiliate_bps(SS) == 25
+
+
+def test_affiliate_address_instead_of_name():
+    memo = parse_memo('s:BTC.BTC:bc1qxyz::thor1xmaggkcln5m5fnha2780xrdrulmplvfrz6wj3l:50')
+    assert memo.is_swap
+    assert memo.limit == ''
+    assert memo.affiliate_bps(SS) == 50
+
+
+@pytest.mark.parametrize('raw, is_swap, affiliate_bps', [
+    ('=:ETH.ETH:0xabc:0', True, None),               # no affiliate
+    ('=:ETH.ETH:0xabc:0:ss', True, 0),               # affiliate without fee
+    ('=:ETH.ETH:0xabc:0:ss:abc', True, 0),           # unparseable fee
+    ('+:BTC.BTC:thor1abc', False, None),             # add liquidity
+    ('OUT:0A1B2C', False, None),                     # outbound
+])
+def test_partial_and_non_swap_memos(raw, is_swap, affiliate_bps):
+    memo = parse_memo(raw)
+    assert memo.is_swap is is_swap
+    assert memo.affiliate_bps(SS) == affiliate_bps
+
+
+def test_empty_memo():
+    assert parse_memo('') is None
+
+
+def test_action_memo_and_parse_page():
+    actions = [
+        {'metadata': {'swap': {'memo': '=:ETH.ETH:0xabc:0:ss:55'}}},
+        {'memo': '=:BTC.BTC:bc1q:0:t:10'},
+        {'metadata': {}},
+    ]
+    assert action_memo(actions[1]) == '=:BTC.BTC:bc1q:0:t:10'
+    memos = parse_page(actions)
+    assert [memo.affiliates if memo else None for memo in memos] == [('ss',), ('t',), None]
+
+
+def test_affiliate_fee_rounds_down():
+    assert affiliate_fee(1_000_000, 55) == 5500
+    assert affiliate_fee(199, 55) == 1
+    assert affiliate_fee('12345', 0) == 0
@@ -0,0 +1,76 @@
+"""CLOCK memory tier and single-flight resolution of the token cache"""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('web3')
+
+from token_cache import _ClockCache  # noqa: E402
+
+
+def test_clock_cache_evicts_unreferenced_entries_first():
+    cache = _ClockCache(2)
+    cache.put('a', {'v': 1})
+    cache.put('b', {'v': 2})
+    assert cache.get('a') == {'v': 1}  # sets a's reference bit
+    cache.put('c', {'v': 3})
+    assert cache.get('a') == {'v': 1}
+    assert cache.get('b') is None
+    assert cache.get('c') == {'v': 3}
+
+
+def test_clock_cache_discard_then_put_reuses_the_slot():
+    cache = _ClockCache(3)
+    cache.put('a', {'v': 1})
+    cache.discard('a')
+    assert cache.get('a') is None
+    cache.put('a', {'v': 2})
+    assert cache._ring.count('a') == 1
+    assert len(cache._ring) == 1
+    assert cache.get('a') == {'v': 2}
+
+
+def test_clock_cache_never_exceeds_capacity():
+    cache = _ClockCache(8)
+    for i in range(100):
+        cache.put(str(i), {'v': i})
+        if i % 3 == 0:
+            cache.discard(str(i - 1))
+    assert len(cache._ring) <= 8
+    assert len(cache._entries) <= 8
+    assert sorted(cache._slots.values()) == sorted(set(cache._slots.values()))
+
+
+def test_concurrent_misses_resolve_once(token_store, monkeypatch):
+    address = '0x00000000000000000000000000000000000000aa'
+    calls = []
+    release = threading.Event()
+
+    def slow_load(addresses, chain_id):
+        calls.append(addresses)
+        release.wait(5)
+        return {address: {'address': address, 'symbol': 'AAA', 'decimals': 18}}
+
+    monkeypatch.setattr(token_store, '_load', slow_load)
+    results = []
+    barrier = threading.Barrier(9)
+
+    def lookup():
+        barrier.wait()
+        results.append(token_store.get_token_info(address))
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    # Let every thread reach the in-flight entry before the leader finishes
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    # Followers get the leader's result even though nothing reached the memory tier
+    assert [info['symbol'] for info in results] == ['AAA'] * 8
@@ -0,0 +1,76 @@
+"""Sorted, memory-mapped webscrape token index"""
+
+import os
+
+from webscrape_index import WebscrapeIndex, parse_thorchain_asset
+
+USDC = '0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48'
+
+
+def make_index(tmp_path, rows):
+    source = tmp_path / 'viewblock.csv'
+    source.write_text('from_asset,to_asset\n' + ''.join(f"{a},{b}\n" for a, b in rows), encoding='utf-8')
+    return WebscrapeIndex(index_path=str(tmp_path / 'index.tsv'), thorchain_csv=str(source),
+                          cowswap_xlsx=str(tmp_path / 'missing.xlsx'))
+
+
+def test_parse_thorchain_asset():
+    assert parse_thorchain_asset(f"ETH.USDC-{USDC.upper()}") == ('USDC', 'ethereum', USDC)
+    assert parse_thorchain_asset('BTC.BTC') == ('BTC', 'bitcoin', '')
+    assert parse_thorchain_asset('BTC/BTC') == ('BTC', 'bitcoin', '')
+    assert parse_thorchain_asset('ETH~ETH') == ('ETH', 'ethereum', '')
+    assert parse_thorchain_asset('THOR.RUNE') == ('RUNE', 'thorchain', '')
+    assert parse_thorchain_asset('RUNE') is None
+
+
+def test_lookup_finds_every_entry_of_a_symbol(tmp_path):
+    index = make_index(tmp_path, [
+        ('BTC.BTC', f"ETH.USDC-{USDC.upper()}"),
+        ('AVAX.USDC-0XB97EF9EF8734C71904D8002F8B6BC66DD9C48A6E', 'BTC.BTC'),
+        ('ETH.ETH', 'DOGE.DOGE'),
+    ])
+    usdc = index.lookup('usdc')
+    assert sorted(entry['chain'] for entry in usdc) == ['avalanche', 'ethereum']
+    assert {entry['address'] for entry in usdc} == {USDC, '0xb97ef9ef8734c71904d8002f8b6bc66dd9c48a6e'}
+    # First line of the file
+    assert index.lookup('BTC') == [{'symbol': 'BTC', 'chain': 'bitcoin', 'address': '', 'sources': ['thorchain']}]
+    # Chain prefixes are not symbols, and symbols sorting before, between or after the lines are absent
+    assert index.lookup('AVAX') == []
+    assert index.lookup('A') == []
+    assert index.lookup('EUR') == []
+    assert index.lookup('ZZZ') == []
+    assert index.has_symbol('DOGE', 'thorchain')
+    assert not index.has_symbol('DOGE', 'cowswap')
+    assert index.symbols() == {'BTC', 'DOGE', 'ETH', 'USDC'}
+    index.close()
+
+
+def test_lookup_across_many_symbols(tmp_path):
+    symbols = [f"T{i:04d}" for i in range(500)]
+    index = make_index(tmp_path, [(f"ETH.{symbol}", 'BTC.BTC') for symbol in symbols])
+    for symbol in symbols[::37] + [symbols[0], symbols[-1]]:
+        assert [entry['symbol'] for entry in index.lookup(symbol)] == [symbol]
+    index.close()
+
+
+def test_index_is_rebuilt_when_the_source_is_newer(tmp_path):
+    index = make_index(tmp_path, [('BTC.BTC', 'ETH.ETH')])
+    assert index.lookup('RUNE') == []
+    index.close()
+
+    source = tmp_path / 'viewblock.csv'
+    source.write_text('from_asset,to_asset\nTHOR.RUNE,BTC.BTC\n', encoding='utf-8')
+    built_at = os.path.getmtime(tmp_path / 'index.tsv')
+    os.utime(source, (built_at + 10, built_at + 10))
+
+    rebuilt = WebscrapeIndex(index_path=str(tmp_path / 'index.tsv'), thorchain_csv=str(source),
+                             cowswap_xlsx=str(tmp_path / 'missing.xlsx'))
+    assert [entry['chain'] for entry in rebuilt.lookup('RUNE')] == ['thorchain']
+    rebuilt.close()
+
+
+def test_missing_sources_give_an_empty_index(tmp_path):
+    index = WebscrapeIndex(index_path=str(tmp_path / 'index.tsv'), thorchain_csv=str(tmp_path / 'none.csv'),
+                           cowswap_xlsx=str(tmp_path / 'none.xlsx'))
+    assert index.lookup('BTC') == []
+    assert index.symbols() == set()